@@ -0,0 +1,273 @@
+"""
+Result cache and request coalescing in front of a planner's ``generate_itinerary``.
+
+Identical trip requests ("3 days in Paris, culture+food, $2000") are served
+from a TTL/LRU cache instead of another 30+ second LLM run. Requests are
+normalized first (case and whitespace, budget rounded into buckets about
+10% wide, preferences sorted), so trivially different requests share an entry.
+
+While a request is being generated, identical requests wait for that run
+instead of starting their own (stampede protection), so a trending
+destination costs one LLM chain and one set of Amadeus lookups however
+many users ask at once. Only completed results are cached.
+Every reused result is personalized for its caller: its own ``run_id``,
+user, and city/country spelling, with estimated costs kept within the
+caller's budget.
+"""
+import asyncio
+import copy
+import json
+import logging
+import math
+import uuid
+from typing import Any, AsyncGenerator, Dict, Iterable, Optional, Union
+
+from agents.streaming import DAY_KEYS
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def budget_bucket(budget: float, ratio: float = 0.1) -> float:
+    """
+    Lower bound of the bucket ``budget`` falls in. Buckets are ``ratio``
+    wide relative to their bound ($1,000-$1,100, $1,100-$1,210, ...), so a
+    $1 and a $499 trip never share one. ``ratio`` <= 0 keeps budgets exact.
+    """
+    if ratio <= 0 or budget <= 0:
+        return budget
+    index = math.floor(math.log(budget) / math.log1p(ratio))
+    return round((1 + ratio) ** index, 2)
+
+
+def itinerary_cache_key(
+    city: str,
+    country: str,
+    days: int,
+    budget: Optional[float],
+    preferences: Union[Dict[str, Any], Iterable[str], None],
+    budget_ratio: float = 0.1,
+) -> str:
+    """Normalized cache key for a trip request."""
+    if isinstance(preferences, dict):
+        preferences = [name for name, enabled in preferences.items() if enabled]
+    prefs = sorted({_normalize(pref) for pref in preferences or [] if pref and pref.strip()})
+    bucket = budget_bucket(budget, budget_ratio) if budget else None
+    return json.dumps([_normalize(city), _normalize(country), int(days), bucket, prefs], separators=(",", ":"))
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _fit_estimated_costs(result: Dict[str, Any], budget: Optional[float]) -> None:
+    """
+    Scale a reused plan's estimated costs down to ``budget`` if their total
+    exceeds it: the plan was made for another budget in the same bucket.
+    """
+    tour = result.get("tour")
+    if not budget or budget <= 0 or not isinstance(tour, dict):
+        return
+    research = tour.get("research")
+    # LangGraphPlanner reports them in the tour and as the result's cost,
+    # SimplePlanner under the tour's research.
+    for costs in (
+        tour.get("estimated_costs"),
+        result.get("cost"),
+        research.get("estimated_costs") if isinstance(research, dict) else None,
+    ):
+        if not isinstance(costs, dict) or not _is_number(costs.get("total")) or costs["total"] <= budget:
+            continue
+        scale = budget / costs["total"]
+        for name, value in costs.items():
+            if _is_number(value):
+                costs[name] = round(value * scale, 2)
+        costs["total"] = budget
+
+
+class CachedPlanner:
+    """
+    Wraps a planner (SimplePlanner or LangGraphPlanner) with the same generate API.
+
+    ``cache`` may be None to only coalesce concurrent identical requests, and
+    ``coalesce`` False to only cache.
+    """
+
+    def __init__(
+        self,
+        planner,
+        cache: Optional[TTLCache] = None,
+        budget_ratio: float = 0.1,
+        coalesce: bool = True
+    ) -> None:
+        self.planner = planner
+        self.cache = cache
+        self.budget_ratio = budget_ratio
+        self.coalesce = coalesce
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def __getattr__(self, name: str):
+        # Everything else (e.g. LLM clients used by other endpoints) is the planner's.
+        return getattr(self.planner, name)
+
+    async def generate_itinerary(
+        self,
+        city: str,
+        country: str,
+        days: int,
+        budget: Optional[float] = None,
+        preferences=None,
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        key = itinerary_cache_key(city, country, days, budget, preferences, self.budget_ratio)
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None:
+            logger.info(f"Itinerary cache hit for {city}, {country} ({days} days)")
+            return self._personalize(cached, city, country, budget, user_id, cached=True)
+
+        while self.coalesce and key in self._inflight:
+            inflight = self._inflight[key]
+            self.coalesced += 1
+            try:
+                # Shielded, so a client that disconnects does not cancel the shared run.
+                shared = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise  # our own client went away
+                continue  # the generating request was cancelled; retry, possibly as the new one
+            logger.info(f"Coalesced itinerary request for {city}, {country} ({days} days)")
+            return self._personalize(shared, city, country, budget, user_id, coalesced=True)
+
+        future = None
+        if self.coalesce:
+            future = asyncio.get_running_loop().create_future()
+            # A failure with nobody waiting must not be logged as "never retrieved".
+            future.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._inflight[key] = future
+        self.executions += 1
+        try:
+            result = await self.planner.generate_itinerary(
+                city=city,
+                country=country,
+                days=days,
+                budget=budget,
+                preferences=preferences,
+                user_id=user_id
+            )
+        except asyncio.CancelledError:
+            if future is not None:
+                future.cancel()
+            raise
+        except Exception as exc:
+            if future is not None:
+                future.set_exception(exc)
+            raise
+        else:
+            if future is not None:
+                future.set_result(result)
+            if self.cache is not None and result.get("status") == "completed":
+                self.cache.set(key, copy.deepcopy(result))
+            return result
+        finally:
+            if future is not None and self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def generate_itinerary_stream(
+        self,
+        city: str,
+        country: str,
+        days: int,
+        budget: Optional[float] = None,
+        preferences=None,
+        user_id: Optional[str] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        ``generate_itinerary_stream`` of the planner, or a replay of a cached
+        (or in-flight) result: ``run``, one ``day`` event per day, ``result``.
+
+        A streamed run is cached once it completes. It does not register as
+        in-flight, since the client may disconnect before the result arrives.
+        """
+        key = itinerary_cache_key(city, country, days, budget, preferences, self.budget_ratio)
+        shared = self.cache.get(key) if self.cache is not None else None
+        hit = shared is not None
+        inflight = self._inflight.get(key)
+        if not hit and inflight is not None:
+            self.coalesced += 1
+            try:
+                shared = await asyncio.shield(inflight)
+            except (asyncio.CancelledError, Exception):  # noqa: BLE001
+                if not inflight.done():
+                    raise  # our client went away
+                shared = None  # the shared run failed or was cancelled; try our own
+        if shared is not None:
+            flag = {"cached": True} if hit else {"coalesced": True}
+            result = self._personalize(shared, city, country, budget, user_id, **flag)
+            yield {"type": "run", "content": {"run_id": result["run_id"]}}
+            for day_key in DAY_KEYS:
+                for index, day in enumerate(result["tour"].get(day_key) or []):
+                    yield {"type": "day", "content": {"key": day_key, "index": index, "value": day}}
+            yield {"type": "result", "content": result}
+            return
+
+        async for event in self.planner.generate_itinerary_stream(
+            city=city,
+            country=country,
+            days=days,
+            budget=budget,
+            preferences=preferences,
+            user_id=user_id
+        ):
+            if (
+                self.cache is not None
+                and event["type"] == "result"
+                and event["content"].get("status") == "completed"
+            ):
+                self.cache.set(key, copy.deepcopy(event["content"]))
+            yield event
+
+    @staticmethod
+    def _personalize(
+        result: Dict[str, Any],
+        city: str,
+        country: str,
+        budget: Optional[float],
+        user_id: Optional[str],
+        **flags: bool
+    ) -> Dict[str, Any]:
+        """
+        A private copy of a shared result for one caller: its own run id, the
+        caller's user id, the city/country as the caller spelled them (the
+        cache key ignores case and whitespace) and estimated costs that fit
+        the caller's budget (the key only keeps its bucket).
+        """
+        result = copy.deepcopy(result)
+        _fit_estimated_costs(result, budget)
+        result["run_id"] = str(uuid.uuid4())
+        if user_id is not None:
+            result["user_id"] = user_id
+        tour = result.get("tour")
+        if isinstance(tour, dict):
+            if "city" in tour:
+                tour["city"] = city
+            if "country" in tour:
+                tour["country"] = country
+        result.update(flags)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "coalescing": {
+                "enabled": self.coalesce,
+                "in_flight": len(self._inflight),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+            },
+        }
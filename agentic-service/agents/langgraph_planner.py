@@ -1,23 +1,31 @@
 """
 LangGraph-based travel planner with multi-agent workflows.
 Uses LangGraph for stateful agent orchestration.
+
+Nodes are async: LLM calls use ``ainvoke`` and the blocking Amadeus SDK runs
+in worker threads, so a plan never blocks the event loop. Research and the
+flight and hotel lookups are independent, so they run as parallel branches
+that join before the planner node.
 """
+import asyncio
 import logging
-from typing import Dict, Any, Optional, TypedDict, Annotated
-from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, TypedDict, Annotated, AsyncGenerator
 import uuid
 import json
 
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 
-from config import settings
-from services.amadeus_service import amadeus_service
+from agents.streaming import IncrementalJSONParser, parsed_event, progress_event
+from services.amadeus_service import amadeus_service, trip_dates
+from services.llm_clients import llm_clients
 
 logger = logging.getLogger(__name__)
 
+FLIGHT_ORIGIN = "JFK"  # Could be made configurable
+RESEARCH_NODES = frozenset({"researcher", "flights", "hotels"})
+
 
 class PlannerState(TypedDict):
     """State for the LangGraph planner."""
@@ -30,19 +38,30 @@ class PlannerState(TypedDict):
     user_id: Optional[str]
     itinerary: Optional[Dict[str, Any]]
     run_id: str
+    flight_data: Optional[Dict[str, Any]]
+    hotel_data: Optional[Dict[str, Any]]
+
+
+def _parse_json(content: str) -> Dict[str, Any]:
+    """Parse a JSON reply, unwrapping a markdown code block if present."""
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0].strip()
+    return json.loads(content)
 
 
 class LangGraphPlanner:
     """
     Travel planner using LangGraph for multi-agent orchestration.
+
+    ``llm`` and ``amadeus`` default to the shared chat model and Amadeus
+    service; tests and benchmarks pass fakes.
     """
     
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.7,
-            api_key=settings.openai_api_key
-        )
+    def __init__(self, llm=None, amadeus=None):
+        self.llm = llm or llm_clients.chat_model(model="gpt-4o-mini", temperature=0.7)
+        self.amadeus = amadeus or amadeus_service
         self.graph = self._build_graph()
     
     def _build_graph(self) -> StateGraph:
@@ -51,18 +70,22 @@ class LangGraphPlanner:
         
         # Add nodes
         workflow.add_node("researcher", self._research_node)
+        workflow.add_node("flights", self._flights_node)
+        workflow.add_node("hotels", self._hotels_node)
         workflow.add_node("planner", self._plan_node)
         workflow.add_node("enricher", self._enrich_node)
         
-        # Define edges
-        workflow.set_entry_point("researcher")
-        workflow.add_edge("researcher", "planner")
+        # Define edges: research and the Amadeus lookups run in parallel and
+        # the planner waits for all three.
+        for branch in ("researcher", "flights", "hotels"):
+            workflow.add_edge(START, branch)
+        workflow.add_edge(["researcher", "flights", "hotels"], "planner")
         workflow.add_edge("planner", "enricher")
         workflow.add_edge("enricher", END)
         
         return workflow.compile()
     
-    def _research_node(self, state: PlannerState) -> PlannerState:
+    async def _research_node(self, state: PlannerState) -> Dict[str, Any]:
         """Research phase: Gather destination information."""
         logger.info(f"[{state['run_id']}] Research phase: {state['city']}, {state['country']}")
         
@@ -88,43 +111,58 @@ Format as JSON with these insights."""
             HumanMessage(content=research_prompt)
         ]
         
-        response = self.llm.invoke(messages)
-        research_data = response.content
+        response = await self.llm.ainvoke(messages)
         
         # Store research in messages
-        state["messages"].append(HumanMessage(content=research_prompt))
-        state["messages"].append(response)
-        
-        return state
+        return {"messages": [HumanMessage(content=research_prompt), response]}
     
-    def _plan_node(self, state: PlannerState) -> PlannerState:
+    async def _flights_node(self, state: PlannerState) -> Dict[str, Any]:
+        """Flight offers from Amadeus (blocking SDK, run in a worker thread)."""
+        if not self.amadeus.is_available():
+            return {"flight_data": None}
+        airport_code = self.amadeus.get_airport_code(state['city'])
+        if not airport_code:
+            return {"flight_data": None}
+        departure_date, return_date = trip_dates(state['days'])
+        try:
+            flight_data = await asyncio.to_thread(
+                self.amadeus.search_flights,
+                origin=FLIGHT_ORIGIN,
+                destination=airport_code,
+                departure_date=departure_date,
+                return_date=return_date,
+            )
+        except Exception as e:
+            logger.warning(f"[{state['run_id']}] Amadeus flight search failed: {e}")
+            flight_data = None
+        return {"flight_data": flight_data}
+    
+    async def _hotels_node(self, state: PlannerState) -> Dict[str, Any]:
+        """Hotel listings from Amadeus (blocking SDK, run in a worker thread)."""
+        if not self.amadeus.is_available():
+            return {"hotel_data": None}
+        airport_code = self.amadeus.get_airport_code(state['city'])
+        if not airport_code:
+            return {"hotel_data": None}
+        check_in_date, check_out_date = trip_dates(state['days'])
+        try:
+            hotel_data = await asyncio.to_thread(
+                self.amadeus.search_hotels,
+                city_code=airport_code,
+                check_in_date=check_in_date,
+                check_out_date=check_out_date,
+            )
+        except Exception as e:
+            logger.warning(f"[{state['run_id']}] Amadeus hotel search failed: {e}")
+            hotel_data = None
+        return {"hotel_data": hotel_data}
+    
+    async def _plan_node(self, state: PlannerState) -> Dict[str, Any]:
         """Planning phase: Create detailed itinerary."""
         logger.info(f"[{state['run_id']}] Planning phase")
         
-        # Get real travel data from Amadeus
-        flight_data = None
-        hotel_data = None
-        
-        if amadeus_service.is_available():
-            try:
-                airport_code = amadeus_service.get_airport_code(state['city'], state['country'])
-                if airport_code:
-                    # Get flights (example: from a major hub)
-                    flight_data = amadeus_service.search_flights(
-                        origin="JFK",  # Could be made configurable
-                        destination=airport_code,
-                        departure_date=(datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d"),
-                        return_date=(datetime.now() + timedelta(days=30 + state['days'])).strftime("%Y-%m-%d")
-                    )
-                    
-                    # Get hotels
-                    hotel_data = amadeus_service.search_hotels(
-                        city_code=airport_code,
-                        check_in=(datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d"),
-                        check_out=(datetime.now() + timedelta(days=30 + state['days'])).strftime("%Y-%m-%d")
-                    )
-            except Exception as e:
-                logger.warning(f"Amadeus data fetch failed: {e}")
+        flight_data = state.get("flight_data")
+        hotel_data = state.get("hotel_data")
         
         plan_prompt = f"""Based on the research, create a detailed {state['days']}-day itinerary for {state['city']}, {state['country']}.
 
@@ -178,34 +216,26 @@ Return as JSON with this structure:
             HumanMessage(content=plan_prompt)
         ]
         
-        response = self.llm.invoke(messages)
+        response = await self.llm.ainvoke(messages)
         
         # Parse JSON response
         try:
-            content = response.content
-            # Extract JSON from markdown code blocks if present
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-            
-            itinerary = json.loads(content)
-            state["itinerary"] = itinerary
+            itinerary = _parse_json(response.content)
         except Exception as e:
             logger.error(f"Failed to parse itinerary JSON: {e}")
-            state["itinerary"] = {"error": "Failed to parse itinerary"}
-        
-        state["messages"].append(HumanMessage(content=plan_prompt))
-        state["messages"].append(response)
+            itinerary = {"error": "Failed to parse itinerary"}
         
-        return state
+        return {
+            "itinerary": itinerary,
+            "messages": [HumanMessage(content=plan_prompt), response],
+        }
     
-    def _enrich_node(self, state: PlannerState) -> PlannerState:
+    async def _enrich_node(self, state: PlannerState) -> Dict[str, Any]:
         """Enrichment phase: Add final touches and validation."""
         logger.info(f"[{state['run_id']}] Enrichment phase")
         
         if not state.get("itinerary"):
-            return state
+            return {}
         
         enrich_prompt = f"""Review and enhance this itinerary:
 {json.dumps(state['itinerary'], indent=2)}
@@ -224,21 +254,15 @@ Return the enhanced itinerary as JSON."""
             HumanMessage(content=enrich_prompt)
         ]
         
-        response = self.llm.invoke(messages)
+        response = await self.llm.ainvoke(messages)
         
         try:
-            content = response.content
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-            
-            enhanced = json.loads(content)
-            state["itinerary"].update(enhanced)
+            enhanced = _parse_json(response.content)
         except Exception as e:
             logger.warning(f"Enrichment parsing failed: {e}")
+            return {}
         
-        return state
+        return {"itinerary": {**state["itinerary"], **enhanced}}
     
     async def generate_itinerary(
         self,
@@ -255,7 +279,85 @@ Return the enhanced itinerary as JSON."""
         run_id = str(uuid.uuid4())
         logger.info(f"[{run_id}] LangGraph: Generating {days}-day trip to {city}, {country}")
         
-        initial_state: PlannerState = {
+        # Run the graph
+        try:
+            final_state = await self.graph.ainvoke(
+                self._initial_state(run_id, city, country, days, budget, preferences, user_id)
+            )
+            return self._format_result(run_id, final_state.get("itinerary") or {})
+        except Exception as e:
+            logger.error(f"LangGraph execution failed: {e}", exc_info=True)
+            raise
+    
+    async def generate_itinerary_stream(
+        self,
+        city: str,
+        country: str,
+        days: int,
+        budget: Optional[float] = None,
+        preferences: Optional[list[str]] = None,
+        user_id: Optional[str] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Streaming variant of ``generate_itinerary``, yielding SSE event dicts.
+        
+        Emits ``run``, ``progress`` for the research (researcher, flights and
+        hotels branches), plan and enrich stages, ``field`` / ``day`` events
+        parsed from the planner node's tokens, then ``result`` (the enriched
+        itinerary) or ``error``.
+        """
+        run_id = str(uuid.uuid4())
+        logger.info(f"[{run_id}] LangGraph: Streaming {days}-day trip to {city}, {country}")
+        yield {"type": "run", "content": {"run_id": run_id}}
+        yield progress_event("research", "started")
+        
+        pending_research = set(RESEARCH_NODES)
+        parser = IncrementalJSONParser()
+        itinerary: Dict[str, Any] = {}
+        try:
+            async for mode, payload in self.graph.astream(
+                self._initial_state(run_id, city, country, days, budget, preferences, user_id),
+                stream_mode=["updates", "messages"],
+            ):
+                if mode == "messages":
+                    # Token chunks from every LLM call; only the planner's are the itinerary.
+                    message, metadata = payload
+                    if metadata.get("langgraph_node") == "planner" and isinstance(message.content, str):
+                        for parsed in parser.feed(message.content):
+                            yield parsed_event(parsed)
+                    continue
+                
+                for node, update in payload.items():
+                    update = update or {}
+                    if node in pending_research:
+                        pending_research.discard(node)
+                        if not pending_research:
+                            yield progress_event("research", "completed")
+                            yield progress_event("plan", "started")
+                    elif node == "planner":
+                        itinerary = update.get("itinerary") or itinerary
+                        yield progress_event("plan", "completed")
+                        yield progress_event("enrich", "started")
+                    elif node == "enricher":
+                        itinerary = update.get("itinerary") or itinerary
+                        yield progress_event("enrich", "completed")
+            
+            yield {"type": "result", "content": self._format_result(run_id, itinerary)}
+        except Exception as e:
+            logger.error(f"LangGraph streaming execution failed: {e}", exc_info=True)
+            yield {"type": "error", "content": str(e)}
+    
+    @staticmethod
+    def _initial_state(
+        run_id: str,
+        city: str,
+        country: str,
+        days: int,
+        budget: Optional[float],
+        preferences: Optional[list[str]],
+        user_id: Optional[str]
+    ) -> PlannerState:
+        return {
             "messages": [],
             "city": city,
             "country": country,
@@ -264,23 +366,19 @@ Return the enhanced itinerary as JSON."""
             "preferences": preferences or [],
             "user_id": user_id,
             "itinerary": None,
-            "run_id": run_id
+            "run_id": run_id,
+            "flight_data": None,
+            "hotel_data": None,
+        }
+    
+    @staticmethod
+    def _format_result(run_id: str, itinerary: Dict[str, Any]) -> Dict[str, Any]:
+        # Format response similar to SimplePlanner
+        return {
+            "run_id": run_id,
+            "tour": itinerary,
+            "cost": itinerary.get("estimated_costs", {}),
+            "citations": [],
+            "status": "completed"
         }
-        
-        # Run the graph
-        try:
-            final_state = self.graph.invoke(initial_state)
-            itinerary = final_state.get("itinerary", {})
-            
-            # Format response similar to SimplePlanner
-            return {
-                "run_id": run_id,
-                "tour": itinerary,
-                "cost": itinerary.get("estimated_costs", {}),
-                "citations": [],
-                "status": "completed"
-            }
-        except Exception as e:
-            logger.error(f"LangGraph execution failed: {e}", exc_info=True)
-            raise
 
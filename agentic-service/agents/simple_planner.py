@@ -2,105 +2,21 @@
 Simplified travel planner without LangGraph dependencies.
 Uses direct OpenAI calls for itinerary generation + Amadeus for real travel data.
 """
+import asyncio
 import logging
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, AsyncGenerator, List, Tuple
 import uuid
 import json
 
-import openai
-
-from config import settings
-from services.amadeus_service import amadeus_service
+from agents.streaming import IncrementalJSONParser, parsed_event, progress_event
+from services.amadeus_service import amadeus_service, trip_dates
+from services.llm_clients import llm_clients
 
 logger = logging.getLogger(__name__)
 
+FLIGHT_ORIGIN = "LAX"  # Default, could be user's location
 
-class SimplePlanner:
-    """
-    Simplified travel planner using direct LLM calls.
-    """
-    
-    def __init__(self):
-        self.openai_client = openai.AsyncOpenAI(
-            api_key=settings.openai_api_key
-        )
-    
-    async def generate_itinerary(
-        self,
-        city: str,
-        country: str,
-        days: int,
-        budget: Optional[float] = None,
-        preferences: Optional[Dict[str, Any]] = None,
-        user_id: Optional[str] = None
-    ) -> Dict[str, Any]:
-        """
-        Generate a travel itinerary using a single LLM call.
-        """
-        run_id = str(uuid.uuid4())
-        logger.info(f"[{run_id}] Generating itinerary for {days}-day trip to {city}, {country}")
-        
-        # Get real travel data from Amadeus if available
-        flight_data = None
-        hotel_data = None
-        
-        if amadeus_service.is_available():
-            try:
-                # Get airport codes
-                origin_code = "LAX"  # Default, could be user's location
-                dest_code = amadeus_service.get_airport_code(city)
-                
-                if dest_code:
-                    # Search for flights
-                    departure_date = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d')
-                    return_date = (datetime.now() + timedelta(days=30+days)).strftime('%Y-%m-%d')
-                    
-                    logger.info(f"[{run_id}] Fetching real flight data...")
-                    flight_data = amadeus_service.search_flights(
-                        origin=origin_code,
-                        destination=dest_code,
-                        departure_date=departure_date,
-                        return_date=return_date,
-                        adults=1,
-                        max_results=3
-                    )
-                
-                # Search for hotels
-                # Get city code (first 3 letters uppercase)
-                city_code = city[:3].upper()
-                logger.info(f"[{run_id}] Fetching real hotel data...")
-                hotel_data = amadeus_service.search_hotels(
-                    city_code=city_code,
-                    max_results=5
-                )
-            except Exception as e:
-                logger.warning(f"[{run_id}] Could not fetch Amadeus data: {e}")
-        
-        try:
-            # Build preferences string
-            pref_list = [k for k, v in (preferences or {}).items() if v]
-            pref_str = ", ".join(pref_list) if pref_list else "balanced mix of activities"
-            
-            # Build budget string
-            budget_str = f"${budget:.2f}" if budget else "flexible budget"
-            
-            # Build real travel data context
-            travel_data_context = ""
-            if flight_data and flight_data.get("flights"):
-                cheapest_flight = min(flight_data["flights"], key=lambda x: float(x["price"]["total"]))
-                travel_data_context += f"\n\nReal Flight Data Available:"
-                travel_data_context += f"\n- Cheapest flight: {cheapest_flight['price']['currency']} {cheapest_flight['price']['total']}"
-                travel_data_context += f"\n- {len(flight_data['flights'])} flight options found"
-            
-            if hotel_data and hotel_data.get("hotels"):
-                travel_data_context += f"\n\nReal Hotel Data Available:"
-                travel_data_context += f"\n- {len(hotel_data['hotels'])} hotels found"
-                for hotel in hotel_data["hotels"][:3]:
-                    travel_data_context += f"\n  • {hotel['name']}"
-            
-            # Create the prompt
-            system_prompt = """You are an expert travel planner AI. Generate detailed, realistic travel itineraries.
+SYSTEM_PROMPT = """You are an expert travel planner AI. Generate detailed, realistic travel itineraries.
 
 CRITICAL REQUIREMENTS FOR LOCATIONS:
 - Every location MUST be a specific place name (museum, restaurant, store, park, building)
@@ -164,8 +80,183 @@ Return your response as a structured JSON object with this format:
     "total": 0
   }
 }"""
+
+
+class SimplePlanner:
+    """
+    Simplified travel planner using direct LLM calls.
+    """
+    
+    def __init__(self, amadeus=None):
+        self.openai_client = llm_clients.async_openai_client()
+        self.amadeus = amadeus or amadeus_service
+    
+    async def generate_itinerary(
+        self,
+        city: str,
+        country: str,
+        days: int,
+        budget: Optional[float] = None,
+        preferences: Optional[Dict[str, Any]] = None,
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate a travel itinerary using a single LLM call.
+        """
+        run_id = str(uuid.uuid4())
+        logger.info(f"[{run_id}] Generating itinerary for {days}-day trip to {city}, {country}")
+        
+        # Get real travel data from Amadeus if available
+        flight_data, hotel_data = await self._fetch_travel_data(run_id, city, days)
+        
+        try:
+            # Call the OpenAI API directly
+            response = await self.openai_client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=self._messages(city, country, days, budget, preferences, flight_data, hotel_data),
+                temperature=0.7,
+                max_tokens=4000
+            )
+            
+            content = response.choices[0].message.content.strip()
+            result = self._build_result(run_id, city, country, days, budget, content, flight_data, hotel_data)
             
-            user_prompt = f"""Plan a {days}-day trip to {city}, {country}.
+            logger.info(f"[{run_id}] Itinerary generated successfully")
+            return result
+        
+        except Exception as exc:
+            logger.error(f"[{run_id}] Generation failed: {str(exc)}", exc_info=True)
+            return self._failed_result(run_id, exc)
+    
+    async def generate_itinerary_stream(
+        self,
+        city: str,
+        country: str,
+        days: int,
+        budget: Optional[float] = None,
+        preferences: Optional[Dict[str, Any]] = None,
+        user_id: Optional[str] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Streaming variant of ``generate_itinerary``, yielding SSE event dicts.
+        
+        Emits ``run`` (the run id), ``progress`` as the research (Amadeus),
+        plan (LLM) and enrich (tour assembly) stages start and finish,
+        ``field`` / ``day`` events while the plan is being written, then
+        ``result`` with the same payload ``generate_itinerary`` returns, or
+        ``error``.
+        """
+        run_id = str(uuid.uuid4())
+        logger.info(f"[{run_id}] Streaming itinerary for {days}-day trip to {city}, {country}")
+        yield {"type": "run", "content": {"run_id": run_id}}
+        
+        yield progress_event("research", "started")
+        flight_data, hotel_data = await self._fetch_travel_data(run_id, city, days)
+        yield progress_event("research", "completed")
+        
+        try:
+            yield progress_event("plan", "started")
+            stream = await self.openai_client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=self._messages(city, country, days, budget, preferences, flight_data, hotel_data),
+                temperature=0.7,
+                max_tokens=4000,
+                stream=True
+            )
+            parser = IncrementalJSONParser()
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    for parsed in parser.feed(chunk.choices[0].delta.content):
+                        yield parsed_event(parsed)
+            yield progress_event("plan", "completed")
+            
+            yield progress_event("enrich", "started")
+            result = self._build_result(
+                run_id, city, country, days, budget, parser.text.strip(), flight_data, hotel_data
+            )
+            yield progress_event("enrich", "completed")
+            
+            logger.info(f"[{run_id}] Itinerary streamed successfully")
+            yield {"type": "result", "content": result}
+        
+        except Exception as exc:
+            logger.error(f"[{run_id}] Streaming generation failed: {str(exc)}", exc_info=True)
+            yield {"type": "error", "content": str(exc)}
+    
+    async def _fetch_travel_data(
+        self,
+        run_id: str,
+        city: str,
+        days: int
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Flight and hotel data from Amadeus, fetched concurrently off the event loop."""
+        if not self.amadeus.is_available():
+            return None, None
+        
+        async def flights() -> Optional[Dict[str, Any]]:
+            dest_code = self.amadeus.get_airport_code(city)
+            if not dest_code:
+                return None
+            departure_date, return_date = trip_dates(days)
+            
+            logger.info(f"[{run_id}] Fetching real flight data...")
+            return await asyncio.to_thread(
+                self.amadeus.search_flights,
+                origin=FLIGHT_ORIGIN,
+                destination=dest_code,
+                departure_date=departure_date,
+                return_date=return_date,
+                adults=1,
+                max_results=3
+            )
+        
+        async def hotels() -> Optional[Dict[str, Any]]:
+            # Get city code (first 3 letters uppercase)
+            city_code = city[:3].upper()
+            logger.info(f"[{run_id}] Fetching real hotel data...")
+            return await asyncio.to_thread(self.amadeus.search_hotels, city_code=city_code, max_results=5)
+        
+        results = await asyncio.gather(flights(), hotels(), return_exceptions=True)
+        for index, data in enumerate(results):
+            if isinstance(data, Exception):
+                logger.warning(f"[{run_id}] Could not fetch Amadeus data: {data}")
+                results[index] = None
+        flight_data, hotel_data = results
+        return flight_data, hotel_data
+    
+    @staticmethod
+    def _messages(
+        city: str,
+        country: str,
+        days: int,
+        budget: Optional[float],
+        preferences: Optional[Dict[str, Any]],
+        flight_data: Optional[Dict[str, Any]],
+        hotel_data: Optional[Dict[str, Any]]
+    ) -> List[Dict[str, str]]:
+        """System and user prompts for one itinerary completion."""
+        # Build preferences string
+        pref_list = [k for k, v in (preferences or {}).items() if v]
+        pref_str = ", ".join(pref_list) if pref_list else "balanced mix of activities"
+        
+        # Build budget string
+        budget_str = f"${budget:.2f}" if budget else "flexible budget"
+        
+        # Build real travel data context
+        travel_data_context = ""
+        if flight_data and flight_data.get("flights"):
+            cheapest_flight = min(flight_data["flights"], key=lambda x: float(x["price"]["total"]))
+            travel_data_context += f"\n\nReal Flight Data Available:"
+            travel_data_context += f"\n- Cheapest flight: {cheapest_flight['price']['currency']} {cheapest_flight['price']['total']}"
+            travel_data_context += f"\n- {len(flight_data['flights'])} flight options found"
+        
+        if hotel_data and hotel_data.get("hotels"):
+            travel_data_context += f"\n\nReal Hotel Data Available:"
+            travel_data_context += f"\n- {len(hotel_data['hotels'])} hotels found"
+            for hotel in hotel_data["hotels"][:3]:
+                travel_data_context += f"\n  • {hotel['name']}"
+        
+        user_prompt = f"""Plan a {days}-day trip to {city}, {country}.
 
 Travel Preferences: {pref_str}
 Budget: {budget_str}{travel_data_context}
@@ -197,120 +288,124 @@ IMPORTANT:
    - Make sure every time slot is filled with something meaningful
 
 Return the itinerary as JSON following the specified format."""
-            
-            # Call the OpenAI API directly
-            response = await self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=4000
-            )
-            
-            # Parse the response
-            content = response.choices[0].message.content.strip()
-            
-            # Try to extract JSON from the response
-            if "```json" in content:
-                json_start = content.find("```json") + 7
-                json_end = content.find("```", json_start)
-                content = content[json_start:json_end].strip()
-            elif "```" in content:
-                json_start = content.find("```") + 3
-                json_end = content.find("```", json_start)
-                content = content[json_start:json_end].strip()
-            
-            try:
-                itinerary_data = json.loads(content)
-            except json.JSONDecodeError:
-                # If JSON parsing fails, create a structured response
-                itinerary_data = {
-                    "title": f"{days}-Day {city} Adventure",
-                    "description": content[:500],
-                    "daily_schedule": [],
-                    "highlights": [],
-                    "local_tips": [],
-                    "compliance": {
-                        "visa_required": False,
-                        "safety_level": "check official sources",
-                        "vaccinations": []
-                    },
-                    "estimated_costs": {
-                        "total": budget if budget else 0
-                    }
-                }
-            
-            # Use top_10_places if available, otherwise collect from activities
-            stops = []
-            if itinerary_data.get("top_10_places"):
-                # Use the curated top 10 places list
-                stops = itinerary_data["top_10_places"][:10]
-            else:
-                # Fallback: collect unique stops from activities
-                seen_locations = set()
-                for day in itinerary_data.get("daily_schedule", []):
-                    for activity in day.get("activities", []):
-                        location = activity.get("location", activity.get("activity", "Activity"))
-                        if location and location.lower() not in seen_locations:
-                            stops.append(location)
-                            seen_locations.add(location.lower())
-                
-                # Add highlights if we don't have enough
-                if len(stops) < 10:
-                    for highlight in itinerary_data.get("highlights", [])[:10]:
-                        if highlight and highlight.lower() not in seen_locations:
-                            stops.append(highlight)
-                            seen_locations.add(highlight.lower())
-                            if len(stops) >= 10:
-                                break
-            
-            tour = {
-                "city": city,
-                "country": country,
-                "title": itinerary_data.get("title", f"{days}-Day {city} Adventure"),
-                "description": itinerary_data.get("description", f"An amazing {days}-day journey through {city}"),
-                "image": "https://source.unsplash.com/800x600/?travel," + city.lower().replace(" ", "-"),
-                "stops": stops[:10],  # Limit to 10 stops for display
-                "daily_schedule": itinerary_data.get("daily_schedule", []),
-                "daily_plans": itinerary_data.get("daily_plans", []),  # NEW: Detailed hour-by-hour plans
-                "compliance": itinerary_data.get("compliance", {}),
-                "research": {
-                    "highlights": itinerary_data.get("highlights", []),
-                    "local_tips": itinerary_data.get("local_tips", []),
-                    "estimated_costs": itinerary_data.get("estimated_costs", {})
+        
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
+    
+    @staticmethod
+    def _parse_itinerary(content: str, city: str, days: int, budget: Optional[float]) -> Dict[str, Any]:
+        """Decode the model's JSON reply, falling back to a minimal itinerary."""
+        # Try to extract JSON from the response
+        if "```json" in content:
+            json_start = content.find("```json") + 7
+            json_end = content.find("```", json_start)
+            content = content[json_start:json_end].strip()
+        elif "```" in content:
+            json_start = content.find("```") + 3
+            json_end = content.find("```", json_start)
+            content = content[json_start:json_end].strip()
+        
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            # If JSON parsing fails, create a structured response
+            return {
+                "title": f"{days}-Day {city} Adventure",
+                "description": content[:500],
+                "daily_schedule": [],
+                "highlights": [],
+                "local_tips": [],
+                "compliance": {
+                    "visa_required": False,
+                    "safety_level": "check official sources",
+                    "vaccinations": []
                 },
-                "real_data": {
-                    "flights": flight_data.get("flights", []) if flight_data else [],
-                    "hotels": hotel_data.get("hotels", []) if hotel_data else [],
-                    "has_real_data": bool(flight_data or hotel_data)
+                "estimated_costs": {
+                    "total": budget if budget else 0
                 }
             }
+    
+    def _build_result(
+        self,
+        run_id: str,
+        city: str,
+        country: str,
+        days: int,
+        budget: Optional[float],
+        content: str,
+        flight_data: Optional[Dict[str, Any]],
+        hotel_data: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Turn the model's reply into the planner's response payload."""
+        itinerary_data = self._parse_itinerary(content, city, days, budget)
+        
+        # Use top_10_places if available, otherwise collect from activities
+        stops = []
+        if itinerary_data.get("top_10_places"):
+            # Use the curated top 10 places list
+            stops = itinerary_data["top_10_places"][:10]
+        else:
+            # Fallback: collect unique stops from activities
+            seen_locations = set()
+            for day in itinerary_data.get("daily_schedule", []):
+                for activity in day.get("activities", []):
+                    location = activity.get("location", activity.get("activity", "Activity"))
+                    if location and location.lower() not in seen_locations:
+                        stops.append(location)
+                        seen_locations.add(location.lower())
             
-            result = {
-                "run_id": run_id,
-                "tour": tour,
-                "cost": {
-                    "llm_tokens": 2000,  # Approximate
-                    "api_calls": 1,
-                    "total_usd": 0.02
-                },
-                "citations": ["Generated by AI based on travel knowledge"],
-                "status": "completed"
-            }
-            
-            logger.info(f"[{run_id}] Itinerary generated successfully")
-            return result
+            # Add highlights if we don't have enough
+            if len(stops) < 10:
+                for highlight in itinerary_data.get("highlights", [])[:10]:
+                    if highlight and highlight.lower() not in seen_locations:
+                        stops.append(highlight)
+                        seen_locations.add(highlight.lower())
+                        if len(stops) >= 10:
+                            break
         
-        except Exception as exc:
-            logger.error(f"[{run_id}] Generation failed: {str(exc)}", exc_info=True)
-            return {
-                "run_id": run_id,
-                "tour": {},
-                "cost": {},
-                "citations": [],
-                "status": "failed",
-                "error": str(exc)
+        tour = {
+            "city": city,
+            "country": country,
+            "title": itinerary_data.get("title", f"{days}-Day {city} Adventure"),
+            "description": itinerary_data.get("description", f"An amazing {days}-day journey through {city}"),
+            "image": "https://source.unsplash.com/800x600/?travel," + city.lower().replace(" ", "-"),
+            "stops": stops[:10],  # Limit to 10 stops for display
+            "daily_schedule": itinerary_data.get("daily_schedule", []),
+            "daily_plans": itinerary_data.get("daily_plans", []),  # NEW: Detailed hour-by-hour plans
+            "compliance": itinerary_data.get("compliance", {}),
+            "research": {
+                "highlights": itinerary_data.get("highlights", []),
+                "local_tips": itinerary_data.get("local_tips", []),
+                "estimated_costs": itinerary_data.get("estimated_costs", {})
+            },
+            "real_data": {
+                "flights": flight_data.get("flights", []) if flight_data else [],
+                "hotels": hotel_data.get("hotels", []) if hotel_data else [],
+                "has_real_data": bool(flight_data or hotel_data)
             }
-
+        }
+        
+        return {
+            "run_id": run_id,
+            "tour": tour,
+            "cost": {
+                "llm_tokens": 2000,  # Approximate
+                "api_calls": 1,
+                "total_usd": 0.02
+            },
+            "citations": ["Generated by AI based on travel knowledge"],
+            "status": "completed"
+        }
+    
+    @staticmethod
+    def _failed_result(run_id: str, exc: Exception) -> Dict[str, Any]:
+        return {
+            "run_id": run_id,
+            "tour": {},
+            "cost": {},
+            "citations": [],
+            "status": "failed",
+            "error": str(exc)
+        }
@@ -0,0 +1,167 @@
+"""
+Helpers for streaming itinerary generation over Server-Sent Events.
+
+``IncrementalJSONParser`` is fed the model's reply token by token and
+reports top-level fields and the elements of selected arrays (the days of
+``daily_plans`` / ``daily_schedule``) as soon as each one is complete, so
+the frontend can render day 1 while later days are still being written.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+# Arrays of the itinerary JSON whose elements are streamed one by one.
+DAY_KEYS = ("daily_plans", "daily_schedule")
+
+
+@dataclass
+class ParsedValue:
+    """A completed top-level field (``index`` None) or array element."""
+    key: str
+    value: Any
+    index: Optional[int] = None
+
+
+class IncrementalJSONParser:
+    """
+    Streaming parser for one JSON object, e.g. an LLM reply.
+
+    Text before the opening brace (such as a markdown fence) and after the
+    closing one is ignored. Only structure is tracked while scanning; each
+    completed value is decoded once with ``json.loads``, and a value that
+    does not decode is skipped rather than failing the stream.
+    """
+
+    def __init__(self, item_keys: Iterable[str] = DAY_KEYS) -> None:
+        self.item_keys = set(item_keys)
+        self.text = ""
+        self.done = False
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[str] = None
+        self._expect_key = False
+        self._awaiting_value = False
+        self._key_start: Optional[int] = None
+        self._value_start: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self._item_counts: Dict[str, int] = {}
+
+    def feed(self, chunk: str) -> List[ParsedValue]:
+        """Consume ``chunk``; returns the values it completed, in order."""
+        self.text += chunk
+        completed: List[ParsedValue] = []
+        text = self.text
+        while self._pos < len(text) and not self.done:
+            i = self._pos
+            c = text[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._close_string(i, completed)
+                continue
+
+            depth = len(self._stack)
+            if depth == 0:
+                if c == "{":
+                    self._stack.append(c)
+                    self._expect_key = True
+                continue
+            if c.isspace():
+                continue
+
+            # Remember where a top-level value or a streamed array element starts.
+            if depth == 1 and self._awaiting_value:
+                self._awaiting_value = False
+                self._value_start = i
+            elif depth == 2 and self._in_item_array() and self._item_start is None and c not in ",]":
+                self._item_start = i
+
+            if c == '"':
+                self._in_string = True
+                if depth == 1 and self._expect_key:
+                    self._key_start = i
+            elif c in "{[":
+                self._stack.append(c)
+            elif c in "}]":
+                if depth == 1 and self._value_start is not None:
+                    self._emit_field(self._value_start, i, completed)  # scalar before the closing brace
+                elif depth == 2 and self._item_start is not None:
+                    self._emit_item(self._item_start, i, completed)  # scalar before the closing bracket
+                self._stack.pop()
+                depth = len(self._stack)
+                if depth == 0:
+                    self.done = True
+                elif depth == 1 and self._value_start is not None:
+                    self._emit_field(self._value_start, i + 1, completed)
+                elif depth == 2 and self._item_start is not None:
+                    self._emit_item(self._item_start, i + 1, completed)
+            elif c == ",":
+                if depth == 1:
+                    if self._value_start is not None:
+                        self._emit_field(self._value_start, i, completed)
+                    self._expect_key = True
+                elif depth == 2 and self._item_start is not None:
+                    self._emit_item(self._item_start, i, completed)
+            elif c == ":" and depth == 1:
+                self._expect_key = False
+                self._awaiting_value = True
+        return completed
+
+    def _in_item_array(self) -> bool:
+        return self._stack[1] == "[" and self._key in self.item_keys
+
+    def _close_string(self, end: int, completed: List[ParsedValue]) -> None:
+        if len(self._stack) != 1:
+            return
+        if self._key_start is not None:
+            self._key = json.loads(self.text[self._key_start:end + 1])
+            self._key_start = None
+        elif self._value_start is not None:
+            self._emit_field(self._value_start, end + 1, completed)
+
+    def _decode(self, start: int, end: int) -> Any:
+        return json.loads(self.text[start:end])
+
+    def _emit_field(self, start: int, end: int, completed: List[ParsedValue]) -> None:
+        self._value_start = None
+        if self._key is None or self._key in self.item_keys:
+            return  # streamed element by element instead
+        try:
+            completed.append(ParsedValue(self._key, self._decode(start, end)))
+        except ValueError:
+            pass
+
+    def _emit_item(self, start: int, end: int, completed: List[ParsedValue]) -> None:
+        self._item_start = None
+        index = self._item_counts.get(self._key, 0)
+        self._item_counts[self._key] = index + 1
+        try:
+            completed.append(ParsedValue(self._key, self._decode(start, end), index))
+        except ValueError:
+            pass
+
+
+def progress_event(stage: str, status: str) -> Dict[str, Any]:
+    """``stage`` is research, plan or enrich; ``status`` started or completed."""
+    return {"type": "progress", "content": {"stage": stage, "status": status}}
+
+
+def parsed_event(parsed: ParsedValue) -> Dict[str, Any]:
+    """A ``day`` event for a streamed array element, a ``field`` event otherwise."""
+    if parsed.index is None:
+        return {"type": "field", "content": {"key": parsed.key, "value": parsed.value}}
+    return {"type": "day", "content": {"key": parsed.key, "index": parsed.index, "value": parsed.value}}
+
+
+def sse_event(event: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(event)}\n\n"
@@ -0,0 +1,71 @@
+"""
+Compare embedding throughput with and without the micro-batching scheduler.
+
+    python bench_embedding_throughput.py [--concurrency 1 4 16 64] [--seconds 5]
+
+Each concurrency level runs that many threads issuing single-query encodes
+(like concurrent /api/v1/vault/query requests) for a fixed duration, first
+calling SentenceTransformer.encode directly and then through EmbeddingBatcher.
+Reports queries/sec and mean batch size.
+"""
+import argparse
+import threading
+import time
+
+from sentence_transformers import SentenceTransformer
+
+from services.embedding import EmbeddingBatcher
+
+QUERIES = [
+    "What time does the Louvre open on Sundays?",
+    "Which ryokan did I book in Kyoto?",
+    "Flight number for the return leg to Lisbon",
+    "Best neighbourhood for street food in Bangkok",
+    "Is the museum pass valid for the Orsay?",
+]
+
+
+def run(encode, concurrency, seconds):
+    stop = time.perf_counter() + seconds
+    counts = [0] * concurrency
+
+    def worker(slot):
+        i = slot
+        while time.perf_counter() < stop:
+            encode([QUERIES[i % len(QUERIES)]])
+            counts[slot] += 1
+            i += 1
+
+    threads = [threading.Thread(target=worker, args=(slot,)) for slot in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    model = SentenceTransformer(args.model)
+    model.encode(QUERIES)  # warm up
+
+    print(f"{'concurrency':>11} {'direct q/s':>12} {'batched q/s':>12} {'speedup':>8} {'mean batch':>11}")
+    for concurrency in args.concurrency:
+        direct = run(lambda texts: model.encode(texts, convert_to_numpy=True), concurrency, args.seconds)
+
+        batcher = EmbeddingBatcher(model, max_batch_size=args.batch_size, max_wait_ms=args.max_wait_ms)
+        batched = run(batcher.encode, concurrency, args.seconds)
+        mean_batch = batcher.stats()["mean_batch_size"]
+
+        print(f"{concurrency:>11} {direct:>12.1f} {batched:>12.1f} {batched / direct:>7.2f}x {mean_batch:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
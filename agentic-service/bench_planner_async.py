@@ -0,0 +1,113 @@
+"""
+End-to-end latency and concurrency of LangGraphPlanner with simulated I/O.
+
+    python bench_planner_async.py [--llm-latency 2.0] [--amadeus-latency 1.0] [--concurrency 1,8,32]
+
+No API calls are made: the chat model sleeps ``--llm-latency`` seconds per
+call (asynchronously) and the Amadeus lookups sleep ``--amadeus-latency``
+seconds (blocking, like the real SDK). A plan makes three LLM calls and two
+Amadeus lookups; research and both lookups run in parallel, so one plan
+should take about three LLM latencies instead of three plus both lookups.
+
+For each concurrency level N, N plans are started at once in one event
+loop (one uvicorn worker) and we report wall time, plans/sec, and the worst
+event-loop stall measured by a 10 ms ticker. A blocking node shows up as a
+stall as long as the call it blocks on.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "postgresql://bench")
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+from langchain_core.messages import AIMessage  # noqa: E402
+
+from agents.langgraph_planner import LangGraphPlanner  # noqa: E402
+
+ITINERARY = {
+    "title": "Bench trip",
+    "description": "Simulated itinerary",
+    "daily_schedule": [{"day": 1, "theme": "Old town", "activities": []}],
+    "estimated_costs": {"total": 0},
+}
+
+
+class FakeChatModel:
+    """Answers every call after ``latency`` seconds without blocking the loop."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return AIMessage(content=json.dumps(ITINERARY))
+
+
+class SlowAmadeus:
+    """Blocking lookups, like the real Amadeus SDK."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def is_available(self):
+        return True
+
+    def get_airport_code(self, city_name):
+        return "CDG"
+
+    def search_flights(self, **kwargs):
+        time.sleep(self.latency)
+        return {"flights": [], "search": kwargs}
+
+    def search_hotels(self, **kwargs):
+        time.sleep(self.latency)
+        return {"hotels": [], "search": kwargs}
+
+
+async def max_stall(stop, interval=0.01):
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run(planner, concurrency):
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(max_stall(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        planner.generate_itinerary(city="Paris", country="France", days=3) for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return elapsed, await ticker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm-latency", type=float, default=2.0)
+    parser.add_argument("--amadeus-latency", type=float, default=1.0)
+    parser.add_argument("--concurrency", default="1,8,32")
+    args = parser.parse_args()
+
+    planner = LangGraphPlanner(llm=FakeChatModel(args.llm_latency), amadeus=SlowAmadeus(args.amadeus_latency))
+    sequential = 3 * args.llm_latency + 2 * args.amadeus_latency
+    print(f"sequential estimate for one plan: {sequential:.1f}s")
+    print(f"{'plans':>6} {'wall':>8} {'plans/s':>8} {'max stall':>10}")
+    for concurrency in (int(value) for value in args.concurrency.split(",")):
+        elapsed, stall = asyncio.run(run(planner, concurrency))
+        print(
+            f"{concurrency:>6} {elapsed:>7.2f}s {concurrency / elapsed:>8.2f} "
+            f"{stall * 1000:>8.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Compare the character-window and token-aware vault splitters on large inputs.
+
+    python bench_text_splitter.py [--megabytes 1 4 16] [--repeat 3]
+
+Builds synthetic travel-guide text of each size and reports MB/s, chunk
+count and mean chunk length for SimpleTextSplitter (800/200 characters) and
+TokenTextSplitter (160/40 tokens, roughly the same chunk size), plus the
+time for TokenTextSplitter.iter_chunks fed 1 MB pieces as ingest does.
+"""
+import argparse
+import random
+import time
+
+from services.vault_splitter import SimpleTextSplitter, TokenTextSplitter
+
+SENTENCES = [
+    "The old town is best explored on foot.",
+    "Museums open at 9 AM and close early on Mondays!",
+    "Is the river cruise worth it?",
+    "Booking code AB12CD covers the ryokan in Higashiyama, including breakfast.",
+    "Trains to the airport leave every 15 minutes from platform 3.",
+    "Try the street food near the night market; the grilled squid is famous.",
+]
+
+
+def make_text(megabytes, seed=7):
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < megabytes * 1_000_000:
+        sentence = rng.choice(SENTENCES)
+        parts.append(sentence)
+        parts.append("\n\n" if rng.random() < 0.1 else " ")
+        size += len(sentence) + 1
+    return "".join(parts)
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    simple = SimpleTextSplitter(chunk_size=800, chunk_overlap=200)
+    token = TokenTextSplitter(chunk_size=160, chunk_overlap=40)
+
+    print(f"{'MB':>6} {'splitter':<20} {'MB/s':>8} {'chunks':>8} {'mean chars':>11}")
+    for megabytes in args.megabytes:
+        text = make_text(megabytes)
+        pieces = [text[start:start + 1_000_000] for start in range(0, len(text), 1_000_000)]
+        runs = [
+            ("simple split_text", lambda: simple.split_text(text)),
+            ("token split_spans", lambda: token.split_spans(text)),
+            ("token iter_chunks", lambda: list(token.iter_chunks(pieces))),
+        ]
+        for name, func in runs:
+            elapsed, chunks = best_of(args.repeat, func)
+            lengths = [end - start for start, end in chunks] if name == "token split_spans" else [len(c) for c in chunks]
+            print(
+                f"{len(text) / 1e6:>6.1f} {name:<20} {len(text) / 1e6 / elapsed:>8.1f} "
+                f"{len(chunks):>8} {sum(lengths) / len(lengths):>11.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
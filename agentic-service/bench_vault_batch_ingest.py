@@ -0,0 +1,73 @@
+"""
+Compare onboarding throughput of per-file uploads with one batch upload.
+
+Start the service first (uvicorn main:app --port 8000), then:
+
+    python bench_vault_batch_ingest.py [--documents 100] [--pages 20] [--url http://localhost:8000]
+
+The same synthetic travel guides are ingested once through
+/api/v1/vault/upload (one request per document, one index commit each) and
+once through /api/v1/vault/upload-batch (one request, one commit), each for
+a fresh user. Reports documents/sec for both.
+"""
+import argparse
+import time
+import uuid
+
+import httpx
+
+
+def guide(number, pages):
+    page = (
+        f"Guide {number}: the old town is best explored on foot. Museums open at 9 AM "
+        "and the river cruise departs hourly from the central pier. "
+    ) * 25
+    return "\n".join(page for _ in range(pages)).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=20, help="size of each document (~3 KB pages)")
+    args = parser.parse_args()
+
+    bodies = [guide(number, args.pages) for number in range(args.documents)]
+
+    with httpx.Client(base_url=args.url, timeout=None) as client:
+        user_id = f"bench-{uuid.uuid4()}"
+        started = time.perf_counter()
+        for number, body in enumerate(bodies):
+            response = client.post(
+                "/api/v1/vault/upload",
+                files={"file": (f"guide-{number}.txt", body, "text/plain")},
+                data={"documentId": f"{user_id}-{number}", "userId": user_id, "title": f"Guide {number}"},
+            )
+            response.raise_for_status()
+        single = time.perf_counter() - started
+
+        user_id = f"bench-{uuid.uuid4()}"
+        started = time.perf_counter()
+        response = client.post(
+            "/api/v1/vault/upload-batch",
+            files=[("files", (f"guide-{number}.txt", body, "text/plain")) for number, body in enumerate(bodies)],
+            data={
+                "documentIds": [f"{user_id}-{number}" for number in range(len(bodies))],
+                "userId": user_id,
+            },
+        )
+        response.raise_for_status()
+        batch = time.perf_counter() - started
+        summary = response.json()
+
+    print(f"{args.documents} documents of {len(bodies[0]) / 1e3:.0f} KB")
+    print(f"{'per-file uploads':<18} {single:7.1f}s  {args.documents / single:7.1f} docs/s")
+    print(
+        f"{'batch upload':<18} {batch:7.1f}s  {args.documents / batch:7.1f} docs/s  "
+        f"(server: {summary['docsPerSecond']} docs/s, {summary['chunksPerSecond']} chunks/s, "
+        f"{summary['failed']} failed)"
+    )
+
+
+if __name__ == "__main__":
+    main()
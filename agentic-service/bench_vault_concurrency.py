@@ -0,0 +1,99 @@
+"""
+Measure /api/v1/agentic/status latency while vault uploads are running.
+
+Start the service first (uvicorn main:app --port 8000), then:
+
+    python bench_vault_concurrency.py [--uploads 8] [--pages 200] [--url http://localhost:8000]
+
+A health probe fires every few milliseconds; its p50/p95/p99 latency is
+reported on an idle server and again while concurrent uploads are ingested.
+If the event loop is blocked by ingestion, the "during uploads" p99 jumps
+from milliseconds to seconds.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(label, samples):
+    if not samples:
+        print(f"{label:<16} no samples")
+        return
+    print(
+        f"{label:<16} n={len(samples):<5} "
+        f"p50={1000 * statistics.median(samples):8.1f} ms  "
+        f"p95={1000 * percentile(samples, 95):8.1f} ms  "
+        f"p99={1000 * percentile(samples, 99):8.1f} ms  "
+        f"max={1000 * max(samples):8.1f} ms"
+    )
+
+
+async def probe(client, stop, samples, interval):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/api/v1/agentic/status")
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+
+async def upload(client, body):
+    document_id = f"bench-{uuid.uuid4()}"
+    response = await client.post(
+        "/api/v1/vault/upload",
+        files={"file": (f"{document_id}.txt", body, "text/plain")},
+        data={"documentId": document_id, "userId": "bench-user", "title": "Benchmark guide"},
+        timeout=None,
+    )
+    response.raise_for_status()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--uploads", type=int, default=8, help="concurrent uploads")
+    parser.add_argument("--pages", type=int, default=200, help="size of each document (~3 KB pages)")
+    parser.add_argument("--idle-seconds", type=float, default=3.0)
+    parser.add_argument("--interval", type=float, default=0.01, help="seconds between probes")
+    args = parser.parse_args()
+
+    page = (
+        "The old town is best explored on foot. Museums open at 9 AM and the "
+        "river cruise departs hourly from the central pier. "
+    ) * 25
+    body = "\n".join(page for _ in range(args.pages)).encode("utf-8")
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+        idle, busy = [], []
+
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, stop, idle, args.interval))
+        await asyncio.sleep(args.idle_seconds)
+        stop.set()
+        await prober
+
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, stop, busy, args.interval))
+        started = time.perf_counter()
+        await asyncio.gather(*(upload(client, body) for _ in range(args.uploads)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await prober
+
+    print(f"{args.uploads} uploads of {len(body) / 1e6:.1f} MB finished in {elapsed:.1f}s")
+    summarize("idle", idle)
+    summarize("during uploads", busy)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,7 +2,7 @@
 Configuration management for agentic service.
 Loads environment variables for database, OpenAI, Ollama, FAISS.
 """
-from typing import Optional
+from typing import List, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -21,11 +21,77 @@ class Settings(BaseSettings):
     ollama_base_url: str = "http://localhost:11434"
     faiss_index_path: str = "./data/faiss_index"
     hf_model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+
+    # Knowledge Vault index
+    vault_max_resident_shards: int = 256
+    vault_compaction_segments: int = 16  # merge a shard's segments once it has more than this
+    vault_purge_ratio: float = 0.2  # rewrite a shard once this fraction of its chunks is deleted
+    vault_index_type: str = "flat"  # flat | hnsw | ivf_flat | ivf_pq
+    vault_ann_min_vectors: int = 50_000  # shards smaller than this stay exact (flat)
+    vault_hnsw_m: int = 32
+    vault_hnsw_ef_search: int = 64
+    vault_ivf_nlist: int = 0  # 0 = ~4*sqrt(vectors)
+    vault_ivf_nprobe: int = 16
+    vault_pq_m: int = 16  # PQ sub-quantizers; must divide the embedding dimension
+    vault_executor_workers: int = 4  # threads for queries, answers and previews off the event loop
+    vault_ingest_workers: int = 2  # threads for uploads, batch ingests and deletes (kept apart so queries always have workers)
+    vault_ingest_batch_size: int = 256  # chunks embedded and written per ingest batch
+    vault_chunk_tokens: Optional[int] = None  # chunk size in splitter tokens; None (and the cap) = what fits the model's max_seq_length
+    vault_chunk_overlap_tokens: int = 40
+    vault_hybrid_search: bool = True  # fuse BM25 with vector search in vault queries
+    vault_hybrid_candidates: int = 50  # hits taken from each ranking before fusion
+    vault_rrf_k: int = 60  # reciprocal rank fusion constant
+    vault_extract_workers: int = 0  # PDF extraction processes; 0 = one per CPU, 1 = in-process only
+    vault_extract_min_pages: int = 32  # smaller PDFs are extracted in-process
+    vault_extract_pages_per_task: int = 16  # pages per process-pool task
+    vault_batch_max_files: int = 500  # files accepted by one batch upload
+    vault_batch_extract_threads: int = 4  # documents of a batch extracted and chunked concurrently
+    vault_batch_embed_size: int = 1024  # chunks embedded per call during batch ingestion
+    vault_job_workers: int = 2  # background ingestion threads per process; 0 disables the job runner
+    vault_job_lease_seconds: float = 120.0  # a job is retried once its worker stops reporting for this long
+    vault_job_max_attempts: int = 3
+    vault_job_retention_hours: float = 72.0  # finished jobs are kept this long for status polling
+    vault_answer_cache: bool = True  # reuse RAG answers for near-duplicate questions on an unchanged vault
+    vault_answer_cache_threshold: float = 0.97  # minimum cosine similarity between query embeddings
+    vault_answer_cache_size: int = 10_000  # cached answers across all users
+    vault_answer_cache_ttl_seconds: float = 86_400.0
+
+    # Shared LLM HTTP clients (services/llm_clients.py)
+    llm_http2: bool = True  # needs the 'h2' package; falls back to HTTP/1.1 without it
+    llm_max_connections: int = 100
+    llm_max_keepalive_connections: int = 20  # idle connections kept open per pool
+    llm_keepalive_expiry_seconds: float = 30.0
+    llm_timeout_seconds: float = 60.0
+    llm_max_retries: int = 2
+
+    # Embedding micro-batching + cache
+    embedding_batch_size: int = 64
+    embedding_max_wait_ms: float = 5.0
+    embedding_cache_size: int = 50_000  # in-memory LRU entries
+    embedding_cache_dir: Optional[str] = None  # e.g. ./data/embedding_cache to enable the disk tier
+
+    # Itinerary result cache and request coalescing (agents/cached_planner.py)
+    itinerary_cache: bool = True
+    itinerary_coalescing: bool = True  # concurrent identical requests share one planner run
+    itinerary_cache_size: int = 512  # in-memory LRU entries
+    itinerary_cache_ttl_seconds: float = 6 * 3600.0
+    itinerary_cache_path: Optional[str] = None  # e.g. ./data/itinerary_cache.sqlite3 to enable the disk tier
+    itinerary_budget_bucket_ratio: float = 0.1  # budgets within the same ~10%-wide bucket share cached itineraries
     
     # Optional external APIs
     google_maps_api_key: Optional[str] = None
     amadeus_api_key: Optional[str] = None
     amadeus_api_secret: Optional[str] = None
+    amadeus_fake: bool = False  # offline canned data from services/amadeus_fake.py instead of the live API
+    
+    # Amadeus lookup caches (services/amadeus_service.py)
+    amadeus_cache_size: int = 2048  # in-memory LRU entries per cache
+    amadeus_flight_cache_ttl_seconds: float = 15 * 60.0  # offers and prices change quickly
+    amadeus_hotel_cache_ttl_seconds: float = 24 * 3600.0  # hotel lists are reference data
+    amadeus_cache_path: Optional[str] = None  # e.g. ./data/amadeus_cache.sqlite3 to enable the disk tier
+    amadeus_prefetch_routes: List[str] = []  # e.g. ["JFK-CDG", "LAX-NRT"], warmed in the background at startup
+    amadeus_prefetch_days: List[int] = [3, 5, 7]  # trip lengths to warm flight offers for
+    amadeus_prefetch_workers: int = 4
     openweather_api_key: Optional[str] = None
     
     # Production settings
@@ -0,0 +1,13 @@
+"""
+Shared pytest setup for the agentic service (run ``python -m pytest -q`` here).
+
+Settings require a database URL and an OpenAI key even though no test
+talks to either.
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "postgresql://test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+# A manual end-to-end script against a running server, not a pytest module.
+collect_ignore = ["test_generation.py"]
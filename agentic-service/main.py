@@ -6,14 +6,18 @@ import logging
 import sys
 import typing
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
 from config import settings
+from agents.cached_planner import CachedPlanner
+from agents.streaming import sse_event
+from services.llm_clients import llm_clients
+from services.ttl_cache import TTLCache
 
 # Setup logging first
 logging.basicConfig(level=logging.INFO)
@@ -31,11 +35,17 @@ if sys.version_info >= (3, 12):
     typing.ForwardRef._evaluate = _patched_forward_evaluate
 
 try:
-    from services.vault import VaultIngestionService
+    from services.vault import BatchDocument, VaultIngestionService
 except Exception as vault_error:
     logger.warning(f"Vault service unavailable: {vault_error}")
     VaultIngestionService = None  # type: ignore
 
+try:
+    from services.amadeus_service import amadeus_service
+except Exception as amadeus_error:  # noqa: BLE001
+    logger.warning(f"Amadeus service unavailable: {amadeus_error}")
+    amadeus_service = None  # type: ignore[assignment]
+
 # Try LangGraph planner first (preferred), fall back to SimplePlanner
 AgenticPlanner = None
 planner_initialization_error: Optional[Exception] = None
@@ -86,6 +96,19 @@ app.add_middleware(
 if AgenticPlanner is not None:
     try:
         planner = AgenticPlanner()
+        if settings.itinerary_cache or settings.itinerary_coalescing:
+            # Identical trip requests reuse a finished (or in-flight) itinerary.
+            planner = CachedPlanner(
+                planner,
+                TTLCache(
+                    "itineraries",
+                    max_entries=settings.itinerary_cache_size,
+                    ttl_seconds=settings.itinerary_cache_ttl_seconds,
+                    db_path=Path(settings.itinerary_cache_path) if settings.itinerary_cache_path else None,
+                ) if settings.itinerary_cache else None,
+                budget_ratio=settings.itinerary_budget_bucket_ratio,
+                coalesce=settings.itinerary_coalescing,
+            )
     except Exception as planner_error:  # noqa: BLE001
         logger.error("Planner initialization failed", exc_info=True)
         planner = None
@@ -96,6 +119,14 @@ else:
 vault_service = VaultIngestionService() if VaultIngestionService else None
 
 
+@app.on_event("startup")
+def prefetch_amadeus_routes() -> None:
+    """Warm the Amadeus caches for AMADEUS_PREFETCH_ROUTES ("JFK-CDG", ...) in the background."""
+    routes = [tuple(route.split("-", 1)) for route in settings.amadeus_prefetch_routes if "-" in route]
+    if amadeus_service is not None and routes:
+        amadeus_service.prefetch(routes, trip_days=settings.amadeus_prefetch_days)
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -148,6 +179,7 @@ class VaultQueryResponse(BaseModel):
     chunks: list[Dict[str, Any]]
     citations: list[Dict[str, str]]
     tokens_used: Optional[int] = None
+    cached: bool = False
 
 
 class GenerateItineraryRequest(BaseModel):
@@ -227,6 +259,18 @@ async def health_check():
     }
 
 
+@app.get("/api/v1/agentic/metrics")
+async def agentic_metrics():
+    """Shared LLM client pool settings, connection reuse, itinerary/Amadeus cache and coalescing counters."""
+    planner_stats = planner.stats() if isinstance(planner, CachedPlanner) else {}
+    return {
+        "llm_clients": llm_clients.stats(),
+        "itinerary_cache": planner_stats.get("cache"),
+        "plan_coalescing": planner_stats.get("coalescing"),
+        "amadeus": amadeus_service.stats() if amadeus_service is not None else None,
+    }
+
+
 @app.get("/api/agentic/status/{run_id}")
 async def get_status(run_id: str):
     """Check status of a planning run."""
@@ -259,18 +303,12 @@ async def generate_itinerary(request: GenerateItineraryRequest):
             f"({request.days} days) for user {request.user_id}"
         )
         
-        # Convert preferences list to dict format expected by planner
-        preferences_dict = {}
-        if request.preferences:
-            for pref in request.preferences:
-                preferences_dict[pref] = True
-        
         result = await planner.generate_itinerary(
             city=request.city,
             country=request.country,
             days=request.days,
             budget=request.budget,
-            preferences=preferences_dict,
+            preferences=_preferences_dict(request.preferences),
             user_id=request.user_id
         )
         
@@ -285,6 +323,55 @@ async def generate_itinerary(request: GenerateItineraryRequest):
         ) from exc
 
 
+@app.post("/api/v1/agentic/generate-itinerary-stream")
+async def generate_itinerary_stream(request: GenerateItineraryRequest):
+    """
+    Streaming variant of generate-itinerary as Server-Sent Events.
+    
+    Events: ``run`` (run id), ``progress`` (research/plan/enrich started or
+    completed), ``field`` and ``day`` as the plan is written (each day as soon
+    as it is complete), ``result`` with the same payload as the non-streaming
+    endpoint or ``error``, then ``done``.
+    """
+    if planner is None:
+        detail = "Planner stack is unavailable. Check server logs."
+        if planner_initialization_error:
+            detail += f" Reason: {planner_initialization_error}"
+        raise HTTPException(status_code=503, detail=detail)
+    
+    logger.info(
+        f"[Generate] Streaming trip request: {request.city}, {request.country} "
+        f"({request.days} days) for user {request.user_id}"
+    )
+    
+    async def events():
+        async for event in planner.generate_itinerary_stream(
+            city=request.city,
+            country=request.country,
+            days=request.days,
+            budget=request.budget,
+            preferences=_preferences_dict(request.preferences),
+            user_id=request.user_id
+        ):
+            yield sse_event(event)
+        yield sse_event({"type": "done"})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+def _preferences_dict(preferences: Optional[List[str]]) -> Dict[str, bool]:
+    """Convert a preferences list to the dict format expected by the planners."""
+    return {pref: True for pref in preferences or []}
+
+
 @app.post("/api/v1/agentic/refine-itinerary")
 async def refine_itinerary(request: RefineItineraryRequest):
     """
@@ -305,9 +392,7 @@ async def refine_itinerary(request: RefineItineraryRequest):
             f"for user {request.user_id}: {request.refinement}"
         )
         
-        # Use the OpenAI LLM to refine the itinerary
-        from langchain.schema import HumanMessage, SystemMessage
-        
+        # Use the shared OpenAI client to refine the itinerary
         system_prompt = """You are a travel planning assistant. You receive an existing itinerary 
         and a refinement request. Your job is to update the itinerary according to the request while
         preserving the overall structure and quality. Return the updated itinerary in the same JSON format."""
@@ -319,10 +404,14 @@ Refinement Request: {request.refinement}
 
 Please update the itinerary to incorporate this change. Return the complete updated itinerary."""
         
-        response = await planner.openai_llm.ainvoke([
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ])
+        response = await llm_clients.async_openai_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=0.7,
+        )
         
         # Parse the response and construct the updated result
         # For now, we'll return a modified version of the current itinerary
@@ -357,16 +446,30 @@ async def ingest_vault_document(
     userId: str = Form(...),
     title: str = Form(...),
     notes: Optional[str] = Form(None),
+    background: bool = Form(False),
 ):
     """
     Accept a user-uploaded document, extract text, chunk, embed, and persist to FAISS.
     The Next.js app stores metadata in Postgres; this endpoint handles vector indexing.
+
+    With ``background=true`` the file is saved and queued, and the response is
+    ``202`` with a job to poll at ``/api/v1/vault/jobs/{jobId}?user_id=...``.
     """
     if not vault_service:
         raise HTTPException(status_code=503, detail="Vault service temporarily unavailable")
     
     try:
-        result = vault_service.ingest_document(
+        if background:
+            job = await vault_service.aenqueue_document(
+                upload=file,
+                document_id=documentId,
+                user_id=userId,
+                title=title,
+                notes=notes,
+            )
+            return JSONResponse(status_code=202, content=job)
+
+        result = await vault_service.aingest_document(
             upload=file,
             document_id=documentId,
             user_id=userId,
@@ -381,6 +484,138 @@ async def ingest_vault_document(
         raise HTTPException(status_code=500, detail="Vault ingestion failed.") from exc
 
 
+@app.post("/api/v1/vault/upload-batch")
+async def ingest_vault_documents_batch(
+    files: List[UploadFile] = File(...),
+    documentIds: List[str] = Form(...),
+    userId: str = Form(...),
+    titles: Optional[List[str]] = Form(None),
+    notes: Optional[str] = Form(None),
+    stream: bool = Form(False),
+):
+    """
+    Ingest many documents in one request: extraction runs in parallel,
+    chunks are embedded in large batches and the user's index is committed
+    once. ``documentIds`` (and optional ``titles``) pair with ``files`` by
+    position; titles default to the file names.
+
+    Returns per-document results plus docs/sec throughput, or with
+    ``stream=true`` Server-Sent Events as each document is extracted and
+    indexed, followed by the summary.
+    """
+    if not vault_service:
+        raise HTTPException(status_code=503, detail="Vault service temporarily unavailable")
+    if len(documentIds) != len(files):
+        raise HTTPException(status_code=400, detail="documentIds must have one entry per file.")
+    if titles is not None and len(titles) != len(files):
+        raise HTTPException(status_code=400, detail="titles must have one entry per file.")
+    if len(files) > settings.vault_batch_max_files:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch may contain at most {settings.vault_batch_max_files} files.",
+        )
+
+    documents = [
+        BatchDocument(
+            upload=upload,
+            document_id=document_id,
+            title=titles[position] if titles else (upload.filename or document_id),
+            notes=notes,
+        )
+        for position, (upload, document_id) in enumerate(zip(files, documentIds))
+    ]
+    try:
+        # Saved before responding: the uploaded files are closed once the
+        # endpoint returns, while a streamed ingest is still running.
+        staged = await vault_service.astage_uploads(documents, userId)
+        if stream:
+            return StreamingResponse(
+                vault_service.aingest_staged_events(staged, userId),
+                media_type="text/event-stream",
+                headers={
+                    "Cache-Control": "no-cache",
+                    "Connection": "keep-alive",
+                    "X-Accel-Buffering": "no",
+                },
+            )
+        return await vault_service.aingest_staged(staged, userId)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except Exception as exc:  # noqa: BLE001
+        logger.error("Vault batch ingestion failed", exc_info=True)
+        raise HTTPException(status_code=500, detail="Vault batch ingestion failed.") from exc
+
+
+@app.get("/api/v1/vault/jobs/{job_id}")
+async def get_vault_job(job_id: str, user_id: str = Query(...)):
+    """Status, current stage (extracting, chunking, embedding, indexing) and progress of an ingestion job."""
+    if not vault_service:
+        raise HTTPException(status_code=503, detail="Vault service temporarily unavailable")
+    job = vault_service.jobs.get(job_id)
+    if job is None or job["userId"] != user_id:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@app.get("/api/v1/vault/jobs")
+async def list_vault_jobs(
+    user_id: str = Query(...),
+    status: Optional[str] = Query(None, description="queued | running | succeeded | failed"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """A user's most recent ingestion jobs, newest first."""
+    if not vault_service:
+        raise HTTPException(status_code=503, detail="Vault service temporarily unavailable")
+    return {"jobs": vault_service.jobs.list(user_id, status, limit)}
+
+
+@app.put("/api/v1/vault/documents/{document_id}")
+async def replace_vault_document(
+    document_id: str,
+    file: UploadFile = File(...),
+    userId: str = Form(...),
+    title: str = Form(...),
+    notes: Optional[str] = Form(None),
+):
+    """
+    Replace a document with a new version: its old chunks are swapped for the
+    new ones atomically, so searches never see both.
+    """
+    if not vault_service:
+        raise HTTPException(status_code=503, detail="Vault service temporarily unavailable")
+
+    try:
+        return await vault_service.aingest_document(
+            upload=file,
+            document_id=document_id,
+            user_id=userId,
+            title=title,
+            notes=notes,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except Exception as exc:  # noqa: BLE001
+        logger.error("Vault document replace failed", exc_info=True)
+        raise HTTPException(status_code=500, detail="Vault document replace failed.") from exc
+
+
+@app.delete("/api/v1/vault/documents/{document_id}")
+async def delete_vault_document(document_id: str, user_id: str = Query(...)):
+    """Remove a document's chunks from the user's vault, plus its stored file."""
+    if not vault_service:
+        raise HTTPException(status_code=503, detail="Vault service temporarily unavailable")
+
+    try:
+        result = await vault_service.adelete_document(document_id, user_id)
+    except Exception as exc:  # noqa: BLE001
+        logger.error("Vault document delete failed", exc_info=True)
+        raise HTTPException(status_code=500, detail="Vault document delete failed.") from exc
+
+    if not result["deletedChunks"]:
+        raise HTTPException(status_code=404, detail=result["message"])
+    return result
+
+
 @app.post("/api/v1/vault/query", response_model=VaultQueryResponse)
 async def query_vault_documents(request: VaultQueryRequest):
     """
@@ -390,7 +625,7 @@ async def query_vault_documents(request: VaultQueryRequest):
     try:
         logger.info(f"Vault query from user {request.user_id}: {request.query}")
         
-        result = vault_service.generate_answer(
+        result = await vault_service.agenerate_answer(
             query=request.query,
             user_id=request.user_id,
             top_k=request.top_k,
@@ -413,7 +648,7 @@ async def query_vault_documents_stream(request: VaultQueryRequest):
         logger.info(f"Vault streaming query from user {request.user_id}: {request.query}")
         
         return StreamingResponse(
-            vault_service.generate_answer_stream(
+            vault_service.agenerate_answer_stream(
                 query=request.query,
                 user_id=request.user_id,
                 top_k=request.top_k,
@@ -431,11 +666,22 @@ async def query_vault_documents_stream(request: VaultQueryRequest):
         raise HTTPException(status_code=500, detail=f"Streaming query failed: {str(exc)}") from exc
 
 
+@app.get("/api/v1/vault/stats")
+async def vault_stats():
+    """Expose resident index counters so we can confirm queries are served from memory."""
+    if not vault_service:
+        raise HTTPException(status_code=503, detail="Vault service temporarily unavailable")
+    return vault_service.stats()
+
+
 class VaultPreviewResponse(BaseModel):
     """Response schema for document preview."""
     content: str
     content_type: str
     filename: str
+    offset: int = 0
+    total_length: int = 0
+    next_offset: Optional[int] = None
 
 
 @app.get("/api/v1/vault/preview/{document_id}")
@@ -443,11 +689,17 @@ async def preview_vault_document(
     document_id: str,
     user_id: str = Query(...),
     filePath: Optional[str] = Query(None),
-    filename: Optional[str] = Query(None)
+    filename: Optional[str] = Query(None),
+    offset: int = Query(0, ge=0, description="First character of the page"),
+    limit: Optional[int] = Query(None, ge=1, description="Page size in characters (default: whole document)"),
 ):
     """
     Retrieve document content for preview.
     Returns extracted text content from PDF/DOCX/TXT files.
+
+    Text comes from the extracted-text store filled at ingest; pass
+    ``offset``/``limit`` to page through large documents and follow
+    ``next_offset`` until it is null.
     """
     if not vault_service:
         raise HTTPException(status_code=503, detail="Vault service temporarily unavailable")
@@ -455,6 +707,9 @@ async def preview_vault_document(
     try:
         logger.info(f"Preview request for document {document_id} by user {user_id}")
         
+        if vault_service.document_paths.owned_by_other(document_id, user_id):
+            raise HTTPException(status_code=404, detail=f"Document file not found for ID: {document_id}")
+        
         file_path = None
         
         upload_dir = vault_service.upload_dir.resolve()
@@ -471,28 +726,25 @@ async def preview_vault_document(
                 logger.warning(f"Stored filePath does not exist: {file_path}, trying fallback methods")
                 file_path = None
         
-        # If filePath not provided or didn't work, try to construct from filename
+        # If filePath not provided or didn't work, look the document up in the path index
+        if not file_path:
+            file_path = vault_service.document_paths.lookup(document_id, user_id)
+            if file_path:
+                logger.info(f"Found file using document index: {file_path}")
+        
+        # Last resort: construct from filename (sharded layout, then legacy flat layout)
         if not file_path and filename:
-            expected_path = upload_dir / f"{document_id}_{filename}"
-            logger.info(f"Trying filename-based path: {expected_path}")
-            if expected_path.exists() and expected_path.is_file():
-                file_path = expected_path
-                logger.info(f"Found file using filename: {file_path}")
+            for expected_path in (
+                vault_service.document_paths.directory_for(document_id) / f"{document_id}_{filename}",
+                upload_dir / f"{document_id}_{filename}",
+            ):
+                logger.info(f"Trying filename-based path: {expected_path}")
+                if expected_path.is_file():
+                    file_path = expected_path
+                    logger.info(f"Found file using filename: {file_path}")
+                    break
             else:
-                logger.warning(f"Filename-based path does not exist: {expected_path}")
-        
-        # Last resort: pattern matching
-        if not file_path:
-            if not upload_dir.exists():
-                logger.error(f"Upload directory does not exist: {upload_dir}")
-                raise HTTPException(status_code=404, detail="Upload directory not found")
-            
-            logger.info(f"Trying pattern matching for: {document_id}_* in {upload_dir}")
-            matching_files = list(upload_dir.glob(f"{document_id}_*"))
-            logger.info(f"Found {len(matching_files)} matching files: {[str(f) for f in matching_files]}")
-            if matching_files:
-                file_path = matching_files[0]
-                logger.info(f"Found file using pattern matching: {file_path}")
+                logger.warning(f"Filename-based paths do not exist for: {filename}")
         
         if not file_path:
             logger.warning(f"No files found for document_id: {document_id}")
@@ -509,10 +761,12 @@ async def preview_vault_document(
         
         logger.info(f"Found document file: {file_path}")
         
-        # Extract text content based on file type
+        # Serve the stored extracted text (extracting once if it is missing)
         try:
-            content = vault_service._extract_text(file_path, None)
-            if not content or not content.strip():
+            page = await vault_service.apreview_text(document_id, file_path, offset, limit)
+            content = page.text
+            end = page.offset + len(content)
+            if not page.total_chars or (page.offset == 0 and end >= page.total_chars and not content.strip()):
                 logger.warning(f"Extracted content is empty for file: {file_path}")
                 content = "(Document content is empty or could not be extracted)"
         except Exception as extract_error:
@@ -533,7 +787,10 @@ async def preview_vault_document(
         return VaultPreviewResponse(
             content=content,
             content_type=content_type,
-            filename=file_path.name
+            filename=file_path.name,
+            offset=page.offset,
+            total_length=page.total_chars,
+            next_offset=end if end < page.total_chars else None,
         )
     
     except HTTPException:
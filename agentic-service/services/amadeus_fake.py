@@ -0,0 +1,113 @@
+"""
+Offline stand-in for ``amadeus.Client``.
+
+Implements the two endpoints AmadeusService uses, returning deterministic
+canned data derived from the request, and counts every call so the lookup
+cache can be exercised without credentials or network:
+
+    service = AmadeusService(client=FakeAmadeusClient())
+
+Set ``AMADEUS_FAKE=true`` to run the whole service against it.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+
+class FakeResponse:
+    def __init__(self, data: List[Dict[str, Any]]) -> None:
+        self.data = data
+
+
+def _seed(*parts: Any) -> int:
+    return int(hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:8], 16)
+
+
+class _Endpoint:
+    def __init__(self, client: "FakeAmadeusClient", name: str, handler) -> None:
+        self._client = client
+        self._name = name
+        self._handler = handler
+
+    def get(self, **params: Any) -> FakeResponse:
+        self._client._record(self._name)
+        return FakeResponse(self._handler(**params))
+
+
+class _Namespace:
+    pass
+
+
+class FakeAmadeusClient:
+    """Mirrors ``client.shopping.flight_offers_search`` and ``client.reference_data.locations.hotels.by_city``."""
+
+    def __init__(self, latency: float = 0.0, hotels_per_city: int = 20) -> None:
+        self.latency = latency
+        self.hotels_per_city = hotels_per_city
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+
+        self.shopping = _Namespace()
+        self.shopping.flight_offers_search = _Endpoint(self, "flight_offers_search", self._flight_offers)
+        self.reference_data = _Namespace()
+        self.reference_data.locations = _Namespace()
+        self.reference_data.locations.hotels = _Namespace()
+        self.reference_data.locations.hotels.by_city = _Endpoint(self, "hotels_by_city", self._hotels_by_city)
+
+    def _record(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _flight_offers(
+        self,
+        originLocationCode: str,
+        destinationLocationCode: str,
+        departureDate: str,
+        returnDate: Optional[str] = None,
+        adults: int = 1,
+        max: int = 5,
+        **_: Any
+    ) -> List[Dict[str, Any]]:
+        offers = []
+        legs = [(originLocationCode, destinationLocationCode, departureDate)]
+        if returnDate:
+            legs.append((destinationLocationCode, originLocationCode, returnDate))
+        for index in range(max):
+            seed = _seed(originLocationCode, destinationLocationCode, departureDate, returnDate, index)
+            itineraries = []
+            for leg, (origin, destination, date) in enumerate(legs):
+                departure = datetime.strptime(date, "%Y-%m-%d") + timedelta(hours=6 + (seed >> leg) % 14)
+                hours = 2 + seed % 11
+                itineraries.append({
+                    "duration": f"PT{hours}H",
+                    "segments": [{
+                        "departure": {"iataCode": origin, "at": departure.isoformat()},
+                        "arrival": {"iataCode": destination, "at": (departure + timedelta(hours=hours)).isoformat()},
+                        "carrierCode": "FK",
+                        "number": str(100 + seed % 900),
+                        "duration": f"PT{hours}H",
+                    }],
+                })
+            offers.append({
+                "id": str(index + 1),
+                "price": {"total": f"{(150 + seed % 1200) * adults:.2f}", "currency": "USD"},
+                "itineraries": itineraries,
+            })
+        return offers
+
+    def _hotels_by_city(self, cityCode: str, **_: Any) -> List[Dict[str, Any]]:
+        hotels = []
+        for index in range(self.hotels_per_city):
+            seed = _seed(cityCode, index)
+            hotels.append({
+                "hotelId": f"FK{cityCode}{index:03d}",
+                "name": f"Fake Hotel {cityCode} {index + 1}",
+                "geoCode": {"latitude": (seed % 18000) / 100 - 90, "longitude": (seed % 36000) / 100 - 180},
+                "address": {"cityName": cityCode, "countryCode": "ZZ"},
+            })
+        return hotels
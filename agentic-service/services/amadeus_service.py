@@ -1,23 +1,78 @@
 """
 Amadeus API integration for real travel data.
 Provides flight search, hotel search, and travel recommendations.
+
+Lookups go through TTL caches keyed on the search parameters: hotel lists
+are reference data and kept for a day, flight offers only for minutes.
+``prefetch`` warms popular routes in background threads.
 """
+import copy
+import json
 import logging
-from typing import Optional, Dict, Any, List
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterable, List, Tuple
 from datetime import datetime, timedelta
 
 from amadeus import Client, ResponseError
 
 from config import settings
+from services.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+BOOKING_LEAD_DAYS = 30  # offers are searched for a trip starting this many days out
+DEFAULT_FLIGHT_RESULTS = 5
+
+
+def trip_dates(days: int, lead_days: int = BOOKING_LEAD_DAYS) -> Tuple[str, str]:
+    """Departure/check-in and return/check-out dates (YYYY-MM-DD) for a searched trip."""
+    start = datetime.now() + timedelta(days=lead_days)
+    return start.strftime("%Y-%m-%d"), (start + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def _cache_key(*parts: Any) -> str:
+    return json.dumps(parts, separators=(",", ":"))
+
 
 class AmadeusService:
     """Service for integrating Amadeus travel APIs."""
     
-    def __init__(self):
-        """Initialize Amadeus client with API credentials."""
+    def __init__(self, client=None):
+        """
+        Initialize Amadeus client with API credentials.
+
+        ``client`` replaces the SDK client, e.g. with a
+        ``services.amadeus_fake.FakeAmadeusClient`` for offline testing.
+        """
+        cache_path = Path(settings.amadeus_cache_path) if settings.amadeus_cache_path else None
+        self.flight_cache = TTLCache(
+            "amadeus_flights",
+            max_entries=settings.amadeus_cache_size,
+            ttl_seconds=settings.amadeus_flight_cache_ttl_seconds,
+            db_path=cache_path,
+        )
+        self.hotel_cache = TTLCache(
+            "amadeus_hotels",
+            max_entries=settings.amadeus_cache_size,
+            ttl_seconds=settings.amadeus_hotel_cache_ttl_seconds,
+            db_path=cache_path,
+        )
+        self._prefetch_pool: Optional[ThreadPoolExecutor] = None
+        self._counter_lock = threading.Lock()  # prefetch results arrive from pool threads
+        self.prefetched = 0
+        self.prefetch_errors = 0
+
+        if client is None and settings.amadeus_fake:
+            from services.amadeus_fake import FakeAmadeusClient
+
+            client = FakeAmadeusClient()
+            logger.info("Using the offline fake Amadeus client")
+        if client is not None:
+            self.client = client
+            return
+
         if not settings.amadeus_api_key or not settings.amadeus_api_secret:
             logger.warning("Amadeus API credentials not configured")
             self.client = None
@@ -64,62 +119,17 @@ class AmadeusService:
             return {"error": "Amadeus API not configured", "flights": []}
         
         try:
-            logger.info(f"Searching flights: {origin} → {destination} on {departure_date}")
-            
-            response = self.client.shopping.flight_offers_search.get(
-                originLocationCode=origin,
-                destinationLocationCode=destination,
-                departureDate=departure_date,
-                returnDate=return_date,
-                adults=adults,
-                max=max_results
-            )
+            # One entry per route and dates; it serves any request for up to
+            # as many offers as were fetched for it.
+            key = _cache_key(origin, destination, departure_date, return_date, adults)
+            cached = self.flight_cache.get(key)
+            if cached is not None and cached["max_results"] >= max_results:
+                flights = copy.deepcopy(cached["flights"][:max_results])
+            else:
+                flights = self._fetch_flights(origin, destination, departure_date, return_date, adults, max_results)
+                self.flight_cache.set(key, {"max_results": max_results, "flights": flights})
+                flights = copy.deepcopy(flights)
             
-            flights = []
-            for offer in response.data:
-                # Extract key information
-                price = offer.get('price', {})
-                itineraries = offer.get('itineraries', [])
-                
-                flight_data = {
-                    "id": offer.get('id'),
-                    "price": {
-                        "total": price.get('total'),
-                        "currency": price.get('currency')
-                    },
-                    "itineraries": []
-                }
-                
-                for itinerary in itineraries:
-                    segments = itinerary.get('segments', [])
-                    itinerary_data = {
-                        "duration": itinerary.get('duration'),
-                        "segments": []
-                    }
-                    
-                    for segment in segments:
-                        departure = segment.get('departure', {})
-                        arrival = segment.get('arrival', {})
-                        
-                        itinerary_data["segments"].append({
-                            "departure": {
-                                "airport": departure.get('iataCode'),
-                                "time": departure.get('at')
-                            },
-                            "arrival": {
-                                "airport": arrival.get('iataCode'),
-                                "time": arrival.get('at')
-                            },
-                            "carrier": segment.get('carrierCode'),
-                            "flight_number": segment.get('number'),
-                            "duration": segment.get('duration')
-                        })
-                    
-                    flight_data["itineraries"].append(itinerary_data)
-                
-                flights.append(flight_data)
-            
-            logger.info(f"Found {len(flights)} flight offer(s)")
             return {
                 "flights": flights,
                 "search": {
@@ -143,6 +153,74 @@ class AmadeusService:
                 "flights": []
             }
     
+    def _fetch_flights(
+        self,
+        origin: str,
+        destination: str,
+        departure_date: str,
+        return_date: Optional[str],
+        adults: int,
+        max_results: int
+    ) -> List[Dict[str, Any]]:
+        """Flight offers from the live API; raises on API errors."""
+        logger.info(f"Searching flights: {origin} → {destination} on {departure_date}")
+        
+        response = self.client.shopping.flight_offers_search.get(
+            originLocationCode=origin,
+            destinationLocationCode=destination,
+            departureDate=departure_date,
+            returnDate=return_date,
+            adults=adults,
+            max=max_results
+        )
+        
+        flights = []
+        for offer in response.data:
+            # Extract key information
+            price = offer.get('price', {})
+            itineraries = offer.get('itineraries', [])
+            
+            flight_data = {
+                "id": offer.get('id'),
+                "price": {
+                    "total": price.get('total'),
+                    "currency": price.get('currency')
+                },
+                "itineraries": []
+            }
+            
+            for itinerary in itineraries:
+                segments = itinerary.get('segments', [])
+                itinerary_data = {
+                    "duration": itinerary.get('duration'),
+                    "segments": []
+                }
+                
+                for segment in segments:
+                    departure = segment.get('departure', {})
+                    arrival = segment.get('arrival', {})
+                    
+                    itinerary_data["segments"].append({
+                        "departure": {
+                            "airport": departure.get('iataCode'),
+                            "time": departure.get('at')
+                        },
+                        "arrival": {
+                            "airport": arrival.get('iataCode'),
+                            "time": arrival.get('at')
+                        },
+                        "carrier": segment.get('carrierCode'),
+                        "flight_number": segment.get('number'),
+                        "duration": segment.get('duration')
+                    })
+                
+                flight_data["itineraries"].append(itinerary_data)
+            
+            flights.append(flight_data)
+        
+        logger.info(f"Found {len(flights)} flight offer(s)")
+        return flights
+    
     def search_hotels(
         self,
         city_code: str,
@@ -168,27 +246,15 @@ class AmadeusService:
             return {"error": "Amadeus API not configured", "hotels": []}
         
         try:
-            logger.info(f"Searching hotels in {city_code}")
-            
-            # First, get hotel list by city
-            response = self.client.reference_data.locations.hotels.by_city.get(
-                cityCode=city_code
-            )
+            # The hotel list by city does not depend on dates or guests, so
+            # every search for the city shares one cached list.
+            key = _cache_key(city_code)
+            hotels = self.hotel_cache.get(key)
+            if hotels is None:
+                hotels = self._fetch_hotels(city_code)
+                self.hotel_cache.set(key, hotels)
+            hotels = copy.deepcopy(hotels[:max_results])
             
-            hotels = []
-            for hotel in response.data[:max_results]:
-                hotel_data = {
-                    "id": hotel.get('hotelId'),
-                    "name": hotel.get('name'),
-                    "location": {
-                        "latitude": hotel.get('geoCode', {}).get('latitude'),
-                        "longitude": hotel.get('geoCode', {}).get('longitude')
-                    },
-                    "address": hotel.get('address', {})
-                }
-                hotels.append(hotel_data)
-            
-            logger.info(f"Found {len(hotels)} hotel(s) in {city_code}")
             return {
                 "hotels": hotels,
                 "search": {
@@ -211,6 +277,96 @@ class AmadeusService:
                 "hotels": []
             }
     
+    def _fetch_hotels(self, city_code: str) -> List[Dict[str, Any]]:
+        """All hotels listed for a city from the live API; raises on API errors."""
+        logger.info(f"Searching hotels in {city_code}")
+        
+        # First, get hotel list by city
+        response = self.client.reference_data.locations.hotels.by_city.get(
+            cityCode=city_code
+        )
+        
+        hotels = []
+        for hotel in response.data:
+            hotel_data = {
+                "id": hotel.get('hotelId'),
+                "name": hotel.get('name'),
+                "location": {
+                    "latitude": hotel.get('geoCode', {}).get('latitude'),
+                    "longitude": hotel.get('geoCode', {}).get('longitude')
+                },
+                "address": hotel.get('address', {})
+            }
+            hotels.append(hotel_data)
+        
+        logger.info(f"Found {len(hotels)} hotel(s) in {city_code}")
+        return hotels
+    
+    def prefetch(
+        self,
+        routes: Iterable[Tuple[str, str]],
+        trip_days: Iterable[int] = (3,),
+        max_flight_results: int = DEFAULT_FLIGHT_RESULTS
+    ) -> List[Future]:
+        """
+        Warm the caches for popular ``(origin, destination)`` pairs in the background.
+
+        Destinations may be airport codes or city names known to
+        ``get_airport_code``. For every pair, flight offers are fetched for
+        each trip length (with the planners' booking dates) and the
+        destination's hotel list once. Returns one future per lookup.
+        """
+        if not self.is_available():
+            return []
+        if self._prefetch_pool is None:
+            self._prefetch_pool = ThreadPoolExecutor(
+                max_workers=settings.amadeus_prefetch_workers,
+                thread_name_prefix="amadeus-prefetch"
+            )
+        
+        futures = []
+        hotel_codes = set()
+        trip_days = list(trip_days)
+        for origin, destination in routes:
+            code = self.get_airport_code(destination) or destination.upper()
+            for days in trip_days:
+                departure_date, return_date = trip_dates(days)
+                futures.append(self._prefetch_pool.submit(
+                    self._prefetch_one,
+                    self.search_flights,
+                    origin=origin,
+                    destination=code,
+                    departure_date=departure_date,
+                    return_date=return_date,
+                    max_results=max_flight_results
+                ))
+            if code not in hotel_codes:
+                hotel_codes.add(code)
+                futures.append(self._prefetch_pool.submit(self._prefetch_one, self.search_hotels, city_code=code))
+        logger.info(f"Prefetching {len(futures)} Amadeus lookup(s)")
+        return futures
+    
+    def _prefetch_one(self, search, **params: Any) -> Dict[str, Any]:
+        result = search(**params)
+        with self._counter_lock:
+            if result.get("error"):
+                self.prefetch_errors += 1
+            else:
+                self.prefetched += 1
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        """Lookup cache counters, plus call counts when running on the fake client."""
+        calls = getattr(self.client, "calls", None)
+        return {
+            "available": self.is_available(),
+            "flights": self.flight_cache.stats(),
+            "hotels": self.hotel_cache.stats(),
+            "prefetched": self.prefetched,
+            "prefetch_errors": self.prefetch_errors,
+            "api_calls": dict(calls) if calls is not None else None,
+        }
+    
     def get_airport_code(self, city_name: str) -> Optional[str]:
         """
         Get IATA airport code for a city (simplified mapping).
@@ -0,0 +1,240 @@
+"""Shared embedding scheduler and cache for the Knowledge Vault."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches concurrent ``encode`` calls through one SentenceTransformer.
+
+    Callers from any thread (or coroutine, via ``aencode``) enqueue their texts
+    and wait on a future. A single worker thread collects requests for up to
+    ``max_wait_ms`` or until ``max_batch_size`` texts are queued, runs them as
+    one batch and fans the rows back out to each caller. Concurrent single
+    queries therefore share one forward pass instead of contending for the
+    model. The wait only applies while requests are actually overlapping, so
+    a lone caller is not delayed.
+    """
+
+    def __init__(self, model, max_batch_size: int = 64, max_wait_ms: float = 5.0) -> None:
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.texts = 0
+        self._last_batch_requests = 0
+
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, texts: Sequence[str]) -> Future:
+        future: Future = Future()
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype="float32"))
+        else:
+            self._queue.put((list(texts), future))
+        return future
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """Blocking encode; returns a float32 array with one row per text."""
+        return self.submit(texts).result()
+
+    async def aencode(self, texts: Sequence[str]) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(texts))
+
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        """Block for one request, then gather more until the batch is full or the wait expires."""
+        pending = [self._queue.get()]
+        count = len(pending[0][0])
+        # Under no contention, take what is already queued and go.
+        wait = self.max_wait if self._last_batch_requests > 1 or not self._queue.empty() else 0.0
+        deadline = time.monotonic() + wait
+        while count < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            pending.append(item)
+            count += len(item[0])
+        return pending
+
+    def _run(self) -> None:
+        while True:
+            pending = self._collect()
+            texts = [text for item_texts, _ in pending for text in item_texts]
+            try:
+                vectors = self.model.encode(
+                    texts,
+                    batch_size=self.max_batch_size,
+                    convert_to_numpy=True,
+                ).astype("float32")
+            except Exception as exc:  # noqa: BLE001
+                logger.error("Embedding batch failed", exc_info=True)
+                for _, future in pending:
+                    future.set_exception(exc)
+                continue
+
+            offset = 0
+            for item_texts, future in pending:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+            self._last_batch_requests = len(pending)
+            with self._stats_lock:
+                self.batches += 1
+                self.requests += len(pending)
+                self.texts += len(texts)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "texts": self.texts,
+                "mean_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+                "queued": self._queue.qsize(),
+            }
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache: in-memory LRU plus an optional SQLite tier.
+
+    Entries are keyed by sha256 of (model name, whitespace-normalized text), so
+    re-uploaded documents, guides shared across users and repeated queries are
+    embedded once. The on-disk tier survives restarts and is shared between
+    workers on the same host.
+    """
+
+    def __init__(self, model_name: str, max_entries: int = 50_000, cache_dir: Optional[Path] = None) -> None:
+        self.model_name = model_name
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        if cache_dir is not None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(cache_dir / "embeddings.sqlite3"), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+            self._db.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> bytes:
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        return hashlib.sha256(f"{self.model_name}\0{normalized}".encode("utf-8")).digest()
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            self.memory_hits += len(found)
+
+            missing = [key for key in keys if key not in found]
+            if missing and self._db is not None:
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                        batch,
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype="float32")
+                        found[key] = vector
+                        self._remember(key, vector)
+                        self.disk_hits += 1
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[bytes, np.ndarray]) -> None:
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            if self._db is not None and items:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, np.ascontiguousarray(vector, dtype="float32").tobytes()) for key, vector in items.items()],
+                )
+                self._db.commit()
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+class CachedEmbedder:
+    """``EmbeddingBatcher`` front-end that only encodes texts missing from the cache."""
+
+    def __init__(self, batcher: EmbeddingBatcher, cache: EmbeddingCache) -> None:
+        self.batcher = batcher
+        self.cache = cache
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        keys = [self.cache.key(text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Encode each distinct missing text once, even if it repeats in this call.
+        to_encode: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                to_encode.setdefault(key, text)
+        if to_encode:
+            encoded = self.batcher.encode(list(to_encode.values()))
+            fresh = dict(zip(to_encode.keys(), encoded))
+            self.cache.put_many(fresh)
+            vectors.update(fresh)
+
+        if not keys:
+            return np.zeros((0, 0), dtype="float32")
+        return np.stack([vectors[key] for key in keys]).astype("float32", copy=False)
+
+    async def aencode(self, texts: Sequence[str]) -> np.ndarray:
+        return await asyncio.to_thread(self.encode, texts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.batcher.stats(), "cache": self.cache.stats()}
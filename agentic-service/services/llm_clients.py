@@ -0,0 +1,223 @@
+"""
+Shared, pooled OpenAI clients for every LLM call site.
+
+Creating an ``openai.OpenAI`` per request throws away its connection pool,
+so every call pays for a new TCP connection and TLS handshake. The registry
+owns one sync and one async httpx client with tuned pool limits, keep-alive
+and HTTP/2 (when the ``h2`` package is installed), and hands out OpenAI SDK
+and LangChain clients built on top of them.
+
+Connection reuse is measured with httpx's ``trace`` extension: every request
+is counted, and so is every TCP connection the pool has to open.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+import openai
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class _ConnectionMetrics:
+    """Requests vs. newly opened connections for one httpx client."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.errors = 0
+        self.http_versions: Dict[str, int] = {}
+
+    def _on_event(self, name: str) -> None:
+        if name == "connection.connect_tcp.started":
+            with self._lock:
+                self.connections_opened += 1
+
+    def trace(self, name: str, info: Dict[str, Any]) -> None:
+        self._on_event(name)
+
+    async def atrace(self, name: str, info: Dict[str, Any]) -> None:
+        self._on_event(name)
+
+    def on_request(self, request: httpx.Request, trace) -> None:
+        request.extensions["trace"] = trace
+        with self._lock:
+            self.requests += 1
+
+    def on_response(self, response: httpx.Response) -> None:
+        with self._lock:
+            self.http_versions[response.http_version] = self.http_versions.get(response.http_version, 0) + 1
+            if response.status_code >= 500:
+                self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            reused = max(self.requests - self.connections_opened, 0)
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "connections_reused": reused,
+                "reuse_ratio": round(reused / self.requests, 3) if self.requests else None,
+                "server_errors": self.errors,
+                "http_versions": dict(self.http_versions),
+            }
+
+
+class LLMClientRegistry:
+    """Process-wide OpenAI clients sharing two httpx connection pools (sync and async)."""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True,
+        timeout_seconds: float = 60.0,
+        max_retries: int = 2,
+    ) -> None:
+        self.api_key = api_key
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("HTTP/2 requested for LLM clients but 'h2' is not installed; using HTTP/1.1")
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.timeout = httpx.Timeout(timeout_seconds, connect=10.0)
+        self.max_retries = max_retries
+
+        self._lock = threading.Lock()
+        self._sync_metrics = _ConnectionMetrics()
+        self._async_metrics = _ConnectionMetrics()
+        self._http_client: Optional[httpx.Client] = None
+        self._async_http_client: Optional[httpx.AsyncClient] = None
+        self._openai: Optional[openai.OpenAI] = None
+        self._async_openai: Optional[openai.AsyncOpenAI] = None
+        self._chat_models: Dict[Tuple[str, float], Any] = {}
+
+    @classmethod
+    def from_settings(cls) -> "LLMClientRegistry":
+        return cls(
+            api_key=settings.openai_api_key,
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+            http2=settings.llm_http2,
+            timeout_seconds=settings.llm_timeout_seconds,
+            max_retries=settings.llm_max_retries,
+        )
+
+    def http_client(self) -> httpx.Client:
+        with self._lock:
+            if self._http_client is None:
+                metrics = self._sync_metrics
+                self._http_client = openai.DefaultHttpxClient(
+                    limits=self.limits,
+                    http2=self.http2,
+                    timeout=self.timeout,
+                    event_hooks={
+                        "request": [lambda request: metrics.on_request(request, metrics.trace)],
+                        "response": [metrics.on_response],
+                    },
+                )
+            return self._http_client
+
+    def async_http_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_http_client is None:
+                metrics = self._async_metrics
+
+                async def on_request(request: httpx.Request) -> None:
+                    metrics.on_request(request, metrics.atrace)
+
+                async def on_response(response: httpx.Response) -> None:
+                    metrics.on_response(response)
+
+                self._async_http_client = openai.DefaultAsyncHttpxClient(
+                    limits=self.limits,
+                    http2=self.http2,
+                    timeout=self.timeout,
+                    event_hooks={"request": [on_request], "response": [on_response]},
+                )
+            return self._async_http_client
+
+    def openai_client(self) -> openai.OpenAI:
+        """The shared synchronous OpenAI client."""
+        http_client = self.http_client()
+        with self._lock:
+            if self._openai is None:
+                self._openai = openai.OpenAI(
+                    api_key=self.api_key,
+                    http_client=http_client,
+                    max_retries=self.max_retries,
+                )
+            return self._openai
+
+    def async_openai_client(self) -> openai.AsyncOpenAI:
+        """The shared asynchronous OpenAI client."""
+        http_client = self.async_http_client()
+        with self._lock:
+            if self._async_openai is None:
+                self._async_openai = openai.AsyncOpenAI(
+                    api_key=self.api_key,
+                    http_client=http_client,
+                    max_retries=self.max_retries,
+                )
+            return self._async_openai
+
+    def chat_model(self, model: str = "gpt-4o-mini", temperature: float = 0.7):
+        """A LangChain ``ChatOpenAI`` on the shared pools (one per model/temperature)."""
+        from langchain_openai import ChatOpenAI
+
+        http_client = self.http_client()
+        async_http_client = self.async_http_client()
+        with self._lock:
+            key = (model, temperature)
+            if key not in self._chat_models:
+                self._chat_models[key] = ChatOpenAI(
+                    model=model,
+                    temperature=temperature,
+                    api_key=self.api_key,
+                    max_retries=self.max_retries,
+                    http_client=http_client,
+                    http_async_client=async_http_client,
+                )
+            return self._chat_models[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "sync": self._sync_metrics.stats(),
+            "async": self._async_metrics.stats(),
+        }
+
+    async def aclose(self) -> None:
+        with self._lock:
+            http_client, self._http_client = self._http_client, None
+            async_http_client, self._async_http_client = self._async_http_client, None
+            self._openai = self._async_openai = None
+            self._chat_models.clear()
+        if http_client is not None:
+            http_client.close()
+        if async_http_client is not None:
+            await async_http_client.aclose()
+
+
+llm_clients = LLMClientRegistry.from_settings()
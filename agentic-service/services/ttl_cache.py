@@ -0,0 +1,126 @@
+"""
+Generic TTL + LRU cache for JSON-serializable values.
+
+Entries live in an in-memory LRU and, optionally, in a SQLite file that
+survives restarts and is shared by every worker on the host (same layout
+as the embedding cache). Each entry expires ``ttl_seconds`` after it was
+written; expired entries are dropped lazily on read and pruned from disk
+now and then.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+PRUNE_EVERY = 256  # writes between sweeps of expired rows on disk
+
+
+class TTLCache:
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600.0,
+        db_path: Optional[Path] = None,
+    ) -> None:
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        # key -> (expires_at, value), least recently used first
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path is not None:
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f'CREATE TABLE IF NOT EXISTS "{name}" (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._db.commit()
+        self._writes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """The live value for ``key``, or None. Values are shared; copy before mutating."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[1]
+                del self._memory[key]
+                self.expirations += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    f'SELECT value, expires_at FROM "{self.name}" WHERE key = ? AND expires_at > ?',
+                    (key, now),
+                ).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        expires_at = time.time() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._db is not None:
+                self._db.execute(
+                    f'INSERT OR REPLACE INTO "{self.name}" (key, value, expires_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(value), expires_at),
+                )
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    self._db.execute(f'DELETE FROM "{self.name}" WHERE expires_at <= ?', (time.time(),))
+                self._db.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._db is not None:
+                self._db.execute(f'DELETE FROM "{self.name}" WHERE key = ?', (key,))
+                self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute(f'DELETE FROM "{self.name}"')
+                self._db.commit()
+
+    def _remember(self, key: str, expires_at: float, value: Any) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "persistent": self._db is not None,
+            }
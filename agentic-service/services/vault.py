@@ -1,62 +1,84 @@
 """Utilities for ingesting personal knowledge documents into FAISS."""
 from __future__ import annotations
 
+import asyncio
+import functools
+import itertools
+import logging
 import math
+import os
+import re
+import shutil
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Sequence, List, Dict, Any, Generator
+from typing import Optional, Sequence, List, Dict, Any, Generator, AsyncGenerator, Iterable, Iterator, Callable, Deque, Tuple, Hashable
 import json
 
 from fastapi import UploadFile
-from pypdf import PdfReader
 from docx import Document
-import openai
-
 # Use sentence-transformers directly to avoid LangChain metaclass issues
 from sentence_transformers import SentenceTransformer
-import faiss
 import numpy as np
 
 from config import settings
+from services.embedding import CachedEmbedder, EmbeddingBatcher, EmbeddingCache
+from services.llm_clients import llm_clients
+from services.vault_ann import AnnConfig
+from services.vault_answer_cache import SemanticAnswerCache
+from services.vault_documents import DocumentPathIndex
+from services.vault_extraction import PdfExtractor
+from services.vault_index import VaultIndexRouter
+from services.vault_jobs import IngestJob, IngestJobQueue, JobLeaseLost, ProgressCallback
+from services.vault_splitter import TokenTextSplitter, max_chunk_tokens
+from services.vault_text_store import ExtractedTextStore, TextPage, TextStoreWriter
 
+logger = logging.getLogger(__name__)
+
+UPLOAD_BLOCK_SIZE = 1024 * 1024  # bytes copied per read when persisting uploads
+TEXT_BLOCK_CHARS = 1024 * 1024  # characters read per block from plain-text files
+
+NO_DOCUMENTS_ANSWER = (
+    "I don't have any documents in your Knowledge Vault yet. "
+    "Please upload some travel guides or notes first!"
+)
+
+
+def _batched(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+@dataclass
+class BatchDocument:
+    """One file of a batch upload."""
+    upload: UploadFile
+    document_id: str
+    title: str
+    notes: Optional[str] = None
+
+
+@dataclass
+class StagedUpload:
+    """An upload saved to disk; the file it replaces is kept until its ingest settles."""
+    document_id: str
+    user_id: str
+    title: str
+    notes: Optional[str]
+    content_type: Optional[str]
+    path: Path
+    previous_path: Optional[Path]
 
-class SimpleTextSplitter:
-    """Simple text splitter to avoid LangChain dependencies."""
-    
-    def __init__(self, chunk_size: int = 800, chunk_overlap: int = 200):
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
-    
-    def split_text(self, text: str) -> List[str]:
-        """Split text into overlapping chunks."""
-        if not text:
-            return []
-        
-        chunks = []
-        start = 0
-        text_len = len(text)
-        
-        while start < text_len:
-            end = start + self.chunk_size
-            chunk = text[start:end]
-            
-            # Try to break at sentence boundary if possible
-            if end < text_len:
-                # Look for sentence endings
-                for sep in ['. ', '.\n', '! ', '!\n', '? ', '?\n']:
-                    last_sep = chunk.rfind(sep)
-                    if last_sep > self.chunk_size // 2:  # Only break if past halfway
-                        chunk = text[start:start + last_sep + len(sep)]
-                        end = start + last_sep + len(sep)
-                        break
-            
-            chunks.append(chunk.strip())
-            start = end - self.chunk_overlap
-            
-            # Prevent infinite loop
-            if start >= text_len or (end >= text_len and len(chunks) > 0):
-                break
-        
-        return chunks
+
+@dataclass
+class _ExtractedDocument:
+    chunks: List[str]
+    char_count: int
+    text_writer: TextStoreWriter
 
 
 class VaultIngestionService:
@@ -67,18 +89,94 @@ class VaultIngestionService:
         base_dir = Path(__file__).parent.parent
         self.upload_dir = base_dir / "data" / "uploads"
         self.upload_dir.mkdir(parents=True, exist_ok=True)
+        # document_id -> upload path, so finding a file never scans upload_dir
+        self.document_paths = DocumentPathIndex(base_dir / "data" / "documents.sqlite3", self.upload_dir)
 
         self.index_dir = Path(settings.faiss_index_path)
         self.index_dir.mkdir(parents=True, exist_ok=True)
 
+        # Compressed extracted text per document, served by previews.
+        self.text_store = ExtractedTextStore(base_dir / "data" / "text")
+
         # Embedder + splitter reused across requests to avoid reload overhead.
         self.embedder_model = SentenceTransformer(settings.hf_model_name)
-        self.splitter = SimpleTextSplitter(
-            chunk_size=800,
-            chunk_overlap=200,
+        # All encodes (queries and ingest) hit the embedding cache first; misses
+        # go through one micro-batching worker.
+        self.embedder = CachedEmbedder(
+            EmbeddingBatcher(
+                self.embedder_model,
+                max_batch_size=settings.embedding_batch_size,
+                max_wait_ms=settings.embedding_max_wait_ms,
+            ),
+            EmbeddingCache(
+                settings.hf_model_name,
+                max_entries=settings.embedding_cache_size,
+                cache_dir=Path(settings.embedding_cache_dir) if settings.embedding_cache_dir else None,
+            ),
+        )
+        # Chunks must fit the model's input (256 word pieces for MiniLM): the
+        # model silently drops everything past max_seq_length when embedding.
+        chunk_tokens = max_chunk_tokens(self.embedder_model.max_seq_length)
+        if settings.vault_chunk_tokens is not None:
+            if settings.vault_chunk_tokens > chunk_tokens:
+                logger.warning(
+                    f"vault_chunk_tokens={settings.vault_chunk_tokens} may exceed the embedding model's "
+                    f"max_seq_length={self.embedder_model.max_seq_length}; using {chunk_tokens}"
+                )
+            chunk_tokens = min(settings.vault_chunk_tokens, chunk_tokens)
+        self.splitter = TokenTextSplitter(
+            chunk_size=chunk_tokens,
+            chunk_overlap=settings.vault_chunk_overlap_tokens,
         )
-        # Simple FAISS index (will be loaded/created as needed)
+        # One FAISS shard per user, kept resident; disk is only re-read when it changes.
         self.dimension = 384  # MiniLM embedding dimension
+        self.index_store = VaultIndexRouter(
+            self.index_dir,
+            self.dimension,
+            max_resident=settings.vault_max_resident_shards,
+            compaction_threshold=settings.vault_compaction_segments,
+            ann=AnnConfig.from_settings(settings),
+            purge_ratio=settings.vault_purge_ratio,
+        )
+        # Large PDFs are split into page ranges and extracted across processes.
+        self.pdf_extractor = PdfExtractor(
+            workers=settings.vault_extract_workers,
+            min_pages=settings.vault_extract_min_pages,
+            pages_per_task=settings.vault_extract_pages_per_task,
+        )
+
+        # Bounded pool for parsing/embedding/FAISS work driven from async endpoints.
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.vault_executor_workers,
+            thread_name_prefix="vault",
+        )
+        # Uploads and batch ingests get their own pool: a long ingest holds its
+        # thread for minutes, and must never leave queries without one.
+        self._ingest_executor = ThreadPoolExecutor(
+            max_workers=settings.vault_ingest_workers,
+            thread_name_prefix="vault-ingest",
+        )
+        self.async_openai = llm_clients.async_openai_client()
+
+        # Near-duplicate questions against an unchanged vault reuse the earlier answer.
+        self.answer_cache: Optional[SemanticAnswerCache] = None
+        if settings.vault_answer_cache:
+            self.answer_cache = SemanticAnswerCache(
+                threshold=settings.vault_answer_cache_threshold,
+                max_entries=settings.vault_answer_cache_size,
+                ttl_seconds=settings.vault_answer_cache_ttl_seconds,
+            )
+
+        # Queued uploads are ingested by background workers; the queue survives restarts.
+        self.jobs = IngestJobQueue(
+            base_dir / "data" / "jobs.sqlite3",
+            self._run_ingest_job,
+            workers=settings.vault_job_workers,
+            lease_seconds=settings.vault_job_lease_seconds,
+            max_attempts=settings.vault_job_max_attempts,
+            retention_hours=settings.vault_job_retention_hours,
+        )
+        self.jobs.start()
 
     def ingest_document(
         self,
@@ -89,177 +187,591 @@ class VaultIngestionService:
         title: str,
         notes: Optional[str] = None,
     ) -> dict:
-        saved_path = self._persist_upload(upload, document_id)
-        raw_text = self._extract_text(saved_path, upload.content_type)
-        if not raw_text.strip():
-            raise ValueError("Uploaded document does not contain extractable text.")
+        """
+        Store and index an upload. Uploading an existing ``document_id``
+        replaces that document's chunks instead of duplicating them.
+        """
+        staged = self._stage_upload(upload, document_id, user_id, title, notes)
+        try:
+            result = self.ingest_file(
+                staged.path,
+                content_type=staged.content_type,
+                document_id=document_id,
+                user_id=user_id,
+                title=title,
+                notes=notes,
+            )
+        except BaseException:
+            self._settle_upload(staged, succeeded=False)
+            raise
 
-        chunks = self.splitter.split_text(raw_text)
-        if not chunks:
-            raise ValueError("Unable to generate chunks from uploaded document.")
+        self._settle_upload(staged, succeeded=True)
+        return result
 
-        # Load or create FAISS index and metadata
-        index, existing_metadata = self._load_or_create_index()
-        
-        # Generate embeddings for new chunks
-        embeddings = self.embedder_model.encode(chunks, convert_to_numpy=True)
-        
-        # Add to index
-        index.add(embeddings.astype('float32'))
-        
-        # Prepare metadata for new chunks
-        new_metadatas = [
-            {
-                "document_id": document_id,
-                "user_id": user_id,
-                "chunk_index": idx,
+    def enqueue_document(
+        self,
+        *,
+        upload: UploadFile,
+        document_id: str,
+        user_id: str,
+        title: str,
+        notes: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Save an upload and queue it for background ingestion; returns the job."""
+        staged = self._stage_upload(upload, document_id, user_id, title, notes)
+        return self.jobs.enqueue(
+            document_id=document_id,
+            user_id=user_id,
+            payload={
                 "title": title,
                 "notes": notes,
-                "source_path": str(saved_path),
-                "text": chunks[idx],
+                "content_type": staged.content_type,
+                # Relative to upload_dir, like the document path index.
+                "path": staged.path.relative_to(self.upload_dir).as_posix(),
+                "previous_path": (
+                    staged.previous_path.relative_to(self.upload_dir).as_posix()
+                    if staged.previous_path is not None else None
+                ),
+            },
+        )
+
+    def _run_ingest_job(self, job: IngestJob, on_progress: ProgressCallback) -> Dict[str, Any]:
+        payload = job.payload
+        staged = StagedUpload(
+            document_id=job.document_id,
+            user_id=job.user_id,
+            title=payload["title"],
+            notes=payload["notes"],
+            content_type=payload["content_type"],
+            path=self.upload_dir / payload["path"],
+            previous_path=self.upload_dir / payload["previous_path"] if payload["previous_path"] else None,
+        )
+        try:
+            result = self.ingest_file(
+                staged.path,
+                content_type=staged.content_type,
+                document_id=job.document_id,
+                user_id=job.user_id,
+                title=staged.title,
+                notes=staged.notes,
+                on_progress=on_progress,
+            )
+        except JobLeaseLost:
+            raise  # the worker that took the job over settles the upload
+        except BaseException:
+            self._settle_upload(staged, succeeded=False)
+            raise
+        self._settle_upload(staged, succeeded=True)
+        return result
+
+    def stage_uploads(self, documents: Sequence[BatchDocument], user_id: str) -> List[StagedUpload]:
+        """Save every upload of a batch to disk (before the request's files are closed)."""
+        document_ids = [document.document_id for document in documents]
+        if len(set(document_ids)) != len(document_ids):
+            raise ValueError("Each document in a batch needs a distinct documentId.")
+
+        staged: List[StagedUpload] = []
+        try:
+            for document in documents:
+                staged.append(self._stage_upload(
+                    document.upload, document.document_id, user_id, document.title, document.notes
+                ))
+        except BaseException:
+            for item in staged:
+                self._settle_upload(item, succeeded=False)
+            raise
+        return staged
+
+    def ingest_batch(
+        self,
+        documents: Sequence[BatchDocument],
+        user_id: str,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        return self.ingest_staged(self.stage_uploads(documents, user_id), user_id, on_progress)
+
+    def ingest_staged(
+        self,
+        staged: Sequence[StagedUpload],
+        user_id: str,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Ingest many saved uploads into the user's shard as a single segment.
+
+        Documents are extracted and chunked ``vault_batch_extract_threads`` at
+        a time (PDFs go to the extraction process pool whatever their size),
+        chunks are embedded ``vault_batch_embed_size`` at a time across
+        document boundaries, and the shard is committed once. A document that
+        cannot be extracted is reported as failed; the others still commit.
+        ``on_progress`` receives each document's result as it settles.
+        """
+        started = time.perf_counter()
+        report = on_progress or (lambda result: None)
+        results: Dict[str, Dict[str, Any]] = {}
+        extracted: List[Tuple[StagedUpload, _ExtractedDocument]] = []
+        texts: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+
+        def progress(result: Dict[str, Any], processed: int) -> None:
+            elapsed = time.perf_counter() - started
+            report({
+                **result,
+                "processed": processed,
+                "total": len(staged),
+                "docsPerSecond": round(processed / elapsed, 2) if elapsed else 0.0,
+            })
+
+        def flush() -> None:
+            if texts:
+                writer.add(self.embedder.encode(texts), list(metadatas))
+                texts.clear()
+                metadatas.clear()
+
+        writer = self.index_store.open_writer(user_id)
+        try:
+            with ThreadPoolExecutor(
+                max_workers=settings.vault_batch_extract_threads,
+                thread_name_prefix="vault-batch",
+            ) as pool:
+                for processed, (item, future) in enumerate(self._extract_ahead(pool, staged), 1):
+                    try:
+                        document = future.result()
+                    except Exception as exc:  # noqa: BLE001
+                        self._settle_upload(item, succeeded=False)
+                        results[item.document_id] = {
+                            "documentId": item.document_id,
+                            "status": "failed",
+                            "error": str(exc),
+                        }
+                        progress(results[item.document_id], processed)
+                        continue
+
+                    extracted.append((item, document))
+                    for chunk_index, text in enumerate(document.chunks):
+                        texts.append(text)
+                        metadatas.append(self._chunk_metadata(item, user_id, chunk_index, text))
+                        if len(texts) >= settings.vault_batch_embed_size:
+                            flush()
+                    progress({
+                        "documentId": item.document_id,
+                        "status": "extracted",
+                        "chunkCount": len(document.chunks),
+                    }, processed)
+            flush()
+
+            if extracted:
+                self.index_store.commit(user_id, writer, replaces=[item.document_id for item, _ in extracted])
+                self._vault_changed(user_id)
+            else:
+                writer.abort()
+        except BaseException:
+            writer.abort()
+            for item, document in extracted:
+                document.text_writer.abort()
+            for item in staged:
+                if item.document_id not in results:
+                    self._settle_upload(item, succeeded=False)
+            raise
+
+        for item, document in extracted:
+            self._publish_text(document.text_writer)
+            self._settle_upload(item, succeeded=True)
+            results[item.document_id] = {
+                "documentId": item.document_id,
+                "status": "indexed",
+                "chunkCount": len(document.chunks),
+                "tokenEstimate": math.ceil(document.char_count / 4),
+                "filePath": str(item.path.relative_to(self.upload_dir)),
             }
-            for idx in range(len(chunks))
-        ]
-        
-        # Combine with existing metadata
-        all_metadata = existing_metadata + new_metadatas
-        
-        # Save index and metadata
-        self._save_index(index, all_metadata)
-        token_estimate = math.ceil(len(raw_text) / 4)
+            progress(results[item.document_id], len(staged))
+
+        elapsed = time.perf_counter() - started
+        chunk_count = sum(len(document.chunks) for _, document in extracted)
+        return {
+            "userId": user_id,
+            "documents": [results[item.document_id] for item in staged],
+            "indexed": len(extracted),
+            "failed": len(staged) - len(extracted),
+            "chunkCount": chunk_count,
+            "elapsedSeconds": round(elapsed, 3),
+            "docsPerSecond": round(len(extracted) / elapsed, 2) if elapsed else 0.0,
+            "chunksPerSecond": round(chunk_count / elapsed, 1) if elapsed else 0.0,
+        }
+
+    def _extract_ahead(
+        self,
+        pool: ThreadPoolExecutor,
+        staged: Sequence[StagedUpload],
+    ) -> Iterator[Tuple[StagedUpload, Future]]:
+        """
+        Yield ``(upload, future)`` in input order while keeping at most two
+        extractions per thread in flight, so a large batch is never held in
+        memory as chunks all at once.
+        """
+        items = iter(staged)
+        pending: Deque[Tuple[StagedUpload, Future]] = deque()
+
+        def submit(item: StagedUpload) -> None:
+            pending.append((item, pool.submit(self._extract_document, item)))
+
+        try:
+            for item in itertools.islice(items, 2 * settings.vault_batch_extract_threads):
+                submit(item)
+            while pending:
+                yield pending.popleft()
+                item = next(items, None)
+                if item is not None:
+                    submit(item)
+        finally:
+            # Abandoned early (the batch failed): drop text of extractions still in flight.
+            for _, future in pending:
+                if not future.cancel():
+                    future.add_done_callback(
+                        lambda done: done.exception() is None and done.result().text_writer.abort()
+                    )
+
+    def _extract_document(self, item: StagedUpload) -> _ExtractedDocument:
+        """Extract and chunk one upload of a batch, keeping its text for previews."""
+        char_count = 0
+        has_text = False
+        text_writer = self.text_store.writer(item.document_id, item.path)
+
+        def pieces() -> Iterator[str]:
+            nonlocal char_count, has_text
+            for piece in self._iter_text(item.path, item.content_type, pdf_min_pages=1):
+                char_count += len(piece)
+                has_text = has_text or bool(piece.strip())
+                text_writer.add(piece)
+                yield piece
+
+        try:
+            chunks = list(self.splitter.iter_chunks(pieces()))
+            if not has_text:
+                raise ValueError("Uploaded document does not contain extractable text.")
+            if not chunks:
+                raise ValueError("Unable to generate chunks from uploaded document.")
+        except BaseException:
+            text_writer.abort()
+            raise
+        return _ExtractedDocument(chunks=chunks, char_count=char_count, text_writer=text_writer)
+
+    @staticmethod
+    def _chunk_metadata(item: StagedUpload, user_id: str, chunk_index: int, text: str) -> Dict[str, Any]:
+        return {
+            "document_id": item.document_id,
+            "user_id": user_id,
+            "chunk_index": chunk_index,
+            "title": item.title,
+            "notes": item.notes,
+            "source_path": str(item.path),
+            "text": text,
+        }
+
+    def delete_document(self, document_id: str, user_id: str) -> dict:
+        """
+        Remove a document from the user's shard, plus its upload and stored text.
+
+        Chunks are tombstoned right away (searches stop returning them) and
+        physically dropped by the shard's background purge.
+        """
+        deleted = self.index_store.delete_document(user_id, document_id)
+        if deleted:
+            self._vault_changed(user_id)
+            # The upload and stored text are only this user's to remove if the id is theirs.
+            if not self.document_paths.owned_by_other(document_id, user_id):
+                path = self.document_paths.lookup(document_id, user_id)
+                if path is not None:
+                    path.unlink(missing_ok=True)
+                self.document_paths.remove(document_id, user_id)
+                self.text_store.delete(document_id)
+        return {
+            "documentId": document_id,
+            "deletedChunks": deleted,
+            "message": "Document deleted." if deleted else "Document not found in vault.",
+        }
+
+    def ingest_file(
+        self,
+        path: Path,
+        *,
+        content_type: Optional[str],
+        document_id: str,
+        user_id: str,
+        title: str,
+        notes: Optional[str] = None,
+        on_progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> dict:
+        """
+        Stream a stored upload through extract -> chunk -> embed -> index.
+
+        Text is pulled page by page and chunks are embedded and written in
+        batches of ``vault_ingest_batch_size``, so memory stays bounded no
+        matter how large the document is. The segment is only published once
+        every batch has been written.
+
+        ``on_progress(stage, counters)`` is told whenever the pipeline moves
+        between extracting, chunking, embedding and indexing.
+        """
+        char_count = 0
+        has_text = False
+        chunk_count = 0
+        report = on_progress or (lambda stage, counters: None)
+
+        def progress(stage: str) -> None:
+            report(stage, {"chars": char_count, "chunks": chunk_count})
+
+        # The extracted text is also kept for previews, so they never re-parse.
+        text_writer = self.text_store.writer(document_id, path)
+
+        def pieces() -> Iterator[str]:
+            nonlocal char_count, has_text
+            texts = self._iter_text(path, content_type)
+            while True:
+                progress("extracting")
+                piece = next(texts, None)
+                if piece is None:
+                    return
+                char_count += len(piece)
+                has_text = has_text or bool(piece.strip())
+                text_writer.add(piece)
+                progress("chunking")
+                yield piece
+
+        writer = self.index_store.open_writer(user_id)
+        try:
+            chunks = self.splitter.iter_chunks(pieces())
+            for batch in _batched(chunks, settings.vault_ingest_batch_size):
+                progress("embedding")
+                embeddings = self.embedder.encode(batch)
+                writer.add(embeddings, [
+                    {
+                        "document_id": document_id,
+                        "user_id": user_id,
+                        "chunk_index": chunk_count + offset,
+                        "title": title,
+                        "notes": notes,
+                        "source_path": str(path),
+                        "text": text,
+                    }
+                    for offset, text in enumerate(batch)
+                ])
+                chunk_count += len(batch)
+
+            if not has_text:
+                raise ValueError("Uploaded document does not contain extractable text.")
+            if not chunk_count:
+                raise ValueError("Unable to generate chunks from uploaded document.")
+
+            # Publish to the user's resident shard
+            progress("indexing")
+            self.index_store.commit(user_id, writer, replaces=[document_id])
+        except BaseException:
+            writer.abort()
+            text_writer.abort()
+            raise
+
+        self._publish_text(text_writer)
+        self._vault_changed(user_id)
 
         # Store relative path from upload_dir for portability
-        relative_path = saved_path.relative_to(self.upload_dir)
+        relative_path = path.relative_to(self.upload_dir)
         
         return {
             "documentId": document_id,
-            "chunkCount": len(chunks),
-            "tokenEstimate": token_estimate,
+            "chunkCount": chunk_count,
+            "tokenEstimate": math.ceil(char_count / 4),
             "filePath": str(relative_path),
             "message": "Document ingested and indexed.",
         }
 
-    def _persist_upload(self, upload: UploadFile, document_id: str) -> Path:
-        target_path = self.upload_dir / f"{document_id}_{upload.filename or 'document'}"
-        with target_path.open("wb") as destination:
-            contents = upload.file.read()
-            destination.write(contents)
+    def stats(self) -> Dict[str, Any]:
+        """Resident index, embedding batcher and cache counters for monitoring."""
+        return {
+            "index": self.index_store.stats(),
+            "embedding": self.embedder.stats(),
+            "extraction": self.pdf_extractor.stats(),
+            "text_store": self.text_store.stats(),
+            "documents": self.document_paths.count(),
+            "jobs": self.jobs.stats(),
+            "answer_cache": self.answer_cache.stats() if self.answer_cache is not None else None,
+        }
+
+    def _stage_upload(
+        self,
+        upload: UploadFile,
+        document_id: str,
+        user_id: str,
+        title: str,
+        notes: Optional[str],
+    ) -> StagedUpload:
+        if self.document_paths.owned_by_other(document_id, user_id):
+            raise ValueError(f"documentId {document_id} is already used by another user.")
+        previous_path = self.document_paths.lookup(document_id, user_id)
+        return StagedUpload(
+            document_id=document_id,
+            user_id=user_id,
+            title=title,
+            notes=notes,
+            content_type=upload.content_type,
+            path=self._persist_upload(upload, document_id, user_id),
+            previous_path=previous_path,
+        )
+
+    @staticmethod
+    def _publish_text(text_writer: TextStoreWriter) -> None:
+        """
+        Publish extracted text once its chunks are committed, so a failed
+        ingest never leaves a preview of text that was not indexed.
+        """
+        try:
+            text_writer.commit()
+        except OSError:
+            # The chunks are already live; the preview extracts again on demand.
+            logger.warning(f"Could not store extracted text at {text_writer.target}", exc_info=True)
+            text_writer.abort()
+
+    def _settle_upload(self, staged: StagedUpload, succeeded: bool) -> None:
+        """Once ingest succeeded drop the replaced upload; after a failure restore it."""
+        if staged.previous_path is None or staged.previous_path == staged.path:
+            return
+        if succeeded:
+            staged.previous_path.unlink(missing_ok=True)
+        elif staged.previous_path.exists():  # gone if an earlier attempt of a retried job settled
+            staged.path.unlink(missing_ok=True)
+            self.document_paths.record(staged.document_id, staged.previous_path, staged.user_id)
+
+    def _persist_upload(self, upload: UploadFile, document_id: str, user_id: str) -> Path:
+        target_path = self.document_paths.target_path(document_id, upload.filename or "document")
+        # Written aside and moved into place only once the id is recorded as
+        # this user's, so a concurrent upload by another user cannot clobber it.
+        tmp_path = target_path.with_name(f".{uuid.uuid4().hex}.tmp")
+        with tmp_path.open("wb") as destination:
+            shutil.copyfileobj(upload.file, destination, UPLOAD_BLOCK_SIZE)
         upload.file.seek(0)
+        if not self.document_paths.record(document_id, target_path, user_id):
+            tmp_path.unlink(missing_ok=True)
+            raise ValueError(f"documentId {document_id} is already used by another user.")
+        os.replace(tmp_path, target_path)
         return target_path
 
     def _extract_text(self, path: Path, content_type: Optional[str]) -> str:
+        return "".join(self._iter_text(path, content_type))
+
+    def preview_text(
+        self,
+        document_id: str,
+        path: Path,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> TextPage:
+        """
+        A page of a document's extracted text, served from the text store.
+
+        Documents ingested before the store existed (or whose file changed)
+        are extracted once and stored, so later previews are cheap too.
+        """
+        page = self.text_store.read(document_id, path, offset, limit)
+        if page is not None:
+            return page
+
+        text_writer = self.text_store.writer(document_id, path)
+        try:
+            for piece in self._iter_text(path, None):
+                text_writer.add(piece)
+            text_writer.commit()
+        except BaseException:
+            text_writer.abort()
+            raise
+        return self.text_store.read(document_id, path, offset, limit)
+
+    def _iter_text(
+        self,
+        path: Path,
+        content_type: Optional[str],
+        pdf_min_pages: Optional[int] = None,
+    ) -> Iterator[str]:
+        """Yield a document's text piece by piece; the pieces concatenate to the full text."""
         suffix = path.suffix.lower()
         content_type = (content_type or "").lower()
 
         if "pdf" in content_type or suffix == ".pdf":
-            return self._extract_pdf_text(path)
-
-        if "wordprocessingml" in content_type or suffix == ".docx":
-            return self._extract_docx_text(path)
-
-        data = path.read_text(encoding="utf-8", errors="ignore")
-        return data
+            yield from self._iter_pdf_text(path, pdf_min_pages)
+        elif "wordprocessingml" in content_type or suffix == ".docx":
+            yield from self._iter_docx_text(path)
+        else:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                while block := f.read(TEXT_BLOCK_CHARS):
+                    yield block
 
-    @staticmethod
-    def _extract_pdf_text(path: Path) -> str:
-        reader = PdfReader(str(path))
-        text_segments: list[str] = []
-        for page in reader.pages:
-            page_text = page.extract_text() or ""
-            text_segments.append(page_text)
-        return "\n".join(text_segments)
+    def _iter_pdf_text(self, path: Path, min_pages: Optional[int] = None) -> Iterator[str]:
+        for number, page_text in enumerate(self.pdf_extractor.iter_pages(path, min_pages)):
+            yield page_text if number == 0 else "\n" + page_text
 
     @staticmethod
-    def _extract_docx_text(path: Path) -> str:
+    def _iter_docx_text(path: Path) -> Iterator[str]:
         document = Document(str(path))
-        return "\n".join(paragraph.text for paragraph in document.paragraphs)
-
-    def _load_or_create_index(self):
-        """Load existing FAISS index and metadata, or create new ones."""
-        index_file = self.index_dir / "index.faiss"
-        metadata_file = self.index_dir / "metadata.json"
-        
-        if index_file.exists() and metadata_file.exists():
-            # Load existing index
-            index = faiss.read_index(str(index_file))
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-            return index, metadata
-        else:
-            # Create new index
-            index = faiss.IndexFlatL2(self.dimension)
-            return index, []
-    
-    def _save_index(self, index, metadata):
-        """Save FAISS index and metadata to disk."""
-        index_file = self.index_dir / "index.faiss"
-        metadata_file = self.index_dir / "metadata.json"
-        
-        faiss.write_index(index, str(index_file))
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        for number, paragraph in enumerate(document.paragraphs):
+            yield paragraph.text if number == 0 else "\n" + paragraph.text
 
     def query_documents(
         self,
         query: str,
         user_id: str,
         top_k: int = 5,
+        query_embedding: Optional[np.ndarray] = None,
     ) -> List[Dict[str, Any]]:
         """
         Query FAISS index for documents relevant to user's question.
-        Filters results by user_id to ensure data isolation.
-        """
-        index, metadata = self._load_or_create_index()
-        if index.ntotal == 0:  # No vectors in index
-            return []
+        Only the user's own shard is searched, which keeps data isolated.
 
-        # Generate query embedding
-        query_embedding = self.embedder_model.encode([query], convert_to_numpy=True)
-        
-        # Search for similar vectors (k = top_k * 3 to allow for filtering)
-        distances, indices = index.search(query_embedding.astype('float32'), min(top_k * 3, index.ntotal))
+        With ``vault_hybrid_search`` the vector ranking is fused with a BM25
+        ranking by reciprocal rank fusion, so exact strings (booking codes,
+        hotel names, flight numbers) are found even when MiniLM misses them.
+        ``relevance_score`` is then the fused score (higher is better);
+        otherwise it is the L2 distance as before.
+        """
+        # Generate query embedding (unless the caller already has it)
+        if query_embedding is None:
+            query_embedding = self.embedder.encode([query])
         
-        # Filter by user_id and format results
-        filtered_results = []
-        for idx, distance in zip(indices[0], distances[0]):
-            if idx >= len(metadata):
-                continue
-            
-            meta = metadata[idx]
-            if meta.get("user_id") == user_id:
-                filtered_results.append({
-                    "text": meta.get("text", ""),
-                    "title": meta.get("title", "Unknown"),
-                    "document_id": meta.get("document_id"),
-                    "chunk_index": meta.get("chunk_index", 0),
-                    "relevance_score": float(distance),
-                })
-                if len(filtered_results) >= top_k:
-                    break
+        # Search only this user's shard, so no over-fetch/post-filter is needed
+        if not settings.vault_hybrid_search:
+            matches = self.index_store.search(user_id, query_embedding, top_k)
+            return [{**self._chunk_result(meta), "relevance_score": distance} for meta, distance in matches]
 
-        return filtered_results
-
-    def generate_answer(
-        self,
-        query: str,
-        user_id: str,
-        top_k: int = 3,
-    ) -> Dict[str, Any]:
-        """
-        RAG pipeline: retrieve relevant chunks, generate answer with OpenAI.
-        Returns answer with citations.
-        """
-        # Retrieve relevant document chunks
-        chunks = self.query_documents(query, user_id, top_k)
+        candidates = max(top_k, settings.vault_hybrid_candidates)
+        rankings = (
+            ("vector_distance", self.index_store.search(user_id, query_embedding, candidates)),
+            ("bm25_score", self.index_store.lexical_search(user_id, query, candidates)),
+        )
+        fused: Dict[int, Dict[str, Any]] = {}
+        for field, matches in rankings:
+            for rank, (meta, score) in enumerate(matches, 1):
+                chunk = fused.get(meta["chunk_id"])
+                if chunk is None:
+                    chunk = fused[meta["chunk_id"]] = {
+                        **self._chunk_result(meta),
+                        "relevance_score": 0.0,
+                        "vector_distance": None,
+                        "bm25_score": None,
+                    }
+                chunk["relevance_score"] += 1.0 / (settings.vault_rrf_k + rank)
+                chunk[field] = score
+        return sorted(fused.values(), key=lambda chunk: chunk["relevance_score"], reverse=True)[:top_k]
 
-        if not chunks:
-            return {
-                "answer": "I don't have any documents in your Knowledge Vault yet. Please upload some travel guides or notes first!",
-                "chunks": [],
-                "citations": [],
-            }
+    @staticmethod
+    def _chunk_result(meta: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "text": meta.get("text", ""),
+            "title": meta.get("title", "Unknown"),
+            "document_id": meta.get("document_id"),
+            "chunk_index": meta.get("chunk_index", 0),
+        }
 
-        # Build context from top chunks
+    @staticmethod
+    def _build_context(chunks: List[Dict[str, Any]]) -> tuple[str, List[Dict[str, Any]]]:
+        """Numbered [Source N] context plus de-duplicated document citations."""
         context_parts = []
         citations = []
         seen_docs = set()
@@ -274,10 +786,10 @@ class VaultIngestionService:
                 })
                 seen_docs.add(doc_key)
 
-        context = "\n\n".join(context_parts)
+        return "\n\n".join(context_parts), citations
 
-        # Generate answer with OpenAI
-        client = openai.OpenAI(api_key=settings.openai_api_key)
+    @staticmethod
+    def _answer_messages(query: str, context: str) -> List[Dict[str, str]]:
         system_prompt = """You are a helpful travel assistant. Answer the user's question based on the provided context from their uploaded documents.
 
 IMPORTANT:
@@ -293,25 +805,109 @@ User's question: {query}
 
 Answer the question based on the context above. Include [Source N] citations."""
 
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+
+    def _vault_changed(self, user_id: str) -> None:
+        """Drop cached answers once a user's documents change."""
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate(user_id)
+
+    def _lookup_answer(
+        self,
+        query: str,
+        user_id: str,
+        top_k: int,
+    ) -> Tuple[Optional[Dict[str, Any]], np.ndarray, Hashable]:
+        """
+        Embed ``query`` and look for a cached answer to a near-identical question.
+
+        Returns the cached answer (or None), the query embedding for retrieval
+        and the vault version to store a fresh answer under. The version is
+        read before retrieval, so an answer racing an ingest is filed under
+        the old version and never served.
+        """
+        query_embedding = self.embedder.encode([query])
+        version = self.index_store.content_version(user_id)
+        cached = None
+        if self.answer_cache is not None:
+            cached = self.answer_cache.get(user_id, version, top_k, query_embedding[0])
+        return cached, query_embedding, version
+
+    def _remember_answer(
+        self,
+        user_id: str,
+        version: Hashable,
+        top_k: int,
+        query_embedding: np.ndarray,
+        answer: Dict[str, Any],
+    ) -> None:
+        if self.answer_cache is not None:
+            self.answer_cache.put(user_id, version, top_k, query_embedding[0], answer)
+
+    @staticmethod
+    def _cached_response(cached: Dict[str, Any]) -> Dict[str, Any]:
+        return {**cached, "tokens_used": 0, "cached": True}
+
+    @staticmethod
+    def _replay_answer(cached: Dict[str, Any]) -> Iterator[str]:
+        """A cached answer as the same SSE messages a live answer stream sends."""
+        yield f"data: {json.dumps({'type': 'citations', 'content': cached['citations']})}\n\n"
+        for piece in re.findall(r"\s*\S+", cached["answer"]):
+            yield f"data: {json.dumps({'type': 'token', 'content': piece})}\n\n"
+        yield f"data: {json.dumps({'type': 'done', 'cached': True})}\n\n"
+
+    def generate_answer(
+        self,
+        query: str,
+        user_id: str,
+        top_k: int = 3,
+    ) -> Dict[str, Any]:
+        """
+        RAG pipeline: retrieve relevant chunks, generate answer with OpenAI.
+        Returns answer with citations.
+
+        A near-duplicate of an earlier question against the same vault
+        version is answered from the answer cache (``cached: true``).
+        """
+        cached, query_embedding, version = self._lookup_answer(query, user_id, top_k)
+        if cached is not None:
+            return self._cached_response(cached)
+
+        # Retrieve relevant document chunks
+        chunks = self.query_documents(query, user_id, top_k, query_embedding=query_embedding)
+
+        if not chunks:
+            return {
+                "answer": NO_DOCUMENTS_ANSWER,
+                "chunks": [],
+                "citations": [],
+            }
+
+        context, citations = self._build_context(chunks)
+
+        # Generate answer with OpenAI
+        client = llm_clients.openai_client()
         try:
             response = client.chat.completions.create(
                 model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
+                messages=self._answer_messages(query, context),
                 temperature=0.3,
                 max_tokens=500,
             )
 
             answer = response.choices[0].message.content
 
-            return {
+            result = {
                 "answer": answer,
                 "chunks": chunks,
                 "citations": citations,
                 "tokens_used": response.usage.total_tokens,
             }
+            self._remember_answer(user_id, version, top_k, query_embedding, result)
+            return result
 
         except Exception as e:
             return {
@@ -329,70 +925,260 @@ Answer the question based on the context above. Include [Source N] citations."""
     ) -> Generator[str, None, None]:
         """
         RAG pipeline with streaming: retrieve chunks, stream OpenAI response.
-        Yields Server-Sent Event formatted messages.
+        Yields Server-Sent Event formatted messages; cached answers are
+        replayed in the same format.
         """
+        cached, query_embedding, version = self._lookup_answer(query, user_id, top_k)
+        if cached is not None:
+            yield from self._replay_answer(cached)
+            return
+
         # Retrieve relevant document chunks
-        chunks = self.query_documents(query, user_id, top_k)
+        chunks = self.query_documents(query, user_id, top_k, query_embedding=query_embedding)
 
         if not chunks:
             yield f"data: {json.dumps({'type': 'error', 'content': 'No documents found in your Knowledge Vault'})}\n\n"
             return
 
-        # Build context and citations
-        context_parts = []
-        citations = []
-        seen_docs = set()
-
-        for idx, chunk in enumerate(chunks, 1):
-            context_parts.append(f"[Source {idx}] {chunk['text']}")
-            doc_key = (chunk["document_id"], chunk["title"])
-            if doc_key not in seen_docs:
-                citations.append({
-                    "title": chunk["title"],
-                    "document_id": chunk["document_id"],
-                })
-                seen_docs.add(doc_key)
+        context, citations = self._build_context(chunks)
 
         # Send citations first
         yield f"data: {json.dumps({'type': 'citations', 'content': citations})}\n\n"
 
-        context = "\n\n".join(context_parts)
-
         # Stream answer from OpenAI
-        client = openai.OpenAI(api_key=settings.openai_api_key)
-        system_prompt = """You are a helpful travel assistant. Answer the user's question based on the provided context from their uploaded documents.
+        client = llm_clients.openai_client()
+        try:
+            stream = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=self._answer_messages(query, context),
+                temperature=0.3,
+                max_tokens=500,
+                stream=True,
+            )
 
-IMPORTANT:
-- Only use information from the provided sources
-- If the context doesn't contain the answer, say so clearly
-- Cite sources using [Source N] format when referencing information
-- Be concise but comprehensive"""
+            answer = []
+            for chunk in stream:
+                if chunk.choices[0].delta.content:
+                    content = chunk.choices[0].delta.content
+                    answer.append(content)
+                    yield f"data: {json.dumps({'type': 'token', 'content': content})}\n\n"
 
-        user_prompt = f"""Context from user's documents:
-{context}
+            self._remember_answer(user_id, version, top_k, query_embedding, {
+                "answer": "".join(answer),
+                "chunks": chunks,
+                "citations": citations,
+                "tokens_used": None,
+            })
+            # Signal completion
+            yield f"data: {json.dumps({'type': 'done'})}\n\n"
 
-User's question: {query}
+        except Exception as e:
+            yield f"data: {json.dumps({'type': 'error', 'content': str(e)})}\n\n"
 
-Answer the question based on the context above. Include [Source N] citations."""
+    # ------------------------------------------------------------------
+    # Async API: CPU/disk work runs on the bounded executors (ingests on their
+    # own) and the LLM call uses the async OpenAI client, so the event loop is
+    # never blocked.
+    # ------------------------------------------------------------------
+
+    async def _run_blocking(self, func, /, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _run_ingest(self, func, /, *args, **kwargs):
+        """Like ``_run_blocking``, on the ingest pool so writes never starve queries."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._ingest_executor, functools.partial(func, *args, **kwargs))
+
+    async def aingest_document(
+        self,
+        *,
+        upload: UploadFile,
+        document_id: str,
+        user_id: str,
+        title: str,
+        notes: Optional[str] = None,
+    ) -> dict:
+        return await self._run_ingest(
+            self.ingest_document,
+            upload=upload,
+            document_id=document_id,
+            user_id=user_id,
+            title=title,
+            notes=notes,
+        )
+
+    async def aenqueue_document(
+        self,
+        *,
+        upload: UploadFile,
+        document_id: str,
+        user_id: str,
+        title: str,
+        notes: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        return await self._run_ingest(
+            self.enqueue_document,
+            upload=upload,
+            document_id=document_id,
+            user_id=user_id,
+            title=title,
+            notes=notes,
+        )
+
+    async def astage_uploads(self, documents: Sequence[BatchDocument], user_id: str) -> List[StagedUpload]:
+        return await self._run_ingest(self.stage_uploads, documents, user_id)
+
+    async def aingest_staged(self, staged: Sequence[StagedUpload], user_id: str) -> Dict[str, Any]:
+        return await self._run_ingest(self.ingest_staged, staged, user_id)
+
+    async def aingest_staged_events(
+        self,
+        staged: Sequence[StagedUpload],
+        user_id: str,
+    ) -> AsyncGenerator[str, None]:
+        """``ingest_staged`` as Server-Sent Events: one per document, then the summary."""
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+
+        def publish(event: Optional[Dict[str, Any]]) -> None:
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        def run() -> None:
+            try:
+                summary = self.ingest_staged(
+                    staged,
+                    user_id,
+                    on_progress=lambda result: publish({"type": "document", "content": result}),
+                )
+                publish({"type": "summary", "content": summary})
+            except Exception as exc:  # noqa: BLE001
+                logger.error("Vault batch ingestion failed", exc_info=True)
+                publish({"type": "error", "content": str(exc)})
+            finally:
+                publish(None)
+
+        # Keeps running if the client disconnects; the batch still commits.
+        loop.run_in_executor(self._ingest_executor, run)
+        while (event := await events.get()) is not None:
+            yield f"data: {json.dumps(event)}\n\n"
+        yield f"data: {json.dumps({'type': 'done'})}\n\n"
+
+    async def adelete_document(self, document_id: str, user_id: str) -> dict:
+        return await self._run_ingest(self.delete_document, document_id, user_id)
+
+    async def aextract_text(self, path: Path, content_type: Optional[str]) -> str:
+        return await self._run_blocking(self._extract_text, path, content_type)
+
+    async def apreview_text(
+        self,
+        document_id: str,
+        path: Path,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> TextPage:
+        return await self._run_blocking(self.preview_text, document_id, path, offset, limit)
+
+    async def aquery_documents(
+        self,
+        query: str,
+        user_id: str,
+        top_k: int = 5,
+        query_embedding: Optional[np.ndarray] = None,
+    ) -> List[Dict[str, Any]]:
+        return await self._run_blocking(self.query_documents, query, user_id, top_k, query_embedding)
+
+    async def agenerate_answer(
+        self,
+        query: str,
+        user_id: str,
+        top_k: int = 3,
+    ) -> Dict[str, Any]:
+        """Async variant of ``generate_answer``."""
+        cached, query_embedding, version = await self._run_blocking(self._lookup_answer, query, user_id, top_k)
+        if cached is not None:
+            return self._cached_response(cached)
+
+        chunks = await self.aquery_documents(query, user_id, top_k, query_embedding)
+
+        if not chunks:
+            return {
+                "answer": NO_DOCUMENTS_ANSWER,
+                "chunks": [],
+                "citations": [],
+            }
+
+        context, citations = self._build_context(chunks)
 
         try:
-            stream = client.chat.completions.create(
+            response = await self.async_openai.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=self._answer_messages(query, context),
+                temperature=0.3,
+                max_tokens=500,
+            )
+
+            result = {
+                "answer": response.choices[0].message.content,
+                "chunks": chunks,
+                "citations": citations,
+                "tokens_used": response.usage.total_tokens,
+            }
+            self._remember_answer(user_id, version, top_k, query_embedding, result)
+            return result
+
+        except Exception as e:
+            return {
+                "answer": f"Error generating answer: {str(e)}",
+                "chunks": chunks,
+                "citations": citations,
+                "error": str(e),
+            }
+
+    async def agenerate_answer_stream(
+        self,
+        query: str,
+        user_id: str,
+        top_k: int = 3,
+    ) -> AsyncGenerator[str, None]:
+        """Async variant of ``generate_answer_stream`` (same SSE messages)."""
+        cached, query_embedding, version = await self._run_blocking(self._lookup_answer, query, user_id, top_k)
+        if cached is not None:
+            for message in self._replay_answer(cached):
+                yield message
+            return
+
+        chunks = await self.aquery_documents(query, user_id, top_k, query_embedding)
+
+        if not chunks:
+            yield f"data: {json.dumps({'type': 'error', 'content': 'No documents found in your Knowledge Vault'})}\n\n"
+            return
+
+        context, citations = self._build_context(chunks)
+        yield f"data: {json.dumps({'type': 'citations', 'content': citations})}\n\n"
+
+        try:
+            stream = await self.async_openai.chat.completions.create(
                 model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
+                messages=self._answer_messages(query, context),
                 temperature=0.3,
                 max_tokens=500,
                 stream=True,
             )
 
-            for chunk in stream:
-                if chunk.choices[0].delta.content:
+            answer = []
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
                     content = chunk.choices[0].delta.content
+                    answer.append(content)
                     yield f"data: {json.dumps({'type': 'token', 'content': content})}\n\n"
 
-            # Signal completion
+            self._remember_answer(user_id, version, top_k, query_embedding, {
+                "answer": "".join(answer),
+                "chunks": chunks,
+                "citations": citations,
+                "tokens_used": None,
+            })
             yield f"data: {json.dumps({'type': 'done'})}\n\n"
 
         except Exception as e:
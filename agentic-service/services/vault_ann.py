@@ -0,0 +1,250 @@
+"""
+Approximate nearest-neighbour index options for Knowledge Vault shards.
+
+Shards start as exact ``IndexFlatL2`` and switch to the configured ANN type
+(HNSW, IVF-Flat or IVF-PQ) once they hold ``vault_ann_min_vectors`` chunks.
+
+Command line tooling (run from the service directory):
+
+    python -m services.vault_ann rebuild [--user USER_ID] [--kind hnsw]
+    python -m services.vault_ann report --user USER_ID [--k 10] [--queries 200]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+PQ_NBITS = 8  # bits per PQ code, i.e. 256 centroids per sub-quantizer codebook
+
+
+@dataclass(frozen=True)
+class AnnConfig:
+    """Which index a shard should use and how to tune it."""
+
+    kind: str = "flat"
+    min_vectors: int = 50_000
+    hnsw_m: int = 32
+    hnsw_ef_search: int = 64
+    ivf_nlist: int = 0  # 0 = derive from shard size
+    ivf_nprobe: int = 16
+    pq_m: int = 16
+
+    @classmethod
+    def from_settings(cls, settings) -> "AnnConfig":
+        kind = settings.vault_index_type.lower()
+        if kind not in INDEX_TYPES:
+            raise ValueError(f"Unknown vault_index_type '{kind}', expected one of {INDEX_TYPES}")
+        return cls(
+            kind=kind,
+            min_vectors=settings.vault_ann_min_vectors,
+            hnsw_m=settings.vault_hnsw_m,
+            hnsw_ef_search=settings.vault_hnsw_ef_search,
+            ivf_nlist=settings.vault_ivf_nlist,
+            ivf_nprobe=settings.vault_ivf_nprobe,
+            pq_m=settings.vault_pq_m,
+        )
+
+    def kind_for(self, ntotal: int) -> str:
+        """Index type a shard of ``ntotal`` vectors should use."""
+        if ntotal >= max(self.min_vectors, self.min_training_vectors(self.kind)):
+            return self.kind
+        return "flat"
+
+    def min_training_vectors(self, kind: str) -> int:
+        """Fewest vectors an index of ``kind`` can be trained on."""
+        if kind == "ivf_pq":
+            return max(2 ** PQ_NBITS, self.ivf_nlist)
+        if kind == "ivf_flat":
+            return max(1, self.ivf_nlist)
+        return 0
+
+
+def _nlist_for(config: AnnConfig, ntotal: int) -> int:
+    if config.ivf_nlist:
+        return config.ivf_nlist
+    # ~4*sqrt(n) lists, while keeping >= 39 training points per centroid.
+    return max(1, min(int(4 * math.sqrt(ntotal)), ntotal // 39))
+
+
+def index_kind(index: faiss.Index) -> str:
+    """Name of the INDEX_TYPES entry an index was built as."""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return "ivf_pq" if isinstance(ivf, faiss.IndexIVFPQ) else "ivf_flat"
+    return "flat"
+
+
+def tune_index(index: faiss.Index, config: AnnConfig) -> None:
+    """Apply search-time parameters (not persisted by faiss.write_index)."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = config.hnsw_ef_search
+        return
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(config.ivf_nprobe, ivf.nlist)
+
+
+def search_parameters(index: faiss.Index, config: AnnConfig, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Per-query parameters restricting a search to ``selector``, keeping the tuned ANN knobs."""
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=config.hnsw_ef_search)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=min(config.ivf_nprobe, ivf.nlist))
+    return faiss.SearchParameters(sel=selector)
+
+
+def build_index(kind: str, vectors: np.ndarray, dimension: int, config: AnnConfig) -> faiss.Index:
+    """Create (and train, if needed) an index of ``kind`` containing ``vectors``."""
+    ntotal = len(vectors)
+    if ntotal < config.min_training_vectors(kind):
+        raise ValueError(
+            f"{kind} needs at least {config.min_training_vectors(kind)} vectors to train, got {ntotal}"
+        )
+    if kind == "ivf_pq" and dimension % config.pq_m:
+        raise ValueError(f"vault_pq_m={config.pq_m} must divide the embedding dimension {dimension}")
+    if kind == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, config.hnsw_m)
+    elif kind == "ivf_flat":
+        index = faiss.index_factory(dimension, f"IVF{_nlist_for(config, ntotal)},Flat")
+    elif kind == "ivf_pq":
+        index = faiss.index_factory(dimension, f"IVF{_nlist_for(config, ntotal)},PQ{config.pq_m}x{PQ_NBITS}")
+    else:
+        raise ValueError(f"Unknown index type '{kind}'")
+
+    if not index.is_trained:
+        index.train(vectors)
+    if ntotal:
+        index.add(vectors)
+    tune_index(index, config)
+    return index
+
+
+def recall_report(
+    vectors: np.ndarray,
+    dimension: int,
+    config: AnnConfig,
+    kinds=INDEX_TYPES[1:],
+    k: int = 10,
+    num_queries: int = 200,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Compare ANN index types against the exact flat baseline on ``vectors``.
+
+    Queries are perturbed copies of stored vectors. Reports build time, mean
+    and p95 per-query latency and recall@k against flat search.
+    """
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+    noise = rng.normal(scale=0.01, size=(len(picks), dimension)).astype("float32")
+    queries = np.ascontiguousarray(vectors[picks] + noise, dtype="float32")
+    k = min(k, len(vectors))
+
+    rows: List[Dict[str, Any]] = []
+    truth = None
+    for kind in ("flat", *kinds):
+        if len(vectors) < config.min_training_vectors(kind):
+            rows.append({"index": kind, "skipped": f"needs {config.min_training_vectors(kind)} vectors"})
+            continue
+        started = time.perf_counter()
+        index = build_index(kind, vectors, dimension, config)
+        build_seconds = time.perf_counter() - started
+
+        latencies = []
+        results = np.empty((len(queries), k), dtype="int64")
+        for row, query in enumerate(queries):
+            started = time.perf_counter()
+            _, ids = index.search(query[None, :], k)
+            latencies.append(time.perf_counter() - started)
+            results[row] = ids[0]
+
+        if truth is None:
+            truth = results
+        recall = np.mean([
+            len(set(found) & set(expected)) / k for found, expected in zip(results, truth)
+        ])
+        rows.append({
+            "index": kind,
+            "build_seconds": round(build_seconds, 3),
+            "mean_ms": round(1000 * float(np.mean(latencies)), 4),
+            "p95_ms": round(1000 * float(np.percentile(latencies, 95)), 4),
+            f"recall@{k}": round(float(recall), 4),
+        })
+    return rows
+
+
+def _main() -> None:
+    from config import settings
+    from services.vault_index import VaultIndexRouter
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser(description="Knowledge Vault ANN index tooling")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = sub.add_parser("rebuild", help="Rebuild shard indexes with the configured ANN type")
+    rebuild.add_argument("--user", help="Only rebuild this user's shard")
+    rebuild.add_argument("--kind", choices=INDEX_TYPES, help="Override VAULT_INDEX_TYPE")
+    rebuild.add_argument("--force", action="store_true", help="Ignore VAULT_ANN_MIN_VECTORS")
+
+    report = sub.add_parser("report", help="Recall vs latency of ANN types against flat search")
+    report.add_argument("--user", required=True)
+    report.add_argument("--k", type=int, default=10)
+    report.add_argument("--queries", type=int, default=200)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    config = server_config = AnnConfig.from_settings(settings)
+    if getattr(args, "kind", None):
+        config = replace(config, kind=args.kind)
+    if getattr(args, "force", False):
+        config = replace(config, min_vectors=0)
+
+    router = VaultIndexRouter(Path(settings.faiss_index_path), 384, ann=config)
+
+    if args.command == "rebuild":
+        names = [router.shard_name(args.user)] if args.user else [
+            path.name for path in router.shards_dir.iterdir() if path.is_dir()
+        ]
+        for name in names:
+            shard = router.shard_by_name(name)
+            kind = shard.rebuild()
+            vectors = shard.stats()["vectors"]
+            requested = config.kind
+            note = ""
+            if kind != requested and requested != "flat":
+                note = f" ({requested} needs {config.min_training_vectors(requested)} vectors to train)"
+            expected = server_config.kind_for(vectors)
+            if expected != kind:
+                # The server rebuilds shards whose type does not match its own settings.
+                note += (
+                    f"; a server running with VAULT_INDEX_TYPE={server_config.kind} and "
+                    f"VAULT_ANN_MIN_VECTORS={server_config.min_vectors} will rebuild it as {expected}"
+                )
+            print(f"{name}: {vectors} vectors -> {kind}{note}")
+    else:
+        vectors = router.shard(args.user).vectors()
+        if not len(vectors):
+            raise SystemExit("Shard is empty")
+        rows = recall_report(vectors, vectors.shape[1], config, k=args.k, num_queries=args.queries)
+        print(json.dumps({"vectors": len(vectors), "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    _main()
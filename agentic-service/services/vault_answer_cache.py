@@ -0,0 +1,148 @@
+"""
+Semantic cache of Knowledge Vault RAG answers.
+
+Users often repeat a question, or ask it again in slightly different words,
+against a vault that has not changed. An entry is keyed by user, vault
+version and top_k, and matched on the cosine similarity of query embeddings,
+so a near-duplicate question is answered without another gpt-4o-mini call.
+
+The vault version comes from the shard on disk (see
+``ResidentVaultIndex.content_version``), so an ingest or delete in any
+worker makes older entries unreachable; the ingesting worker also drops
+them right away to free memory. Expired entries, and entries of an older
+version, are dropped whenever that user's entries are read or written.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+
+@dataclass
+class _Entry:
+    vector: np.ndarray  # unit-length query embedding
+    version: Hashable
+    top_k: int
+    answer: Dict[str, Any]
+    created: float
+
+
+@dataclass
+class _UserEntries:
+    entries: List[_Entry] = field(default_factory=list)
+    matrix: Optional[np.ndarray] = None  # stacked vectors, rebuilt lazily
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold: float = 0.97, max_entries: int = 10_000, ttl_seconds: float = 86_400.0) -> None:
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        # user_id -> entries, least recently used user first
+        self._users: "OrderedDict[str, _UserEntries]" = OrderedDict()
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _unit(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype="float32").reshape(-1)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def _prune(self, user: _UserEntries, version: Hashable, now: float) -> None:
+        """Drop the user's entries that can never match again: expired, or for another vault version."""
+        live = [
+            entry for entry in user.entries
+            if entry.version == version and now - entry.created <= self.ttl_seconds
+        ]
+        dropped = len(user.entries) - len(live)
+        if dropped:
+            self.expirations += sum(1 for entry in user.entries if now - entry.created > self.ttl_seconds)
+            user.entries = live
+            user.matrix = None
+            self._size -= dropped
+
+    def get(self, user_id: str, version: Hashable, top_k: int, embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        """The cached answer of the most similar earlier question, if similar enough."""
+        query = self._unit(embedding)
+        now = time.time()
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None:
+                self._prune(user, version, now)
+                if not user.entries:
+                    del self._users[user_id]
+                    user = None
+            if user is None:
+                self.misses += 1
+                return None
+            self._users.move_to_end(user_id)
+
+            if user.matrix is None:
+                user.matrix = np.stack([entry.vector for entry in user.entries])
+            similarities = user.matrix @ query
+            best: Optional[_Entry] = None
+            best_similarity = self.threshold
+            for number in np.flatnonzero(similarities >= self.threshold):
+                entry = user.entries[number]
+                if entry.top_k != top_k:
+                    continue
+                if similarities[number] >= best_similarity:
+                    best, best_similarity = entry, float(similarities[number])
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {**best.answer, "similarity": round(best_similarity, 4)}
+
+    def put(self, user_id: str, version: Hashable, top_k: int, embedding: np.ndarray, answer: Dict[str, Any]) -> None:
+        entry = _Entry(self._unit(embedding), version, top_k, answer, time.time())
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                user = self._users[user_id] = _UserEntries()
+            self._users.move_to_end(user_id)
+
+            self._prune(user, version, entry.created)
+            user.entries.append(entry)
+            user.matrix = None
+            self._size += 1
+
+            while self._size > self.max_entries and self._users:
+                oldest_id, oldest = next(iter(self._users.items()))
+                if oldest is user and len(user.entries) > 1:
+                    user.entries.pop(0)  # oldest entry of the only user left
+                    self._size -= 1
+                    continue
+                del self._users[oldest_id]
+                self._size -= len(oldest.entries)
+
+    def invalidate(self, user_id: str) -> None:
+        """Forget every answer for ``user_id`` (their vault changed)."""
+        with self._lock:
+            user = self._users.pop(user_id, None)
+            if user is not None:
+                self._size -= len(user.entries)
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": self._size,
+                "users": len(self._users),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,196 @@
+"""
+BM25 postings for Knowledge Vault segments.
+
+Every segment has a ``<stem>.bm25`` file next to its vectors and records::
+
+    header length (8 bytes) | header JSON {"terms": [...], "rows": n, "tokens": t}
+    | lengths  uint32 x rows        tokens per chunk
+    | offsets  uint32 x terms + 1   postings range of each term
+    | rows     uint32 x postings    segment-local chunk rows, ascending per term
+    | tfs      uint16 x postings    term frequency in that chunk
+
+Postings are built with ``array.array`` while a segment is written and are
+memory-mapped when read, so an ingest only pays for its own chunks and a
+query only touches the postings of its terms.
+"""
+from __future__ import annotations
+
+import json
+import math
+import mmap
+import re
+import struct
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TERM_PATTERN = re.compile(r"\w+")
+HEADER_LENGTH = struct.Struct("<Q")
+MAX_TF = 0xFFFF
+
+
+def terms_of(text: str) -> List[str]:
+    """Lower-cased word terms; booking codes and flight numbers stay whole (``ab12cd``)."""
+    return TERM_PATTERN.findall(text.lower())
+
+
+def _write(path: Path, terms: Sequence[str], lengths, offsets, rows, tfs) -> None:
+    header = json.dumps({
+        "terms": list(terms),
+        "rows": len(lengths),
+        "tokens": int(np.sum(np.asarray(lengths, dtype=np.uint64))),
+    }, ensure_ascii=False).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        for values, dtype in ((lengths, "<u4"), (offsets, "<u4"), (rows, "<u4"), (tfs, "<u2")):
+            f.write(np.asarray(values, dtype=dtype).tobytes())
+
+
+class PostingsBuilder:
+    """Accumulates postings for a segment being written, one chunk at a time."""
+
+    def __init__(self) -> None:
+        self.lengths = array("I")
+        self._postings: Dict[str, Tuple[array, array]] = {}
+
+    def add(self, text: str) -> None:
+        row = len(self.lengths)
+        counts = Counter(terms_of(text))
+        self.lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            entry = self._postings.get(term)
+            if entry is None:
+                entry = self._postings[term] = (array("I"), array("H"))
+            entry[0].append(row)
+            entry[1].append(min(tf, MAX_TF))
+
+    def extend(self, texts: Iterable[str]) -> "PostingsBuilder":
+        for text in texts:
+            self.add(text)
+        return self
+
+    def write(self, path: Path) -> None:
+        terms = sorted(self._postings)
+        offsets = array("I", [0])
+        rows = array("I")
+        tfs = array("H")
+        for term in terms:
+            term_rows, term_tfs = self._postings[term]
+            rows.extend(term_rows)
+            tfs.extend(term_tfs)
+            offsets.append(len(rows))
+        _write(path, terms, self.lengths, offsets, rows, tfs)
+
+
+class SegmentPostings:
+    """Read-only, memory-mapped postings of one segment."""
+
+    def __init__(self, path: Path) -> None:
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (header_length,) = HEADER_LENGTH.unpack_from(self._map, 0)
+        header = json.loads(self._map[HEADER_LENGTH.size:HEADER_LENGTH.size + header_length])
+
+        self.term_ids = {term: number for number, term in enumerate(header["terms"])}
+        self.tokens: int = header["tokens"]
+        position = HEADER_LENGTH.size + header_length
+        sections = []
+        for dtype, count in (
+            ("<u4", header["rows"]),
+            ("<u4", len(self.term_ids) + 1),
+            ("<u4", None),
+            ("<u2", None),
+        ):
+            if count is None:
+                count = int(sections[1][-1])
+            sections.append(np.frombuffer(self._map, dtype=dtype, count=count, offset=position))
+            position += sections[-1].nbytes
+        self.lengths, self.offsets, self.rows, self.tfs = sections
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        number = self.term_ids.get(term)
+        if number is None:
+            return None
+        start, stop = int(self.offsets[number]), int(self.offsets[number + 1])
+        return self.rows[start:stop], self.tfs[start:stop]
+
+    def close(self) -> None:
+        # Arrays viewing the map must be released before it can be closed.
+        self.lengths = self.offsets = self.rows = self.tfs = None
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # a query still holds a view; the map is freed with it
+
+
+def merge_postings(parts: Sequence[SegmentPostings], path: Path) -> None:
+    """Write the postings of consecutive segments as one, re-basing chunk rows."""
+    terms = sorted(set().union(*(part.term_ids for part in parts)))
+    global_ids = {term: number for number, term in enumerate(terms)}
+
+    term_parts, row_parts, tf_parts = [], [], []
+    row_offset = 0
+    for part in parts:
+        local_terms = sorted(part.term_ids, key=part.term_ids.get)
+        mapping = np.fromiter((global_ids[term] for term in local_terms), dtype=np.int64, count=len(local_terms))
+        term_parts.append(np.repeat(mapping, np.diff(part.offsets.astype(np.int64))))
+        row_parts.append(part.rows.astype(np.uint32) + row_offset)
+        tf_parts.append(part.tfs)
+        row_offset += len(part)
+
+    term_index = np.concatenate(term_parts) if term_parts else np.zeros(0, dtype=np.int64)
+    # Stable sort keeps each term's rows in segment order, i.e. ascending.
+    order = np.argsort(term_index, kind="stable")
+    offsets = np.searchsorted(term_index[order], np.arange(len(terms) + 1))
+    _write(
+        path,
+        terms,
+        np.concatenate([part.lengths for part in parts]) if parts else [],
+        offsets,
+        np.concatenate(row_parts)[order] if parts else [],
+        np.concatenate(tf_parts)[order] if parts else [],
+    )
+
+
+def bm25_scores(
+    segments: Sequence[Tuple[SegmentPostings, int]],
+    query: str,
+    k1: float = 1.2,
+    b: float = 0.75,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Okapi BM25 over ``(postings, first_row)`` segments of one shard.
+
+    Returns matching shard rows and their scores (unsorted).
+    """
+    terms = list(dict.fromkeys(terms_of(query)))
+    total_rows = sum(len(part) for part, _ in segments)
+    if not terms or not total_rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    average_length = max(sum(part.tokens for part, _ in segments) / total_rows, 1.0)
+
+    row_parts, score_parts = [], []
+    for term in terms:
+        hits = [(part, first_row, part.postings(term)) for part, first_row in segments]
+        hits = [(part, first_row, found) for part, first_row, found in hits if found is not None]
+        frequency = sum(len(found[0]) for _, _, found in hits)
+        if not frequency:
+            continue
+        idf = math.log(1 + (total_rows - frequency + 0.5) / (frequency + 0.5))
+        for part, first_row, (rows, tfs) in hits:
+            tf = tfs.astype(np.float32)
+            lengths = part.lengths[rows].astype(np.float32)
+            score_parts.append(idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths / average_length)))
+            row_parts.append(rows.astype(np.int64) + first_row)
+
+    if not row_parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    rows, inverse = np.unique(np.concatenate(row_parts), return_inverse=True)
+    return rows, np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
@@ -0,0 +1,146 @@
+"""
+Persistent document_id -> upload path index for the Knowledge Vault.
+
+Uploads are stored in hash-prefix subdirectories
+(``uploads/<sha256(id)[:2]>/<sha256(id)[2:4]>/<id>_<filename>``) so no
+directory grows without bound, and their location is recorded in SQLite so
+finding a document's file never scans the uploads directory.
+
+Each document id belongs to the user who first uploaded it (uploads indexed
+before owners were recorded are claimed by their next upload), so one user
+cannot replace or delete another user's file by reusing its id.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def shard_dir(upload_dir: Path, document_id: str) -> Path:
+    key = hashlib.sha256(document_id.encode("utf-8")).hexdigest()
+    return upload_dir / key[:2] / key[2:4]
+
+
+class DocumentPathIndex:
+    def __init__(self, db_path: Path, upload_dir: Path) -> None:
+        self.upload_dir = upload_dir
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " document_id TEXT PRIMARY KEY,"
+            " path TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " user_id TEXT)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.commit()
+        self._add_owner_column()
+        self._index_legacy_uploads()
+
+    def _add_owner_column(self) -> None:
+        """Migrate an index written before owners were recorded."""
+        # Under the write lock, so workers starting together add it only once.
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(documents)")}
+            if "user_id" not in columns:
+                self._db.execute("ALTER TABLE documents ADD COLUMN user_id TEXT")
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            raise
+
+    def _index_legacy_uploads(self) -> None:
+        """One-time registration of uploads stored flat in ``upload_dir`` before sharding."""
+        with self._lock:
+            # Every worker runs this at startup against the same file: the write
+            # lock makes the check and the scan one step, so only one of them scans.
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if self._db.execute("SELECT 1 FROM meta WHERE key = 'legacy_indexed'").fetchone():
+                    self._db.rollback()
+                    return
+                rows = [
+                    (path.name.split("_", 1)[0], path.name, time.time())
+                    for path in self.upload_dir.iterdir()
+                    if path.is_file() and "_" in path.name
+                ] if self.upload_dir.exists() else []
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO documents (document_id, path, updated_at) VALUES (?, ?, ?)",
+                    rows,
+                )
+                self._db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('legacy_indexed', '1')")
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        if rows:
+            logger.info(f"Indexed {len(rows)} legacy vault uploads")
+
+    def directory_for(self, document_id: str) -> Path:
+        return shard_dir(self.upload_dir, document_id)
+
+    def target_path(self, document_id: str, filename: str) -> Path:
+        """Sharded location for a new upload (parent directories are created)."""
+        directory = self.directory_for(document_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / f"{document_id}_{filename}"
+
+    def owner(self, document_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT user_id FROM documents WHERE document_id = ?", (document_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def owned_by_other(self, document_id: str, user_id: str) -> bool:
+        return self.owner(document_id) not in (None, user_id)
+
+    def record(self, document_id: str, path: Path, user_id: str) -> bool:
+        """Record the upload's path; False (nothing changed) if another user owns ``document_id``."""
+        relative = path.relative_to(self.upload_dir).as_posix()
+        with self._lock:
+            recorded = self._db.execute(
+                "INSERT INTO documents (document_id, path, updated_at, user_id) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (document_id) DO UPDATE SET"
+                " path = excluded.path, updated_at = excluded.updated_at, user_id = excluded.user_id"
+                " WHERE documents.user_id IS NULL OR documents.user_id = excluded.user_id",
+                (document_id, relative, time.time(), user_id),
+            ).rowcount
+            self._db.commit()
+        return bool(recorded)
+
+    def lookup(self, document_id: str, user_id: Optional[str] = None) -> Optional[Path]:
+        """
+        Absolute path of the document's upload, or ``None`` if unknown,
+        missing on disk, or (given ``user_id``) owned by another user.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT path, user_id FROM documents WHERE document_id = ?", (document_id,)
+            ).fetchone()
+        if row is None or (user_id is not None and row[1] not in (None, user_id)):
+            return None
+        path = self.upload_dir / row[0]
+        return path if path.is_file() else None
+
+    def remove(self, document_id: str, user_id: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM documents WHERE document_id = ? AND (user_id IS NULL OR user_id = ?)",
+                (document_id, user_id),
+            )
+            self._db.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
@@ -0,0 +1,147 @@
+"""
+Parallel PDF text extraction for the Knowledge Vault.
+
+pypdf extracts one page at a time on a single core, so large guidebooks take
+tens of seconds. ``PdfExtractor`` splits a PDF into page ranges, extracts
+them in a process pool and yields the pages back in document order. Short
+PDFs are extracted in-process, where starting workers and re-opening the
+file per range would cost more than it saves.
+
+DOCX files are a single XML part that cannot be split, so they stay
+in-process in ``VaultIngestionService``.
+"""
+from __future__ import annotations
+
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from pypdf import PdfReader
+
+logger = logging.getLogger(__name__)
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Worker entry point: text of pages ``[start, stop)``."""
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        return [reader.pages[number].extract_text() or "" for number in range(start, stop)]
+
+
+class PdfExtractor:
+    """
+    Extracts PDF pages across a lazily started process pool.
+
+    At most ``2 * workers`` page ranges are in flight per document, so the
+    text of a huge PDF is streamed back rather than held in memory at once.
+    If the pool dies (e.g. a worker is OOM-killed) the remaining pages are
+    extracted in-process and a fresh pool is started for the next document.
+
+    Workers are spawned rather than forked: the server process runs model,
+    batcher and job threads, and a forked child could inherit their locks
+    in a held state.
+    """
+
+    def __init__(self, workers: int = 0, min_pages: int = 32, pages_per_task: int = 16) -> None:
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.min_pages = min_pages
+        self.pages_per_task = max(1, pages_per_task)
+
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.parallel_documents = 0
+        self.inline_documents = 0
+        self.pool_failures = 0
+
+    def iter_pages(self, path: Path, min_pages: Optional[int] = None) -> Iterator[str]:
+        """
+        Yield the text of each page of ``path`` in order.
+
+        ``min_pages`` overrides the in-process threshold, e.g. for batch
+        imports that extract many small PDFs at once and want them all on
+        the pool rather than contending for the GIL.
+        """
+        min_pages = self.min_pages if min_pages is None else min_pages
+        with open(path, "rb") as f:
+            reader = PdfReader(f)
+            page_count = len(reader.pages)
+            if self.workers <= 1 or page_count < min_pages:
+                with self._lock:
+                    self.inline_documents += 1
+                for page in reader.pages:
+                    yield page.extract_text() or ""
+                return
+
+        with self._lock:
+            self.parallel_documents += 1
+        yield from self._iter_parallel(path, page_count)
+
+    def _iter_parallel(self, path: Path, page_count: int) -> Iterator[str]:
+        pool = self._executor()
+        starts = iter(range(0, page_count, self.pages_per_task))
+        pending: Deque[Future] = deque()
+
+        def submit(start: int) -> None:
+            stop = min(start + self.pages_per_task, page_count)
+            pending.append(pool.submit(_extract_page_range, str(path), start, stop))
+
+        extracted = 0
+        try:
+            # ``submit`` raises too once the pool is broken, not just ``result``.
+            for start in itertools.islice(starts, self.workers * 2):
+                submit(start)
+            while pending:
+                pages = pending.popleft().result()
+                next_start = next(starts, None)
+                if next_start is not None:
+                    submit(next_start)
+                extracted += len(pages)
+                yield from pages
+        except BrokenProcessPool:
+            logger.warning(f"PDF extraction pool failed; finishing {path.name} in-process")
+            with self._lock:
+                self.pool_failures += 1
+            self._discard(pool)
+        finally:
+            for future in pending:
+                future.cancel()
+
+        if extracted < page_count:
+            yield from _extract_page_range(str(path), extracted, page_count)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _discard(self, pool: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "parallel_documents": self.parallel_documents,
+                "inline_documents": self.inline_documents,
+                "pool_failures": self.pool_failures,
+            }
@@ -0,0 +1,940 @@
+"""In-process, per-user FAISS indexes and chunk metadata for the Knowledge Vault."""
+from __future__ import annotations
+
+import bisect
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Collection, Dict, Iterator, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from services.file_lock import FileLock
+from services.vault_ann import AnnConfig, build_index, index_kind, search_parameters, tune_index
+from services.vault_bm25 import bm25_scores
+from services.vault_segments import (
+    RECORD_DTYPE,
+    Manifest,
+    SegmentReader,
+    SegmentWriter,
+    commit_segment,
+    discard_pending,
+    merge_segments,
+    remove_segment,
+    rewrite_segments,
+    write_segment,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_segment(path: Path) -> Optional[Tuple[int, int]]:
+    """``(first, last)`` ingest numbers covered by a ``<first>-<last>`` segment."""
+    try:
+        first, last = path.name.split(".", 1)[0].split("-")
+        return int(first), int(last)
+    except ValueError:
+        return None
+
+
+def _segment_stem(first: int, last: int) -> str:
+    return f"{first:08d}-{last:08d}"
+
+
+def _resolve_segments(paths) -> Tuple[str, ...]:
+    """Order segments and skip ones already superseded by a compacted range."""
+    ranges = sorted(
+        (rng for rng in map(_parse_segment, paths) if rng),
+        key=lambda rng: (rng[0], -rng[1]),
+    )
+    live: List[str] = []
+    covered_upto = 0
+    for first, last in ranges:
+        if first > covered_upto:
+            live.append(_segment_stem(first, last))
+            covered_upto = last
+    return tuple(live)
+
+
+class ResidentVaultIndex:
+    """
+    Keeps one shard's FAISS index resident between requests.
+
+    On disk a shard is a set of immutable, append-only segments under
+    ``segments/`` (see ``services.vault_segments``). An ingest only writes its
+    own segment; a background compaction later merges small segments into one
+    covering their whole number range. Chunk metadata is not parsed up front:
+    segment record tables and text blobs are memory-mapped and only the
+    returned rows are read.
+
+    Several uvicorn workers may share a shard. Everything that changes it
+    (publishing a segment, tombstoning, compaction and purge swaps, snapshot
+    writes) runs under the shard's ``writer.lock`` file lock and ends by
+    atomically replacing ``segments/MANIFEST.json``. The expensive work
+    (embedding, writing segment files, merging, training) happens before the
+    lock is taken, so writers only serialize on the final renames. Readers
+    never take the file lock: they compare the manifest's segment list with
+    what they have loaded and pick up another worker's ingest by loading just
+    the new segments.
+
+    Small shards are searched exactly with ``IndexFlatL2``. Once a shard
+    reaches ``ann.min_vectors`` it is rebuilt in the background as the
+    configured ANN index and snapshotted to ``ann.faiss`` so restarts do not
+    retrain it.
+
+    Every chunk keeps the stable ``chunk_id`` it was given at ingest (the
+    IndexIDMap role), independent of its row in the FAISS index. Deleting or
+    replacing a document appends its chunk ids to ``tombstones.u8``; searches
+    skip tombstoned rows through an ``IDSelectorBitmap``, and once more than
+    ``purge_ratio`` of the rows are dead a background purge rewrites the
+    segments and the index without them.
+    """
+
+    def __init__(
+        self,
+        index_dir: Path,
+        dimension: int,
+        compaction_threshold: int = 16,
+        ann: Optional[AnnConfig] = None,
+        purge_ratio: float = 0.2,
+    ) -> None:
+        self.index_dir = index_dir
+        self.segments_dir = index_dir / "segments"
+        self.manifest_file = self.segments_dir / "MANIFEST.json"
+        self.snapshot_file = index_dir / "ann.faiss"
+        self.snapshot_meta_file = index_dir / "ann.json"
+        self.tombstone_file = index_dir / "tombstones.u8"
+        self.dimension = dimension
+        self.compaction_threshold = compaction_threshold
+        self.ann = ann or AnnConfig()
+        self.purge_ratio = purge_ratio
+
+        # Lock order: ``_maintenance_lock``, ``_writer_lock`` (both cross-process), ``_lock``.
+        self._writer_lock = FileLock(index_dir / "writer.lock")
+        # Held across a whole compaction or purge so workers take turns at them.
+        self._maintenance_lock = FileLock(index_dir / "maintenance.lock")
+        self._lock = threading.RLock()
+        self._index: Optional[faiss.Index] = None
+        self._segments: Tuple[str, ...] = ()
+        self._readers: List[SegmentReader] = []
+        self._row_starts: List[int] = []
+        self._chunk_ids = np.zeros(0, dtype=np.uint64)
+        self._tombstones = np.zeros(0, dtype=np.uint64)
+        self._tombstone_stamp: Optional[Tuple[int, int]] = None
+        self._deleted = np.zeros(0, dtype=bool)
+        self._compacting = False
+        self._rebuilding = False
+        self._generation = 0  # bumped whenever rows are renumbered (reload, purge)
+
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.compactions = 0
+        self.rebuilds = 0
+        self.purges = 0
+        self.conflicts = 0
+
+        self._bootstrap()
+
+    def _bootstrap(self) -> None:
+        """Create the manifest of a new shard, or of one written before manifests existed."""
+        if self.manifest_file.exists():
+            return
+        with self._writer_lock:
+            if self.manifest_file.exists():
+                return  # another worker got here first
+            self.segments_dir.mkdir(parents=True, exist_ok=True)
+            self._migrate_legacy()
+
+            paths = list(self.segments_dir.glob("*.rec"))
+            segments = _resolve_segments(paths)
+            next_chunk_id = 0
+            for stem in segments:
+                chunk_ids = np.fromfile(self.segments_dir / f"{stem}.rec", dtype=RECORD_DTYPE)["chunk_id"]
+                if len(chunk_ids):
+                    next_chunk_id = max(next_chunk_id, int(chunk_ids.max()) + 1)
+            Manifest(
+                version=1,
+                segments=segments,
+                next_number=self._next_file_number(paths),
+                next_chunk_id=next_chunk_id,
+            ).write(self.manifest_file)
+
+    @staticmethod
+    def _next_file_number(paths) -> int:
+        numbers = [rng[1] for rng in map(_parse_segment, paths) if rng]
+        return max(numbers, default=0) + 1
+
+    def _read_manifest(self) -> Manifest:
+        return Manifest.read(self.manifest_file) or Manifest()
+
+    def content_version(self) -> Tuple[int, int, int]:
+        """
+        Changes whenever any worker adds or deletes chunks in this shard.
+
+        The manifest version moves on every commit, compaction and purge;
+        deletes only append to the tombstone file, whose inode and size are
+        included. Nothing is loaded, so this is cheap to call per query.
+        """
+        try:
+            stat = self.tombstone_file.stat()
+            stamp = (stat.st_ino, stat.st_size)
+        except FileNotFoundError:
+            stamp = (0, 0)
+        return (self._read_manifest().version,) + stamp
+
+    def _migrate_legacy(self) -> None:
+        """Convert whole-file snapshots and .jsonl metadata logs to record segments."""
+        index_file = self.index_dir / "index.faiss"
+        metadata_file = self.index_dir / "metadata.json"
+        if index_file.exists() and metadata_file.exists():
+            index = faiss.read_index(str(index_file))
+            with open(metadata_file, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            number = self._next_file_number(
+                list(self.segments_dir.glob("*.rec")) + list(self.segments_dir.glob("*.jsonl"))
+            )
+            write_segment(
+                self.segments_dir,
+                _segment_stem(number, number),
+                index.reconstruct_n(0, index.ntotal),
+                metadata[: index.ntotal],
+                first_chunk_id=0,
+            )
+            index_file.unlink()
+            metadata_file.unlink()
+
+        legacy_logs = list(self.segments_dir.glob("*.jsonl"))
+        if not legacy_logs:
+            return
+
+        chunk_id = 0
+        for stem in _resolve_segments(legacy_logs):
+            vectors = np.fromfile(self.segments_dir / f"{stem}.vec", dtype="float32")
+            with open(self.segments_dir / f"{stem}.jsonl", "r", encoding="utf-8") as f:
+                metadatas = [json.loads(line) for line in f if line.strip()]
+            write_segment(
+                self.segments_dir,
+                stem,
+                vectors.reshape(-1, self.dimension),
+                metadatas,
+                first_chunk_id=chunk_id,
+            )
+            chunk_id += len(metadatas)
+        for path in legacy_logs:
+            path.unlink(missing_ok=True)
+        logger.info(f"Converted {len(legacy_logs)} legacy segment(s) of vault shard {self.index_dir.name}")
+
+    def _add_reader(self, reader: SegmentReader, add_vectors: bool = True) -> None:
+        self._row_starts.append(self._row_starts[-1] + len(self._readers[-1]) if self._readers else 0)
+        self._readers.append(reader)
+        chunk_ids = reader.chunk_ids()
+        self._chunk_ids = np.concatenate((self._chunk_ids, chunk_ids))
+        self._deleted = np.concatenate((self._deleted, np.isin(chunk_ids, self._tombstones)))
+        if add_vectors:
+            for vectors in reader.iter_vectors():
+                self._index.add(vectors)
+
+    def _set_readers(self, readers: List[SegmentReader]) -> None:
+        """Replace the reader list wholesale and recompute row bookkeeping."""
+        self._readers = []
+        self._row_starts = []
+        self._chunk_ids = np.zeros(0, dtype=np.uint64)
+        self._deleted = np.zeros(0, dtype=bool)
+        for reader in readers:
+            self._add_reader(reader, add_vectors=False)
+
+    def _load_tombstones(self) -> None:
+        """Re-read ``tombstones.u8`` if it changed on disk (e.g. a delete in another worker)."""
+        try:
+            stat = self.tombstone_file.stat()
+            stamp = (stat.st_ino, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._tombstone_stamp:
+            return
+        if stamp is None:
+            self._tombstones = np.zeros(0, dtype=np.uint64)
+        else:
+            self._tombstones = np.unique(np.fromfile(self.tombstone_file, dtype="<u8"))
+        self._tombstone_stamp = stamp
+        self._deleted = np.isin(self._chunk_ids, self._tombstones)
+
+    def _segment_rows(self, stem: str) -> int:
+        return (self.segments_dir / f"{stem}.rec").stat().st_size // RECORD_DTYPE.itemsize
+
+    def _read_snapshot(self, segments: Tuple[str, ...]) -> Tuple[Optional[faiss.Index], int]:
+        """Load the ANN snapshot and return it with how many segments it covers."""
+        try:
+            with open(self.snapshot_meta_file, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None, 0
+
+        # Valid only if a segment boundary falls exactly on the snapshot's last
+        # ingest number and the segments up to it hold exactly its rows.
+        rows = 0
+        for covered, stem in enumerate(segments, 1):
+            rows += self._segment_rows(stem)
+            if _parse_segment(Path(stem))[1] == meta["last_number"]:
+                if rows != meta["rows"]:
+                    break
+                try:
+                    index = faiss.read_index(str(self.index_dir / meta.get("file", self.snapshot_file.name)))
+                except RuntimeError:
+                    return None, 0  # replaced by another worker's snapshot meanwhile
+                if index.ntotal != rows:
+                    return None, 0
+                tune_index(index, self.ann)
+                return index, covered
+        return None, 0
+
+    def _write_snapshot(self, index: faiss.Index, segments: Tuple[str, ...]) -> None:
+        """
+        Write the index under a unique name and publish it by replacing
+        ``ann.json``, so a reader never pairs one worker's index with
+        another's metadata.
+        """
+        if not segments:
+            return
+        name = f"ann-{uuid.uuid4().hex}.faiss"
+        faiss.write_index(index, str(self.index_dir / name))
+
+        meta = {
+            "kind": index_kind(index),
+            "rows": int(index.ntotal),
+            "last_number": _parse_segment(Path(segments[-1]))[1],
+            "file": name,
+        }
+        with self._writer_lock:
+            previous = self._snapshot_name()
+            tmp_meta = self.index_dir / f"ann.json.{uuid.uuid4().hex}.tmp"
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, self.snapshot_meta_file)
+            if previous is not None and previous != name:
+                (self.index_dir / previous).unlink(missing_ok=True)
+
+    def _snapshot_name(self) -> Optional[str]:
+        try:
+            with open(self.snapshot_meta_file, "r", encoding="utf-8") as f:
+                return json.load(f).get("file", self.snapshot_file.name)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _remove_snapshot(self) -> None:
+        previous = self._snapshot_name()
+        self.snapshot_meta_file.unlink(missing_ok=True)
+        if previous is not None:
+            (self.index_dir / previous).unlink(missing_ok=True)
+
+    def _ensure_loaded(self) -> None:
+        """Serve from memory unless the manifest lists segments we have not loaded."""
+        self._load_tombstones()
+        for attempt in range(3):
+            segments = self._read_manifest().segments
+            if self._index is not None and segments == self._segments:
+                self.hits += 1
+                return
+            try:
+                self._load(segments)
+                break
+            except FileNotFoundError:
+                # Another worker compacted the segments this manifest listed
+                # before we opened them; its new manifest is already in place.
+                if attempt == 2:
+                    raise
+        self._maybe_rebuild()
+        self._maybe_purge()
+
+    def _open_readers(self, segments: Tuple[str, ...]) -> List[SegmentReader]:
+        readers: List[SegmentReader] = []
+        try:
+            for stem in segments:
+                readers.append(SegmentReader(self.segments_dir, stem, self.dimension))
+        except BaseException:
+            for reader in readers:
+                reader.close()
+            raise
+        return readers
+
+    def _load(self, segments: Tuple[str, ...]) -> None:
+        """Bring the resident state up to ``segments``; all files are opened before any state changes."""
+        self.misses += 1
+        known = len(self._segments)
+        if self._index is not None and segments[:known] == self._segments:
+            # Another worker appended segments: load only those.
+            for reader in self._open_readers(segments[known:]):
+                self._add_reader(reader)
+            self._segments = segments
+            return
+
+        snapshot, covered = self._read_snapshot(segments)
+        readers = self._open_readers(segments)
+        if self._index is not None:
+            self.reloads += 1
+            logger.info(f"Vault shard {self.index_dir.name} rewritten on disk, reloading")
+        for reader in self._readers:
+            reader.close()
+        self._generation += 1
+
+        self._index = snapshot if snapshot is not None else faiss.IndexFlatL2(self.dimension)
+        self._set_readers(readers)
+        for reader in readers[covered:]:
+            for vectors in reader.iter_vectors():
+                self._index.add(vectors)
+        self._segments = segments
+
+    def _metadata(self, row: int) -> Dict[str, Any]:
+        """Read one row's metadata from the segment that holds it."""
+        position = bisect.bisect_right(self._row_starts, row) - 1
+        return self._readers[position].metadata(row - self._row_starts[position])
+
+    def search(self, embedding: np.ndarray, k: int) -> List[Tuple[Dict[str, Any], float]]:
+        """Return up to ``k`` (metadata, distance) pairs nearest to ``embedding``."""
+        with self._lock:
+            self._ensure_loaded()
+            if self._index.ntotal == 0:
+                return []
+
+            live = int(self._index.ntotal - self._deleted.sum())
+            if live == 0:
+                return []
+            if live < self._index.ntotal:
+                # Only rows whose bit is set (not tombstoned) are considered.
+                bitmap = np.packbits(~self._deleted, bitorder="little")
+                params = search_parameters(self._index, self.ann, faiss.IDSelectorBitmap(len(self._deleted), faiss.swig_ptr(bitmap)))
+                distances, indices = self._index.search(embedding, min(k, live), params=params)
+            else:
+                distances, indices = self._index.search(embedding, min(k, live))
+            return [
+                (self._metadata(int(idx)), float(distance))
+                for idx, distance in zip(indices[0], distances[0])
+                if idx >= 0
+            ]
+
+    def lexical_search(self, query: str, k: int) -> List[Tuple[Dict[str, Any], float]]:
+        """Return up to ``k`` (metadata, BM25 score) pairs, best first."""
+        with self._lock:
+            for attempt in range(2):
+                self._ensure_loaded()
+                try:
+                    segments = [
+                        (reader.postings(), first_row)
+                        for reader, first_row in zip(self._readers, self._row_starts)
+                    ]
+                    break
+                except FileNotFoundError:
+                    # Postings open lazily; another worker compacted the segment
+                    # away first, so reload from its manifest and try again.
+                    if attempt == 1:
+                        raise
+            rows, scores = bm25_scores(segments, query)
+            alive = ~self._deleted[rows]
+            rows, scores = rows[alive], scores[alive]
+            if not len(rows):
+                return []
+
+            if len(rows) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                rows, scores = rows[top], scores[top]
+            order = np.argsort(-scores, kind="stable")
+            return [(self._metadata(int(rows[i])), float(scores[i])) for i in order]
+
+    def open_writer(self) -> SegmentWriter:
+        """Start a new segment that chunks can be streamed into before ``commit``."""
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        return SegmentWriter(self.segments_dir)
+
+    def append(self, embeddings: np.ndarray, metadatas: List[Dict[str, Any]]) -> None:
+        """Write the new chunks as their own segment and add them in place."""
+        writer = self.open_writer()
+        writer.add(embeddings, metadatas)
+        self.commit(writer)
+
+    def commit(self, writer: SegmentWriter, replaces: Collection[str] = ()) -> None:
+        """
+        Publish a written segment and add its vectors to the resident index.
+
+        The segment name and chunk ids are allocated from the manifest under
+        the writer lock, so concurrent ingests in other workers cannot collide.
+        The existing chunks of the ``replaces`` documents are tombstoned in the
+        same critical section, so searches see either the old or the new
+        version of a document, never both.
+        """
+        writer.prepare()
+        with self._writer_lock, self._lock:
+            self._ensure_loaded()
+            if replaces:
+                self._tombstone_documents(set(replaces))
+            manifest = self._read_manifest()
+            stem = _segment_stem(manifest.next_number, manifest.next_number)
+            writer.commit(stem, first_chunk_id=manifest.next_chunk_id)
+            manifest = manifest.bump(
+                segments=manifest.segments + (stem,),
+                next_number=manifest.next_number + 1,
+                next_chunk_id=manifest.next_chunk_id + writer.rows,
+            )
+            manifest.write(self.manifest_file)
+
+            self._add_reader(SegmentReader(self.segments_dir, stem, self.dimension))
+            # Our own write must not look like an external change on the next query.
+            self._segments = manifest.segments
+
+            if len(self._segments) > self.compaction_threshold and not self._compacting:
+                self._compacting = True
+                threading.Thread(target=self._compact, name="vault-compaction", daemon=True).start()
+            self._maybe_rebuild()
+            self._maybe_purge()
+
+    def delete_document(self, document_id: str) -> int:
+        """Tombstone every chunk of ``document_id``; returns how many were live."""
+        with self._writer_lock, self._lock:
+            self._ensure_loaded()
+            deleted = self._tombstone_documents({document_id})
+            self._maybe_purge()
+            return deleted
+
+    def _tombstone_documents(self, document_ids: Collection[str]) -> int:
+        """Append the documents' live chunk ids to the tombstone file (writer lock held)."""
+        masks = [reader.document_rows(document_ids) for reader in self._readers]
+        if not masks:
+            return 0
+        rows = np.concatenate(masks) & ~self._deleted
+        chunk_ids = self._chunk_ids[rows]
+        if not len(chunk_ids):
+            return 0
+
+        with open(self.tombstone_file, "ab") as f:
+            f.write(chunk_ids.astype("<u8").tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        stat = self.tombstone_file.stat()
+        self._tombstone_stamp = (stat.st_ino, stat.st_size)
+        self._tombstones = np.union1d(self._tombstones, chunk_ids)
+        self._deleted |= rows
+        return len(chunk_ids)
+
+    def _maybe_purge(self) -> None:
+        """Start a background purge once tombstoned rows exceed ``purge_ratio``."""
+        if self._compacting or not len(self._deleted):
+            return
+        if self._deleted.sum() / len(self._deleted) > self.purge_ratio:
+            self._compacting = True
+            threading.Thread(target=self._purge, name="vault-purge", daemon=True).start()
+
+    def _purge(self) -> None:
+        """Rewrite the shard without tombstoned rows and swap in a fresh index."""
+        try:
+            with self._maintenance_lock:
+                with self._lock:
+                    # Another worker may have compacted or purged while we waited.
+                    self._ensure_loaded()
+                    if self._deleted.sum() <= self.purge_ratio * len(self._deleted):
+                        return
+                    segments = self._segments
+                    keep = [
+                        ~self._deleted[start:start + len(reader)]
+                        for reader, start in zip(self._readers, self._row_starts)
+                    ]
+
+                writer = rewrite_segments(self.segments_dir, segments, self.dimension, keep)
+                vectors = writer.written_vectors(self.dimension)
+                index = build_index(self.ann.kind_for(len(vectors)), vectors, self.dimension, self.ann)
+                del vectors
+
+                with self._writer_lock, self._lock:
+                    count = len(segments)
+                    manifest = self._read_manifest()
+                    if manifest.segments[:count] != segments or self._segments[:count] != segments:
+                        # Another worker compacted or purged these segments first.
+                        self.conflicts += 1
+                        writer.abort()
+                        return
+                    # A fresh ingest number keeps the purged segment's name distinct
+                    # from every current one, so other workers notice the rewrite.
+                    merged = _segment_stem(_parse_segment(Path(segments[0]))[0], manifest.next_number)
+                    commit_segment(self.segments_dir, merged, writer.tmp_stem)
+                    manifest.bump(
+                        segments=(merged,) + manifest.segments[count:],
+                        next_number=manifest.next_number + 1,
+                    ).write(self.manifest_file)
+                    # Deletes from other workers since ``keep`` was computed.
+                    self._load_tombstones()
+
+                    # Catch up with segments committed while we were rewriting.
+                    for reader in self._readers[count:]:
+                        for batch in reader.iter_vectors():
+                            index.add(batch)
+                    for reader in self._readers[:count]:
+                        reader.close()
+                    self._index = index
+                    self._generation += 1
+                    self._segments = (merged,) + self._segments[count:]
+                    self._set_readers(
+                        [SegmentReader(self.segments_dir, merged, self.dimension)] + self._readers[count:]
+                    )
+
+                    # Purged chunk ids are gone; keep only tombstones that still
+                    # match a row (deletes that raced with the rewrite).
+                    survivors = np.intersect1d(self._tombstones, self._chunk_ids)
+                    tmp_file = self.index_dir / f"tombstones.u8.{uuid.uuid4().hex}.tmp"
+                    survivors.astype("<u8").tofile(tmp_file)
+                    os.replace(tmp_file, self.tombstone_file)
+                    self._tombstone_stamp = None
+                    self._load_tombstones()
+
+                    if index_kind(index) != "flat":
+                        self._write_snapshot(index, self._segments)
+                    else:
+                        self._remove_snapshot()
+                    self.purges += 1
+
+                for stem in segments:
+                    remove_segment(self.segments_dir, stem)
+                logger.info(f"Purged deleted chunks from vault shard {self.index_dir.name}")
+        except Exception:  # noqa: BLE001
+            logger.error("Vault tombstone purge failed", exc_info=True)
+        finally:
+            self._compacting = False
+
+    def vectors(self) -> np.ndarray:
+        """All vectors in the shard, in row order (used for rebuilds and reports)."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._copy_vectors()
+
+    def _copy_vectors(self, start: int = 0) -> np.ndarray:
+        """
+        Copy of the resident vectors from row ``start`` on. The caller holds
+        ``_lock``: once it is released a compaction may close these readers.
+        """
+        parts = [
+            reader.vectors()[max(start - first, 0):]
+            for reader, first in zip(self._readers, self._row_starts)
+            if first + len(reader) > start
+        ]
+        if not parts:
+            return np.zeros((0, self.dimension), dtype="float32")
+        return np.concatenate(parts)
+
+    def _maybe_rebuild(self) -> None:
+        """Rebuild in the background when the shard outgrew (or shrank below) its index type."""
+        if self._rebuilding:
+            return
+        if self.ann.kind_for(self._index.ntotal) != index_kind(self._index):
+            self._rebuilding = True
+            threading.Thread(target=self._background_rebuild, name="vault-ann-rebuild", daemon=True).start()
+
+    def _background_rebuild(self) -> None:
+        try:
+            self.rebuild()
+        except Exception:  # noqa: BLE001
+            logger.error("Vault ANN rebuild failed", exc_info=True)
+        finally:
+            self._rebuilding = False
+
+    def rebuild(self) -> str:
+        """Rebuild (and retrain) the shard's index for its current size; returns the type."""
+        with self._lock:
+            self._ensure_loaded()
+            generation = self._generation
+            # Copied while the readers are pinned; a compaction may swap them
+            # (same rows, same order) as soon as the lock is released.
+            vectors = self._copy_vectors()[:self._index.ntotal]
+        kind = self.ann.kind_for(len(vectors))
+
+        started = time.perf_counter()
+        index = build_index(kind, vectors, self.dimension, self.ann)
+
+        with self._writer_lock, self._lock:
+            if self._generation != generation:
+                # A purge or reload renumbered the rows meanwhile; it left a
+                # valid index behind, so this one is simply dropped.
+                return index_kind(self._index)
+            # Catch up with chunks appended while we were training.
+            if self._index.ntotal > index.ntotal:
+                index.add(self._copy_vectors(start=index.ntotal))
+            self._index = index
+            # Written against the current segments, which a compaction may
+            # have merged since training started.
+            self._write_snapshot(index, self._segments)
+            self.rebuilds += 1
+        logger.info(
+            f"Rebuilt vault shard {self.index_dir.name} as {kind} "
+            f"({len(vectors)} vectors, {time.perf_counter() - started:.1f}s)"
+        )
+        return kind
+
+    def _compact(self) -> None:
+        """Merge all live segments into one covering segment, off the request path."""
+        try:
+            with self._maintenance_lock:
+                segments = self._read_manifest().segments
+                if len(segments) <= self.compaction_threshold:
+                    return  # another worker compacted while we waited
+
+                first = _parse_segment(Path(segments[0]))[0]
+                last = _parse_segment(Path(segments[-1]))[1]
+                merged = _segment_stem(first, last)
+                tmp_stem = merge_segments(self.segments_dir, segments, merged, commit=False)
+
+                with self._writer_lock, self._lock:
+                    count = len(segments)
+                    manifest = self._read_manifest()
+                    if manifest.segments[:count] != segments:
+                        # Another worker compacted or purged these segments first.
+                        self.conflicts += 1
+                        discard_pending(self.segments_dir, tmp_stem)
+                        return
+                    # Publish under the locks so our own readers never see the merged
+                    # segment before the swap. Same rows in the same order, so the
+                    # resident index stays valid; only the readers are replaced.
+                    commit_segment(self.segments_dir, merged, tmp_stem)
+                    manifest.bump(segments=(merged,) + manifest.segments[count:]).write(self.manifest_file)
+                    if self._segments[:count] == segments:
+                        for reader in self._readers[:count]:
+                            reader.close()
+                        self._set_readers(
+                            [SegmentReader(self.segments_dir, merged, self.dimension)] + self._readers[count:]
+                        )
+                        self._segments = (merged,) + self._segments[count:]
+                        if index_kind(self._index) != "flat":
+                            # Keep the snapshot aligned with the new segment boundaries.
+                            self._write_snapshot(self._index, self._segments)
+                    self.compactions += 1
+
+                for stem in segments:
+                    remove_segment(self.segments_dir, stem)
+                logger.info(f"Compacted {len(segments)} segments of vault shard {self.index_dir.name}")
+        except Exception:  # noqa: BLE001
+            logger.error("Vault segment compaction failed", exc_info=True)
+        finally:
+            self._compacting = False
+
+    def maintenance_running(self) -> bool:
+        """Whether a background compaction, purge or ANN rebuild is in progress."""
+        return self._compacting or self._rebuilding
+
+    def close(self) -> None:
+        """Unmap the segments and drop the resident index; the next query reloads from disk."""
+        with self._lock:
+            for reader in self._readers:
+                reader.close()
+            self._index = None
+            self._segments = ()
+            self._set_readers([])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "vectors": self._index.ntotal if self._index is not None else 0,
+                "deleted": int(self._deleted.sum()),
+                "index_type": index_kind(self._index) if self._index is not None else "flat",
+                "segments": len(self._segments),
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "compactions": self.compactions,
+                "rebuilds": self.rebuilds,
+                "purges": self.purges,
+                "conflicts": self.conflicts,
+            }
+
+
+class VaultIndexRouter:
+    """
+    Routes each user to their own index shard under ``<index_dir>/users/``.
+
+    Searches only touch the caller's shard, so latency scales with one user's
+    corpus and recall no longer depends on how much other tenants uploaded.
+    Recently used shards stay resident; the least recently used idle ones are
+    closed once ``max_resident`` is exceeded and reloaded from disk on demand.
+    A shard is created by its user's first write; queries for a user without
+    one find nothing and leave no trace on disk.
+    """
+
+    def __init__(
+        self,
+        index_dir: Path,
+        dimension: int,
+        max_resident: int = 256,
+        compaction_threshold: int = 16,
+        ann: Optional[AnnConfig] = None,
+        purge_ratio: float = 0.2,
+    ) -> None:
+        self.index_dir = index_dir
+        self.shards_dir = index_dir / "users"
+        self.dimension = dimension
+        self.max_resident = max_resident
+        self.compaction_threshold = compaction_threshold
+        self.ann = ann or AnnConfig()
+        self.purge_ratio = purge_ratio
+
+        self._lock = threading.Lock()
+        self._shards: "OrderedDict[str, ResidentVaultIndex]" = OrderedDict()
+        self._users: Dict[str, int] = {}  # shard name -> requests currently using it
+        self.evictions = 0
+
+        self._migrate_global_index()
+        self.shards_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def shard_name(user_id: str) -> str:
+        """Filesystem-safe, stable directory name for a user's shard."""
+        return hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
+
+    def shard(self, user_id: str) -> ResidentVaultIndex:
+        """Return the resident shard for ``user_id``, loading (or creating) it if needed."""
+        return self.shard_by_name(self.shard_name(user_id))
+
+    def shard_by_name(self, name: str) -> ResidentVaultIndex:
+        with self._lock:
+            return self._resident(name, create=True)
+
+    def _resident(self, name: str, create: bool) -> Optional[ResidentVaultIndex]:
+        """The resident shard ``name``, loaded on demand (router lock held)."""
+        shard = self._shards.get(name)
+        if shard is not None:
+            self._shards.move_to_end(name)
+            return shard
+
+        shard_dir = self.shards_dir / name
+        if not create and not shard_dir.is_dir():
+            return None  # queries must not create shards for arbitrary user ids
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        shard = ResidentVaultIndex(
+            shard_dir,
+            self.dimension,
+            self.compaction_threshold,
+            self.ann,
+            self.purge_ratio,
+        )
+        self._shards[name] = shard
+        self._evict()
+        return shard
+
+    def _evict(self) -> None:
+        """
+        Drop least recently used shards beyond ``max_resident`` (router lock held).
+
+        Shards serving a request or running a compaction, purge or rebuild
+        stay resident until a later call finds them idle; evicted shards are
+        closed, so their segment files are unmapped right away.
+        """
+        excess = len(self._shards) - self.max_resident
+        for name, shard in list(self._shards.items()):
+            if excess <= 0:
+                break
+            if self._users.get(name) or shard.maintenance_running():
+                continue
+            del self._shards[name]
+            shard.close()
+            self.evictions += 1
+            excess -= 1
+
+    @contextmanager
+    def _using(self, user_id: str, create: bool = True) -> Iterator[Optional[ResidentVaultIndex]]:
+        """The user's shard, pinned against eviction; None if it does not exist and ``create`` is False."""
+        name = self.shard_name(user_id)
+        with self._lock:
+            shard = self._resident(name, create)
+            if shard is not None:
+                self._users[name] = self._users.get(name, 0) + 1
+        try:
+            yield shard
+        finally:
+            if shard is not None:
+                with self._lock:
+                    self._users[name] -= 1
+                    if not self._users[name]:
+                        del self._users[name]
+                    self._evict()
+
+    def search(self, user_id: str, embedding: np.ndarray, k: int) -> List[Tuple[Dict[str, Any], float]]:
+        with self._using(user_id, create=False) as shard:
+            return shard.search(embedding, k) if shard is not None else []
+
+    def lexical_search(self, user_id: str, query: str, k: int) -> List[Tuple[Dict[str, Any], float]]:
+        with self._using(user_id, create=False) as shard:
+            return shard.lexical_search(query, k) if shard is not None else []
+
+    def append(self, user_id: str, embeddings: np.ndarray, metadatas: List[Dict[str, Any]]) -> None:
+        with self._using(user_id) as shard:
+            shard.append(embeddings, metadatas)
+
+    def open_writer(self, user_id: str) -> SegmentWriter:
+        with self._using(user_id) as shard:
+            return shard.open_writer()
+
+    def commit(self, user_id: str, writer: SegmentWriter, replaces: Collection[str] = ()) -> None:
+        with self._using(user_id) as shard:
+            shard.commit(writer, replaces)
+
+    def delete_document(self, user_id: str, document_id: str) -> int:
+        with self._using(user_id, create=False) as shard:
+            return shard.delete_document(document_id) if shard is not None else 0
+
+    def content_version(self, user_id: str) -> Tuple[int, int, int]:
+        with self._using(user_id, create=False) as shard:
+            return shard.content_version() if shard is not None else (0, 0, 0)
+
+    def _migrate_global_index(self) -> None:
+        """Split a legacy single global index into per-user shards (runs once)."""
+        legacy_index = self.index_dir / "index.faiss"
+        legacy_metadata = self.index_dir / "metadata.json"
+        if self.shards_dir.exists() or not (legacy_index.exists() and legacy_metadata.exists()):
+            return
+        with FileLock(self.index_dir / "migrate.lock"):
+            if not self.shards_dir.exists():  # another worker may have migrated meanwhile
+                self._split_global_index(legacy_index, legacy_metadata)
+
+    def _split_global_index(self, legacy_index: Path, legacy_metadata: Path) -> None:
+        logger.info("Migrating global vault index to per-user shards")
+        index = faiss.read_index(str(legacy_index))
+        with open(legacy_metadata, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        vectors = index.reconstruct_n(0, index.ntotal)
+
+        rows_by_user: Dict[str, List[int]] = {}
+        for row, meta in enumerate(metadata[: index.ntotal]):
+            rows_by_user.setdefault(meta.get("user_id") or "", []).append(row)
+
+        # Build into a scratch directory and rename so a crash never leaves half a layout.
+        staging_dir = self.index_dir / "users.migrating"
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        for user_id, rows in rows_by_user.items():
+            shard_dir = staging_dir / self.shard_name(user_id)
+            shard_dir.mkdir(parents=True, exist_ok=True)
+            ResidentVaultIndex(shard_dir, self.dimension).append(
+                np.ascontiguousarray(vectors[rows]),
+                [metadata[row] for row in rows],
+            )
+        staging_dir.mkdir(parents=True, exist_ok=True)
+        staging_dir.rename(self.shards_dir)
+
+        legacy_index.rename(legacy_index.with_suffix(".faiss.migrated"))
+        legacy_metadata.rename(legacy_metadata.with_suffix(".json.migrated"))
+        logger.info(f"Migrated {index.ntotal} vectors into {len(rows_by_user)} user shard(s)")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            shards = list(self._shards.values())
+            evictions = self.evictions
+        totals: Dict[str, Any] = {"index_types": {}}
+        for shard in shards:
+            for key, value in shard.stats().items():
+                if key == "index_type":
+                    totals["index_types"][value] = totals["index_types"].get(value, 0) + 1
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return {"resident_shards": len(shards), "evictions": evictions, **totals}
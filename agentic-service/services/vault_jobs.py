@@ -0,0 +1,357 @@
+"""
+Persistent background ingestion jobs for the Knowledge Vault.
+
+Large uploads can take longer to extract, embed and index than a proxy lets
+a request stay open, so ``/api/v1/vault/upload`` can save the file, enqueue
+a job and return its id right away. Jobs live in SQLite, so they survive a
+restart, and every uvicorn worker runs a small pool of threads that claim
+them.
+
+A claim is a lease: the worker holding a job renews it from a heartbeat
+thread while the job runs, even while it blocks (e.g. waiting for the vault
+writer lock). A job whose worker died (crash, restart, OOM kill) is
+claimed again once its lease expires, up to ``max_attempts`` times, so a
+document that keeps killing its worker cannot loop forever.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Stages a job moves through; ingestion streams, so extracting, chunking and
+# embedding alternate batch by batch before the final indexing step.
+JOB_STAGES = ("queued", "extracting", "chunking", "embedding", "indexing", "done", "failed")
+
+PROGRESS_INTERVAL = 1.0  # seconds between progress writes within one stage
+PRUNE_INTERVAL = 3600.0
+
+_COLUMNS = (
+    "job_id, document_id, user_id, status, stage, progress, payload, result, error, "
+    "attempts, created_at, updated_at, started_at, finished_at"
+)
+
+
+class JobLeaseLost(RuntimeError):
+    """Raised into a running job once another worker has claimed it."""
+
+
+@dataclass
+class IngestJob:
+    job_id: str
+    document_id: str
+    user_id: str
+    payload: Dict[str, Any]
+    attempts: int
+    owner: str
+
+
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+JobHandler = Callable[[IngestJob, ProgressCallback], Dict[str, Any]]
+
+
+class IngestJobQueue:
+    def __init__(
+        self,
+        db_path: Path,
+        handler: JobHandler,
+        workers: int = 2,
+        lease_seconds: float = 120.0,
+        max_attempts: int = 3,
+        retention_hours: float = 72.0,
+        poll_interval: float = 1.0,
+    ) -> None:
+        self.handler = handler
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retention_hours = retention_hours
+        self.poll_interval = poll_interval
+
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit, so claims can run their own BEGIN IMMEDIATE transaction.
+        self._db = sqlite3.connect(str(db_path), timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " document_id TEXT NOT NULL,"
+            " user_id TEXT NOT NULL,"
+            " status TEXT NOT NULL,"  # queued | running | succeeded | failed
+            " stage TEXT NOT NULL,"
+            " progress TEXT NOT NULL DEFAULT '{}',"
+            " payload TEXT NOT NULL,"
+            " result TEXT,"
+            " error TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " owner TEXT,"
+            " lease_until REAL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_by_user ON jobs (user_id, created_at)")
+
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._last_prune = 0.0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        """Start the worker threads; jobs left over from a previous run are picked up too."""
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"vault-job-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+
+    def enqueue(self, *, document_id: str, user_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (job_id, document_id, user_id, status, stage, payload, created_at, updated_at)"
+                " VALUES (?, ?, ?, 'queued', 'queued', ?, ?, ?)",
+                (job_id, document_id, user_id, json.dumps(payload), now, now),
+            )
+        self._wakeup.set()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(f"SELECT {_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._public(row) if row is not None else None
+
+    def list(self, user_id: str, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """A user's most recent jobs, newest first."""
+        query = f"SELECT {_COLUMNS} FROM jobs WHERE user_id = ?"
+        params: List[Any] = [user_id]
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [self._public(row) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"workers": self.workers, "completed": self.completed, "failed": self.failed, "by_status": counts}
+
+    @staticmethod
+    def _public(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "jobId": row["job_id"],
+            "documentId": row["document_id"],
+            "userId": row["user_id"],
+            "status": row["status"],
+            "stage": row["stage"],
+            "progress": json.loads(row["progress"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "createdAt": row["created_at"],
+            "updatedAt": row["updated_at"],
+            "startedAt": row["started_at"],
+            "finishedAt": row["finished_at"],
+        }
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def _work(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.Error:
+                logger.error("Claiming a vault ingestion job failed", exc_info=True)
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _claim(self) -> Optional[IngestJob]:
+        """Take the oldest runnable job: queued, or running under an expired lease."""
+        while True:
+            now = time.time()
+            owner = uuid.uuid4().hex
+            with self._lock:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    # One job per document at a time keeps re-uploads in order.
+                    row = self._db.execute(
+                        "SELECT job_id, document_id, user_id, payload, attempts FROM jobs"
+                        " WHERE (status = 'queued' OR (status = 'running' AND lease_until < ?))"
+                        " AND document_id NOT IN ("
+                        "  SELECT document_id FROM jobs WHERE status = 'running' AND lease_until >= ?)"
+                        " ORDER BY created_at LIMIT 1",
+                        (now, now),
+                    ).fetchone()
+                    if row is None:
+                        self._db.execute("COMMIT")
+                        break
+                    if row["attempts"] >= self.max_attempts:
+                        self._db.execute(
+                            "UPDATE jobs SET status = 'failed', stage = 'failed', error = ?, owner = NULL,"
+                            " updated_at = ?, finished_at = ? WHERE job_id = ?",
+                            (f"Gave up after {row['attempts']} interrupted attempts.", now, now, row["job_id"]),
+                        )
+                        self._db.execute("COMMIT")
+                        continue
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, owner = ?, lease_until = ?,"
+                        " started_at = ?, updated_at = ? WHERE job_id = ?",
+                        (owner, now + self.lease_seconds, now, now, row["job_id"]),
+                    )
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+            return IngestJob(
+                job_id=row["job_id"],
+                document_id=row["document_id"],
+                user_id=row["user_id"],
+                payload=json.loads(row["payload"]),
+                attempts=row["attempts"] + 1,
+                owner=owner,
+            )
+
+        self._maybe_prune()
+        return None
+
+    def _run(self, job: IngestJob) -> None:
+        progress = _JobProgress(self, job)
+        finished = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(job, progress, finished), name="vault-job-heartbeat", daemon=True
+        )
+        heartbeat.start()
+        try:
+            try:
+                result = self.handler(job, progress)
+            finally:
+                finished.set()
+                heartbeat.join()
+        except JobLeaseLost:
+            logger.warning(f"Vault ingestion job {job.job_id} was taken over by another worker")
+        except Exception as exc:  # noqa: BLE001
+            if not isinstance(exc, ValueError):
+                logger.error(f"Vault ingestion job {job.job_id} failed", exc_info=True)
+            self.failed += 1
+            self._finish(job, "failed", progress.counters, error=str(exc))
+        else:
+            self.completed += 1
+            self._finish(job, "succeeded", progress.counters, result=result)
+
+    def _heartbeat(self, job: IngestJob, progress: "_JobProgress", finished: threading.Event) -> None:
+        """Renew the lease every third of ``lease_seconds`` until the handler returns."""
+        while not finished.wait(self.lease_seconds / 3):
+            now = time.time()
+            try:
+                with self._lock:
+                    renewed = self._db.execute(
+                        "UPDATE jobs SET lease_until = ? WHERE job_id = ? AND owner = ?",
+                        (now + self.lease_seconds, job.job_id, job.owner),
+                    ).rowcount
+            except sqlite3.Error:
+                logger.warning(f"Renewing the lease of vault ingestion job {job.job_id} failed", exc_info=True)
+                continue
+            if not renewed:
+                progress.lease_lost = True  # raised at the handler's next progress report
+                return
+
+    def _update(self, job: IngestJob, stage: str, counters: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            updated = self._db.execute(
+                "UPDATE jobs SET stage = ?, progress = ?, lease_until = ?, updated_at = ?"
+                " WHERE job_id = ? AND owner = ?",
+                (stage, json.dumps(counters), now + self.lease_seconds, now, job.job_id, job.owner),
+            ).rowcount
+        if not updated:
+            raise JobLeaseLost(job.job_id)
+
+    def _finish(
+        self,
+        job: IngestJob,
+        status: str,
+        counters: Dict[str, Any],
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, stage = ?, progress = ?, result = ?, error = ?, owner = NULL,"
+                " lease_until = NULL, updated_at = ?, finished_at = ? WHERE job_id = ? AND owner = ?",
+                (
+                    status,
+                    "done" if status == "succeeded" else "failed",
+                    json.dumps(counters),
+                    json.dumps(result) if result is not None else None,
+                    error,
+                    now,
+                    now,
+                    job.job_id,
+                    job.owner,
+                ),
+            )
+
+    def _maybe_prune(self) -> None:
+        """Drop finished jobs older than ``retention_hours`` (at most once an hour)."""
+        now = time.time()
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+                (now - self.retention_hours * 3600,),
+            )
+
+
+class _JobProgress:
+    """Progress callback handed to the job handler; persists stage changes."""
+
+    def __init__(self, queue: IngestJobQueue, job: IngestJob) -> None:
+        self.queue = queue
+        self.job = job
+        self.counters: Dict[str, Any] = {}
+        self._seen_stages: set = set()
+        self._written = 0.0
+        self.lease_lost = False
+
+    def __call__(self, stage: str, counters: Dict[str, Any]) -> None:
+        if self.lease_lost:
+            raise JobLeaseLost(self.job.job_id)
+        # Entering a stage is always recorded; after that, stages alternate
+        # batch by batch and are sampled at most once per PROGRESS_INTERVAL.
+        self.counters = dict(counters)
+        now = time.monotonic()
+        if stage in self._seen_stages and now - self._written < PROGRESS_INTERVAL:
+            return
+        self._seen_stages.add(stage)
+        self._written = now
+        self.queue._update(self.job, stage, self.counters)
@@ -0,0 +1,415 @@
+"""On-disk segment format for Knowledge Vault shards.
+
+A segment ``<stem>`` is five immutable files:
+
+- ``<stem>.vec``        raw float32 vectors, one row per chunk
+- ``<stem>.txt``        UTF-8 chunk texts concatenated into one blob
+- ``<stem>.docs.json``  per-document fields shared by its chunks (title, notes, ...)
+- ``<stem>.bm25``       BM25 postings of the chunk texts (see ``services.vault_bm25``)
+- ``<stem>.rec``        fixed-width record table, one row per chunk, pointing
+                        into the text blob and the documents table
+
+The ``.rec`` file is renamed into place last and marks the segment complete;
+a segment is only live once the shard's ``MANIFEST.json`` lists it. The
+manifest is rewritten (write, fsync, rename) under the shard's writer lock,
+so every worker process sees one consistent, versioned segment list.
+Readers memory-map the record table, vectors and text blob, so resolving a
+search hit only touches the rows (and the bytes of text) that were actually
+returned, and a reader stays valid after another worker removes its files.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import shutil
+import uuid
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Collection, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.file_lock import fsync_directory
+from services.vault_bm25 import PostingsBuilder, SegmentPostings, merge_postings
+
+RECORD_DTYPE = np.dtype([
+    ("chunk_id", "<u8"),
+    ("text_offset", "<u8"),
+    ("text_length", "<u4"),
+    ("chunk_index", "<u4"),
+    ("document", "<u4"),
+])
+
+# Fields stored once per document rather than once per chunk.
+DOCUMENT_FIELDS = ("document_id", "user_id", "title", "notes", "source_path")
+
+
+SEGMENT_SUFFIXES = (".vec", ".txt", ".docs.json", ".bm25", ".rec")
+
+
+@dataclass(frozen=True)
+class Manifest:
+    """
+    Versioned list of a shard's live segments.
+
+    ``next_number`` and ``next_chunk_id`` are allocated from the manifest
+    rather than from what one process has loaded, so concurrent writers never
+    reuse a segment name or a chunk id.
+    """
+
+    version: int = 0
+    segments: Tuple[str, ...] = ()
+    next_number: int = 1
+    next_chunk_id: int = 0
+
+    @classmethod
+    def read(cls, path: Path) -> Optional["Manifest"]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        return cls(
+            version=data["version"],
+            segments=tuple(data["segments"]),
+            next_number=data["next_number"],
+            next_chunk_id=data["next_chunk_id"],
+        )
+
+    def write(self, path: Path) -> None:
+        """Atomically replace ``path``; call with the shard's writer lock held."""
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": self.version,
+                "segments": list(self.segments),
+                "next_number": self.next_number,
+                "next_chunk_id": self.next_chunk_id,
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        fsync_directory(path.parent)
+
+    def bump(self, **changes: Any) -> "Manifest":
+        """The next version of this manifest with ``changes`` applied."""
+        return replace(self, version=self.version + 1, **changes)
+
+
+def _fsync(path: Path) -> None:
+    with open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+
+def commit_segment(directory: Path, stem: str, tmp_stem: Optional[str] = None) -> None:
+    """Move the temp files of a segment into place, record table last."""
+    tmp_stem = tmp_stem or stem
+    for suffix in SEGMENT_SUFFIXES:
+        os.replace(directory / f"{tmp_stem}{suffix}.tmp", directory / f"{stem}{suffix}")
+
+
+def discard_pending(directory: Path, tmp_stem: str) -> None:
+    """Remove the temp files of a segment that will not be committed."""
+    for suffix in SEGMENT_SUFFIXES:
+        (directory / f"{tmp_stem}{suffix}.tmp").unlink(missing_ok=True)
+
+
+class SegmentWriter:
+    """
+    Streams chunks into a new segment batch by batch.
+
+    Vectors and text go straight to temp files; only the fixed-width records
+    and the per-document table stay in memory until ``commit``, which assigns
+    chunk ids and renames the files into place under their final stem.
+    ``prepare`` writes and syncs everything except the small record table, so
+    the part of a commit done under the shard's writer lock stays short.
+    Metadata that already carries a ``chunk_id`` (rows copied from another
+    segment) keeps it when ``finish``/``commit`` get no ``first_chunk_id``.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self.tmp_stem = f"pending-{uuid.uuid4().hex}"
+        self._vec_file = open(directory / f"{self.tmp_stem}.vec.tmp", "wb")
+        self._text_file = open(directory / f"{self.tmp_stem}.txt.tmp", "wb")
+        self._records: List[np.ndarray] = []
+        self._documents: List[Dict[str, Any]] = []
+        self._document_rows: Dict[tuple, int] = {}
+        self._postings = PostingsBuilder()
+        self._prepared = False
+        self.rows = 0
+
+    def add(self, vectors: np.ndarray, metadatas: Sequence[Dict[str, Any]]) -> None:
+        """Append chunk vectors + metadata dicts (as produced by ingest)."""
+        records = np.zeros(len(metadatas), dtype=RECORD_DTYPE)
+        for row, meta in enumerate(metadatas):
+            doc_key = tuple(meta.get(field) for field in DOCUMENT_FIELDS)
+            if doc_key not in self._document_rows:
+                self._document_rows[doc_key] = len(self._documents)
+                self._documents.append(dict(zip(DOCUMENT_FIELDS, doc_key)))
+
+            encoded = (meta.get("text") or "").encode("utf-8")
+            records[row] = (
+                meta.get("chunk_id", 0),
+                self._text_file.tell(),
+                len(encoded),
+                meta.get("chunk_index", 0),
+                self._document_rows[doc_key],
+            )
+            self._text_file.write(encoded)
+            self._postings.add(meta.get("text") or "")
+
+        self._vec_file.write(np.ascontiguousarray(vectors, dtype="float32").tobytes())
+        self._records.append(records)
+        self.rows += len(metadatas)
+
+    def commit(self, stem: str, first_chunk_id: Optional[int]) -> None:
+        self.finish(first_chunk_id)
+        commit_segment(self.directory, stem, self.tmp_stem)
+
+    def prepare(self) -> None:
+        """Write and sync every temp file except the record table (idempotent)."""
+        if self._prepared:
+            return
+        for f in (self._vec_file, self._text_file):
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        with open(self.directory / f"{self.tmp_stem}.docs.json.tmp", "w", encoding="utf-8") as f:
+            json.dump(self._documents, f, ensure_ascii=False)
+        self._postings.write(self.directory / f"{self.tmp_stem}.bm25.tmp")
+        for suffix in (".docs.json", ".bm25"):
+            _fsync(self.directory / f"{self.tmp_stem}{suffix}.tmp")
+        self._prepared = True
+
+    def finish(self, first_chunk_id: Optional[int]) -> None:
+        """Write the remaining temp files; ``commit_segment`` then publishes them."""
+        self.prepare()
+        records = np.concatenate(self._records) if self._records else np.zeros(0, dtype=RECORD_DTYPE)
+        if first_chunk_id is not None:
+            records["chunk_id"] = first_chunk_id + np.arange(len(records), dtype="uint64")
+        rec_path = self.directory / f"{self.tmp_stem}.rec.tmp"
+        records.tofile(rec_path)
+        _fsync(rec_path)
+
+    def written_vectors(self, dimension: int) -> np.ndarray:
+        """Vectors written so far (after ``finish``), e.g. to build an index before committing."""
+        data = np.fromfile(self.directory / f"{self.tmp_stem}.vec.tmp", dtype="float32")
+        return data.reshape(-1, dimension)
+
+    def abort(self) -> None:
+        self._vec_file.close()
+        self._text_file.close()
+        discard_pending(self.directory, self.tmp_stem)
+
+
+def write_segment(
+    directory: Path,
+    stem: str,
+    vectors: np.ndarray,
+    metadatas: Sequence[Dict[str, Any]],
+    first_chunk_id: int,
+) -> None:
+    """Write chunk vectors + metadata dicts in one go as a segment."""
+    writer = SegmentWriter(directory)
+    writer.add(vectors, metadatas)
+    writer.commit(stem, first_chunk_id)
+
+
+def merge_segments(directory: Path, stems: Sequence[str], merged_stem: str, commit: bool = True) -> str:
+    """
+    Concatenate segments into one by copying bytes and re-basing offsets.
+
+    With ``commit=False`` the merged files are left as temp files under the
+    returned temp stem, so the caller can ``commit_segment`` at the moment it
+    swaps its readers (or ``discard_pending`` if another writer got there first).
+    """
+    tmp_stem = f"pending-{uuid.uuid4().hex}"
+    try:
+        _merge_into(directory, stems, tmp_stem)
+    except BaseException:
+        discard_pending(directory, tmp_stem)
+        raise
+    if commit:
+        commit_segment(directory, merged_stem, tmp_stem)
+    return tmp_stem
+
+
+def _merge_into(directory: Path, stems: Sequence[str], tmp_stem: str) -> None:
+    documents: List[Dict[str, Any]] = []
+    record_parts: List[np.ndarray] = []
+    text_offset = 0
+
+    with open(directory / f"{tmp_stem}.vec.tmp", "wb") as vec_out, \
+            open(directory / f"{tmp_stem}.txt.tmp", "wb") as text_out:
+        for stem in stems:
+            with open(directory / f"{stem}.vec", "rb") as vec_in:
+                shutil.copyfileobj(vec_in, vec_out)
+            with open(directory / f"{stem}.txt", "rb") as text_in:
+                shutil.copyfileobj(text_in, text_out)
+
+            records = np.fromfile(directory / f"{stem}.rec", dtype=RECORD_DTYPE)
+            records["text_offset"] += text_offset
+            records["document"] += len(documents)
+            record_parts.append(records)
+
+            with open(directory / f"{stem}.docs.json", "r", encoding="utf-8") as f:
+                documents.extend(json.load(f))
+            text_offset = text_out.tell()
+
+    with open(directory / f"{tmp_stem}.docs.json.tmp", "w", encoding="utf-8") as f:
+        json.dump(documents, f, ensure_ascii=False)
+    postings = [load_postings(directory, stem) for stem in stems]
+    try:
+        merge_postings(postings, directory / f"{tmp_stem}.bm25.tmp")
+    finally:
+        for part in postings:
+            part.close()
+    np.concatenate(record_parts).tofile(directory / f"{tmp_stem}.rec.tmp")
+    for suffix in SEGMENT_SUFFIXES:
+        _fsync(directory / f"{tmp_stem}{suffix}.tmp")
+
+
+def rewrite_segments(
+    directory: Path,
+    stems: Sequence[str],
+    dimension: int,
+    keep: Sequence[np.ndarray],
+    batch_rows: int = 8192,
+) -> SegmentWriter:
+    """
+    Copy the rows of ``stems`` selected by the boolean ``keep`` masks into a
+    new segment, preserving chunk ids. The segment is finished but not
+    committed: publish it with ``commit_segment(directory, stem, writer.tmp_stem)``.
+    """
+    writer = SegmentWriter(directory)
+    try:
+        for stem, mask in zip(stems, keep):
+            reader = SegmentReader(directory, stem, dimension)
+            try:
+                rows = np.flatnonzero(mask)
+                for start in range(0, len(rows), batch_rows):
+                    batch = rows[start:start + batch_rows]
+                    writer.add(reader.vectors_at(batch), [reader.metadata(int(row)) for row in batch])
+            finally:
+                reader.close()
+        writer.finish(first_chunk_id=None)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer
+
+
+def remove_segment(directory: Path, stem: str) -> None:
+    for suffix in (".rec", ".vec", ".txt", ".docs.json", ".bm25", ".jsonl"):
+        (directory / f"{stem}{suffix}").unlink(missing_ok=True)
+
+
+def load_postings(directory: Path, stem: str) -> SegmentPostings:
+    """Open a segment's postings, building them first for segments written before BM25."""
+    path = directory / f"{stem}.bm25"
+    if not path.exists():
+        records = np.fromfile(directory / f"{stem}.rec", dtype=RECORD_DTYPE)
+        with open(directory / f"{stem}.txt", "rb") as f:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+            builder = PostingsBuilder().extend(
+                blob[int(offset):int(offset) + int(length)].decode("utf-8")
+                for offset, length in zip(records["text_offset"], records["text_length"])
+            )
+            if blob:
+                blob.close()
+        tmp_path = directory / f"{stem}.bm25.{uuid.uuid4().hex}.tmp"
+        builder.write(tmp_path)
+        os.replace(tmp_path, path)
+    return SegmentPostings(path)
+
+
+class SegmentReader:
+    """Memory-mapped view of one committed segment."""
+
+    def __init__(self, directory: Path, stem: str, dimension: int) -> None:
+        self.directory = directory
+        self.stem = stem
+        self.dimension = dimension
+
+        rec_path = directory / f"{stem}.rec"
+        if rec_path.stat().st_size:
+            self.records = np.memmap(rec_path, dtype=RECORD_DTYPE, mode="r")
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+        self._text_file = open(directory / f"{stem}.txt", "rb")
+        if os.fstat(self._text_file.fileno()).st_size:
+            self._text = mmap.mmap(self._text_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._text = None
+
+        with open(directory / f"{stem}.docs.json", "r", encoding="utf-8") as f:
+            self.documents: List[Dict[str, Any]] = json.load(f)
+
+        # Mapped up front so rebuilds and purges can still read the vectors
+        # after another worker's compaction has unlinked the file.
+        if len(self.records):
+            self._vectors = np.memmap(directory / f"{stem}.vec", dtype="float32", mode="r").reshape(-1, dimension)
+        else:
+            self._vectors = np.zeros((0, dimension), dtype="float32")
+
+        self._postings: Optional[SegmentPostings] = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def vectors(self) -> np.ndarray:
+        return np.array(self._vectors)
+
+    def iter_vectors(self, batch_rows: int = 8192) -> Iterator[np.ndarray]:
+        """Yield vectors in row batches without loading the whole segment."""
+        for start in range(0, len(self._vectors), batch_rows):
+            yield np.array(self._vectors[start:start + batch_rows])
+
+    def vectors_at(self, rows: np.ndarray) -> np.ndarray:
+        return np.array(self._vectors[rows])
+
+    def chunk_ids(self) -> np.ndarray:
+        return np.asarray(self.records["chunk_id"], dtype=np.uint64)
+
+    def document_rows(self, document_ids: Collection[str]) -> np.ndarray:
+        """Boolean mask of the rows belonging to any of ``document_ids``."""
+        numbers = [number for number, doc in enumerate(self.documents) if doc.get("document_id") in document_ids]
+        if not numbers:
+            return np.zeros(len(self), dtype=bool)
+        return np.isin(self.records["document"], numbers)
+
+    def text(self, row: int) -> str:
+        record = self.records[row]
+        if self._text is None:
+            return ""
+        start = int(record["text_offset"])
+        return self._text[start:start + int(record["text_length"])].decode("utf-8")
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        """Materialize the metadata dict for a single row."""
+        record = self.records[row]
+        return {
+            **self.documents[int(record["document"])],
+            "chunk_id": int(record["chunk_id"]),
+            "chunk_index": int(record["chunk_index"]),
+            "text": self.text(row),
+        }
+
+    def postings(self) -> SegmentPostings:
+        """BM25 postings of this segment, opened on first lexical search."""
+        if self._postings is None:
+            self._postings = load_postings(self.directory, self.stem)
+        return self._postings
+
+    def close(self) -> None:
+        if self._postings is not None:
+            self._postings.close()
+        if self._text is not None:
+            self._text.close()
+        self._text_file.close()
+        # Dropping the memmaps releases the record table and vector mappings.
+        self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        self._vectors = np.zeros((0, self.dimension), dtype="float32")
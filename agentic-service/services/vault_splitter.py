@@ -0,0 +1,229 @@
+"""
+Text splitters for Knowledge Vault ingestion.
+
+``SimpleTextSplitter`` is the original character-window splitter.
+``TokenTextSplitter`` classifies every character with NumPy in one pass,
+derives token and sentence boundaries as offset arrays and places chunk
+windows with binary searches, so splitting is linear in the input and
+chunks are (start, end) offsets into the original text.
+"""
+from __future__ import annotations
+
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+STREAM_BUFFER_CHARS = 256 * 1024  # text gathered before each splitting pass when streaming
+
+# Chunk sizes are counted in ``token_bounds`` tokens, not the embedding
+# model's word pieces. English prose averages about 1.3 word pieces per token;
+# allowing 2 leaves room for codes, numbers and accented or rare words that
+# the WordPiece vocabulary splits further.
+WORDPIECES_PER_TOKEN = 2.0
+MODEL_SPECIAL_TOKENS = 2  # [CLS] and [SEP]
+
+# Character classes for code points < 128; everything above is a word
+# character except the Unicode spaces and punctuation listed below.
+_WORD, _SPACE, _PUNCT = 0, 1, 2
+_ASCII_CLASS = np.full(129, _WORD, dtype=np.uint8)
+for _code in range(128):
+    _char = chr(_code)
+    if _char.isspace() or _code < 32 or _code == 127:
+        _ASCII_CLASS[_code] = _SPACE
+    elif not (_char.isalnum() or _char == "_"):
+        _ASCII_CLASS[_code] = _PUNCT
+_UNICODE_SPACES = np.array([0x85, 0xA0, 0x1680, 0x2028, 0x2029, 0x202F, 0x205F, 0x3000], dtype=np.uint32)
+# CJK ideograph blocks (as in BERT's tokenizer): each ideograph is a token of its own.
+_CJK_RANGES = np.array([
+    (0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF),
+    (0x20000, 0x2A6DF), (0x2A700, 0x2CEAF), (0x2F800, 0x2FA1F),
+], dtype=np.uint32)
+
+
+def _char_classes(codes: np.ndarray) -> np.ndarray:
+    classes = _ASCII_CLASS[np.minimum(codes, 128)]
+    high = codes >= 128
+    if high.any():
+        classes[high & (((codes >= 0x2000) & (codes <= 0x200B)) | np.isin(codes, _UNICODE_SPACES))] = _SPACE
+        classes[high & (((codes >= 0x2010) & (codes <= 0x2027)) | ((codes >= 0x3001) & (codes <= 0x303F)))] = _PUNCT
+        # Single-character tokens, like punctuation.
+        for low, top in _CJK_RANGES:
+            classes[high & (codes >= low) & (codes <= top)] = _PUNCT
+    return classes
+
+
+def max_chunk_tokens(max_seq_length: int) -> int:
+    """
+    Largest ``chunk_size`` whose chunks should still fit in ``max_seq_length``
+    model tokens, i.e. are embedded without being truncated.
+    """
+    return max(1, int((max_seq_length - MODEL_SPECIAL_TOKENS) / WORDPIECES_PER_TOKEN))
+
+
+def token_bounds(text: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Token start/end offsets and sentence-end offsets of ``text``.
+
+    Tokens are runs of word characters, single punctuation marks and single
+    CJK ideographs: a tokenizer-free proxy for the embedding model's word
+    pieces that never counts more tokens than there are word pieces, but may
+    count fewer (see ``WORDPIECES_PER_TOKEN``). A sentence ends after ``.``,
+    ``!`` or ``?`` followed by whitespace.
+    """
+    if text.isascii():
+        codes = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+        classes = _ASCII_CLASS[codes]
+    else:
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        classes = _char_classes(codes)
+    word = classes == _WORD
+    punct = classes == _PUNCT
+
+    previous_word = np.concatenate(([False], word[:-1]))
+    next_word = np.concatenate((word[1:], [False]))
+    starts = np.flatnonzero((word & ~previous_word) | punct)
+    ends = np.flatnonzero((word & ~next_word) | punct) + 1
+
+    next_space = np.concatenate((classes[1:] == _SPACE, [False]))
+    terminal = (codes == ord(".")) | (codes == ord("!")) | (codes == ord("?"))
+    sentence_ends = np.flatnonzero(terminal & next_space) + 1
+    return starts, ends, sentence_ends
+
+
+class SimpleTextSplitter:
+    """Simple text splitter to avoid LangChain dependencies."""
+    
+    def __init__(self, chunk_size: int = 800, chunk_overlap: int = 200):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+    
+    def split_text(self, text: str) -> List[str]:
+        """Split text into overlapping chunks."""
+        return list(self.iter_chunks([text]))
+
+    def _chunk_end(self, text: str, start: int) -> int:
+        """End offset of the chunk starting at ``start``."""
+        end = start + self.chunk_size
+        if end < len(text):
+            chunk = text[start:end]
+            # Try to break at sentence boundary if possible
+            for sep in ['. ', '.\n', '! ', '!\n', '? ', '?\n']:
+                last_sep = chunk.rfind(sep)
+                if last_sep > self.chunk_size // 2:  # Only break if past halfway
+                    return start + last_sep + len(sep)
+        return end
+
+    def iter_chunks(self, pieces: Iterable[str]) -> Iterator[str]:
+        """
+        Chunk a stream of text pieces (pages, blocks) without joining them first.
+
+        A chunk is emitted as soon as enough text follows it that more input
+        could not change it, so only about one chunk of text is buffered.
+        """
+        buffer = ""
+        for piece in pieces:
+            buffer += piece
+            start = 0
+            while start + self.chunk_size < len(buffer):
+                end = self._chunk_end(buffer, start)
+                chunk = buffer[start:end].strip()
+                if chunk:
+                    yield chunk
+                start = max(end - self.chunk_overlap, start + 1)
+            buffer = buffer[start:]
+
+        start = 0
+        while start < len(buffer):
+            end = self._chunk_end(buffer, start)
+            chunk = buffer[start:end].strip()
+            if chunk:
+                yield chunk
+            if end >= len(buffer):
+                break
+            start = max(end - self.chunk_overlap, start + 1)
+
+
+class TokenTextSplitter:
+    """
+    Splits text into windows of ``chunk_size`` tokens overlapping by ``chunk_overlap``.
+
+    Use ``max_chunk_tokens`` to size windows for an embedding model.
+    Like ``SimpleTextSplitter``, a window is cut back to the last sentence end
+    when that keeps more than half of it (see ``token_bounds`` for what a
+    token is). The last window always runs to the end of the text, so no
+    tiny trailing chunk made only of overlap is produced.
+    """
+
+    def __init__(self, chunk_size: int = 160, chunk_overlap: int = 40) -> None:
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """(start, end) character offsets of every chunk of ``text``."""
+        spans, _ = self._spans(text, final=True)
+        return spans
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        return len(token_bounds(text)[0])
+
+    def _spans(self, text: str, final: bool) -> Tuple[List[Tuple[int, int]], int]:
+        """
+        Chunk spans of ``text`` and the offset where unfinished text starts.
+
+        With ``final=False`` the window that would reach the end of ``text``
+        is held back (more text could still extend it), and the returned
+        offset is where it begins.
+        """
+        starts, ends, sentence_ends = token_bounds(text)
+        count = len(starts)
+
+        # For every window end j (exclusive, in tokens), the latest j' <= j
+        # that cuts right after a sentence end, or -1.
+        last_break = np.full(count + 1, -1, dtype=np.int64)
+        breaks = np.searchsorted(starts, sentence_ends)
+        last_break[breaks] = breaks
+        last_break = np.maximum.accumulate(last_break)
+
+        spans: List[Tuple[int, int]] = []
+        first = 0
+        while first < count:
+            stop = first + self.chunk_size
+            if stop >= count:
+                if not final:
+                    return spans, int(starts[first])
+                spans.append((int(starts[first]), int(ends[-1])))
+                break
+            cut = int(last_break[stop])
+            if cut > first + self.chunk_size // 2:
+                stop = cut
+            spans.append((int(starts[first]), int(ends[stop - 1])))
+            first = max(stop - self.chunk_overlap, first + 1)
+        return spans, len(text)
+
+    def iter_chunks(self, pieces: Iterable[str]) -> Iterator[str]:
+        """
+        Chunk a stream of text pieces (pages, blocks) without joining them first.
+
+        Pieces are gathered into ``STREAM_BUFFER_CHARS`` of text per splitting
+        pass; only the unfinished tail is carried over, so chunks are the same
+        as ``split_text`` on the joined text.
+        """
+        buffer = ""
+        for piece in pieces:
+            buffer += piece
+            if len(buffer) < STREAM_BUFFER_CHARS:
+                continue
+            spans, rest = self._spans(buffer, final=False)
+            for start, end in spans:
+                yield buffer[start:end]
+            buffer = buffer[rest:]
+
+        spans, _ = self._spans(buffer, final=True)
+        for start, end in spans:
+            yield buffer[start:end]
@@ -0,0 +1,181 @@
+"""
+Compressed store of extracted document text for vault previews.
+
+Ingest already extracts every document's text; the store keeps it so the
+preview endpoint does not re-parse the original PDF/DOCX. Each document is
+one file, ``<store>/<sha256(id)[:2]>/<sha256(id)>.vtx``::
+
+    b"VTX1" | zlib block 0 | zlib block 1 | ... | footer JSON | footer length (8 bytes)
+
+Every block holds ``block_chars`` characters (the last may be shorter), so a
+page of a large document only decompresses the blocks it overlaps. The
+footer records the sha256 of the source file the text came from; an entry
+is only served while that file is unchanged.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import uuid
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+MAGIC = b"VTX1"
+FOOTER_LENGTH = struct.Struct("<Q")
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_digest(path: Path) -> str:
+    """sha256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class TextPage:
+    text: str
+    offset: int
+    total_chars: int
+
+
+class TextStoreWriter:
+    """Streams one document's text into a pending file; ``commit`` publishes it."""
+
+    def __init__(self, target: Path, file_hash: str, source: Path, block_chars: int) -> None:
+        self.target = target
+        self.block_chars = block_chars
+        self._meta: Dict[str, Any] = {
+            "file_hash": file_hash,
+            "file_size": source.stat().st_size,
+            "file_mtime_ns": source.stat().st_mtime_ns,
+        }
+        self._blocks: List[List[int]] = []
+        self._chars = 0
+        self._buffer = ""
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+        self._file = open(self._tmp, "wb")
+        self._file.write(MAGIC)
+
+    def add(self, text: str) -> None:
+        self._buffer += text
+        while len(self._buffer) >= self.block_chars:
+            self._write_block(self._buffer[:self.block_chars])
+            self._buffer = self._buffer[self.block_chars:]
+
+    def _write_block(self, text: str) -> None:
+        data = zlib.compress(text.encode("utf-8"))
+        self._blocks.append([self._file.tell(), len(data)])
+        self._file.write(data)
+        self._chars += len(text)
+
+    def commit(self) -> None:
+        if self._buffer:
+            self._write_block(self._buffer)
+            self._buffer = ""
+        footer = json.dumps({
+            **self._meta,
+            "chars": self._chars,
+            "block_chars": self.block_chars,
+            "blocks": self._blocks,
+        }).encode("utf-8")
+        self._file.write(footer)
+        self._file.write(FOOTER_LENGTH.pack(len(footer)))
+        self._file.close()
+        os.replace(self._tmp, self.target)
+
+    def abort(self) -> None:
+        self._file.close()
+        self._tmp.unlink(missing_ok=True)
+
+
+class ExtractedTextStore:
+    def __init__(self, store_dir: Path, block_chars: int = 64 * 1024) -> None:
+        self.store_dir = store_dir
+        self.block_chars = block_chars
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, document_id: str) -> Path:
+        key = hashlib.sha256(document_id.encode("utf-8")).hexdigest()
+        return self.store_dir / key[:2] / f"{key}.vtx"
+
+    def writer(self, document_id: str, source: Path, file_hash: Optional[str] = None) -> TextStoreWriter:
+        return TextStoreWriter(
+            self._path(document_id),
+            file_hash or file_digest(source),
+            source,
+            self.block_chars,
+        )
+
+    def read(
+        self,
+        document_id: str,
+        source: Path,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Optional[TextPage]:
+        """
+        Characters ``[offset, offset + limit)`` of the stored text, or ``None``
+        when nothing is stored for ``document_id`` or ``source`` has changed.
+        """
+        try:
+            f = open(self._path(document_id), "rb")
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        with f:
+            f.seek(-FOOTER_LENGTH.size, os.SEEK_END)
+            (footer_length,) = FOOTER_LENGTH.unpack(f.read(FOOTER_LENGTH.size))
+            f.seek(-FOOTER_LENGTH.size - footer_length, os.SEEK_END)
+            meta = json.loads(f.read(footer_length))
+
+            if not self._matches(meta, source):
+                self.misses += 1
+                return None
+
+            total = meta["chars"]
+            start = min(max(offset, 0), total)
+            stop = total if limit is None else min(start + max(limit, 0), total)
+            block_chars = meta["block_chars"]
+            first, last = start // block_chars, (stop - 1) // block_chars
+
+            pieces = []
+            for block_offset, block_length in meta["blocks"][first:last + 1] if stop > start else []:
+                f.seek(block_offset)
+                pieces.append(zlib.decompress(f.read(block_length)).decode("utf-8"))
+        self.hits += 1
+
+        text = "".join(pieces)
+        skip = start - first * block_chars
+        return TextPage(text=text[skip:skip + stop - start], offset=start, total_chars=total)
+
+    @staticmethod
+    def _matches(meta: Dict[str, Any], source: Path) -> bool:
+        try:
+            stat = source.stat()
+        except FileNotFoundError:
+            return False
+        if stat.st_size != meta["file_size"]:
+            return False
+        # Same size and mtime: trust it without re-hashing the whole file.
+        if stat.st_mtime_ns == meta["file_mtime_ns"]:
+            return True
+        return file_digest(source) == meta["file_hash"]
+
+    def delete(self, document_id: str) -> None:
+        self._path(document_id).unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,119 @@
+"""Amadeus lookup caches, exercised offline against FakeAmadeusClient."""
+import types
+
+import pytest
+
+from config import settings
+from services import ttl_cache
+from services.amadeus_fake import FakeAmadeusClient
+from services.amadeus_service import AmadeusService, trip_dates
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(ttl_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    monkeypatch.setattr(settings, "amadeus_cache_path", None)
+    return FakeAmadeusClient()
+
+
+@pytest.fixture
+def service(fake, clock):
+    return AmadeusService(client=fake)
+
+
+def test_flight_cache_hit_makes_no_api_call(service, fake):
+    departure, ret = trip_dates(3)
+    first = service.search_flights("JFK", "CDG", departure, ret, max_results=5)
+    second = service.search_flights("JFK", "CDG", departure, ret, max_results=3)
+
+    assert fake.calls["flight_offers_search"] == 1
+    assert len(first["flights"]) == 5
+    assert second["flights"] == first["flights"][:3]
+
+
+def test_flight_cache_refetches_when_more_offers_are_requested(service, fake):
+    departure, ret = trip_dates(3)
+    service.search_flights("JFK", "CDG", departure, ret, max_results=3)
+    result = service.search_flights("JFK", "CDG", departure, ret, max_results=5)
+
+    assert fake.calls["flight_offers_search"] == 2
+    assert len(result["flights"]) == 5
+
+
+def test_flight_offers_expire_before_hotel_lists(service, fake, clock):
+    departure, ret = trip_dates(3)
+    service.search_flights("JFK", "CDG", departure, ret)
+    service.search_hotels("CDG", departure, ret)
+
+    clock[0] += settings.amadeus_flight_cache_ttl_seconds + 1
+    service.search_flights("JFK", "CDG", departure, ret)
+    service.search_hotels("CDG", departure, ret)
+    assert fake.calls["flight_offers_search"] == 2
+    assert fake.calls["hotels_by_city"] == 1
+
+    clock[0] += settings.amadeus_hotel_cache_ttl_seconds
+    service.search_hotels("CDG", departure, ret)
+    assert fake.calls["hotels_by_city"] == 2
+
+
+def test_hotel_list_is_shared_across_dates(service, fake):
+    first = service.search_hotels("CDG", *trip_dates(3), max_results=5)
+    second = service.search_hotels("CDG", *trip_dates(7), max_results=10)
+
+    assert fake.calls["hotels_by_city"] == 1
+    assert second["hotels"][:5] == first["hotels"]
+    assert second["search"]["check_out"] == trip_dates(7)[1]
+
+
+def test_errors_are_not_cached(service, fake, monkeypatch):
+    departure, ret = trip_dates(3)
+    real_get = fake.shopping.flight_offers_search.get
+
+    def failing_get(**params):
+        fake.calls["flight_offers_search"] += 1
+        raise RuntimeError("upstream unavailable")
+
+    monkeypatch.setattr(fake.shopping.flight_offers_search, "get", failing_get)
+    failed = service.search_flights("JFK", "CDG", departure, ret)
+    assert failed["flights"] == [] and "upstream unavailable" in failed["error"]
+
+    monkeypatch.setattr(fake.shopping.flight_offers_search, "get", real_get)
+    recovered = service.search_flights("JFK", "CDG", departure, ret)
+    assert "error" not in recovered and recovered["flights"]
+    assert fake.calls["flight_offers_search"] == 2
+
+
+def test_cached_results_are_private_copies(service):
+    departure, ret = trip_dates(3)
+    service.search_hotels("CDG", departure, ret)["hotels"][0]["name"] = "Changed"
+    service.search_flights("JFK", "CDG", departure, ret)["flights"].clear()
+
+    assert service.search_hotels("CDG", departure, ret)["hotels"][0]["name"] != "Changed"
+    assert service.search_flights("JFK", "CDG", departure, ret)["flights"]
+
+
+def test_prefetch_warms_the_lookups_planners_make(service, fake):
+    futures = service.prefetch([("JFK", "Paris"), ("LAX", "CDG")], trip_days=(3, 5))
+    for future in futures:
+        future.result()
+    calls = dict(fake.calls)
+    assert calls == {"flight_offers_search": 4, "hotels_by_city": 1}
+    assert service.stats()["prefetched"] == 5
+
+    service.search_flights("JFK", "CDG", *trip_dates(5), max_results=3)
+    service.search_hotels("CDG", *trip_dates(5))
+    assert dict(fake.calls) == calls
+
+
+def test_amadeus_fake_setting_selects_the_fake_client(monkeypatch, fake):
+    monkeypatch.setattr(settings, "amadeus_fake", True)
+    service = AmadeusService()
+
+    assert isinstance(service.client, FakeAmadeusClient)
+    assert service.is_available()
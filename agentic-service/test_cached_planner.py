@@ -0,0 +1,198 @@
+"""CachedPlanner: normalized result cache and request coalescing in front of a planner."""
+import asyncio
+
+import pytest
+
+from agents.cached_planner import CachedPlanner, budget_bucket, itinerary_cache_key
+from services.ttl_cache import TTLCache
+
+
+class CountingPlanner:
+    """Planner double that records its runs; ``release`` holds runs open."""
+
+    def __init__(self, status: str = "completed") -> None:
+        self.status = status
+        self.calls = 0
+        self.release = None
+        self.costs = None
+
+    async def generate_itinerary(self, city, country, days, budget=None, preferences=None, user_id=None):
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        else:
+            await asyncio.sleep(0)
+        if self.status == "failed":
+            raise RuntimeError("planner failed")
+        result = {
+            "run_id": f"run-{self.calls}",
+            "user_id": user_id,
+            "status": self.status,
+            "tour": {"city": city, "country": country, "daily_plans": [{"day": 1}]},
+        }
+        if self.costs is not None:
+            result["tour"]["estimated_costs"] = result["cost"] = dict(self.costs)
+        return result
+
+    async def generate_itinerary_stream(self, city, country, days, budget=None, preferences=None, user_id=None):
+        result = await self.generate_itinerary(city, country, days, budget, preferences, user_id)
+        yield {"type": "result", "content": result}
+
+
+def _planner(status="completed", coalesce=True):
+    inner = CountingPlanner(status)
+    return inner, CachedPlanner(inner, TTLCache("itineraries"), coalesce=coalesce)
+
+
+def test_cache_key_normalizes_equivalent_requests():
+    assert itinerary_cache_key(" paris ", "FRANCE", 3, 2100, ["food", "Culture"]) == itinerary_cache_key(
+        "Paris", "France", 3, 2200, {"culture": True, "food": True, "nightlife": False}
+    )
+    assert itinerary_cache_key("Paris", "France", 3, 2200, []) != itinerary_cache_key("Paris", "France", 3, 2400, [])
+
+
+def test_budget_buckets_are_relative():
+    def key(budget):
+        return itinerary_cache_key("Paris", "France", 3, budget, [])
+
+    assert key(0) == key(None)
+    assert len({key(1), key(250), key(499)}) == 3
+    assert key(499) == key(500)
+    assert key(20_500) == key(22_000) != key(22_500)
+    for budget in (1, 7.5, 499, 500, 1234.56, 99_999):
+        assert budget_bucket(budget) <= budget < budget_bucket(budget) * 1.1 + 0.01
+    assert key(2100) != itinerary_cache_key("Paris", "France", 3, 2200, [], budget_ratio=0)
+
+
+def test_repeat_request_is_served_from_cache():
+    inner, planner = _planner()
+
+    async def scenario():
+        first = await planner.generate_itinerary("Paris", "France", 3, 2200, ["food"], user_id="u1")
+        second = await planner.generate_itinerary("  paris", "france ", 3, 2100, ["Food"], user_id="u2")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert inner.calls == 1
+    assert second["cached"] is True
+    assert second["user_id"] == "u2"
+    assert second["run_id"] != first["run_id"]
+    assert (second["tour"]["city"], second["tour"]["country"]) == ("  paris", "france ")
+
+
+@pytest.mark.parametrize("status", ["failed", "partial"])
+def test_incomplete_results_are_not_cached(status):
+    inner, planner = _planner(status)
+
+    async def request():
+        try:
+            await planner.generate_itinerary("Paris", "France", 3)
+        except RuntimeError:
+            pass
+
+    asyncio.run(request())
+    asyncio.run(request())
+    assert inner.calls == 2
+
+
+def test_stream_replays_a_cached_result():
+    inner, planner = _planner()
+
+    async def scenario():
+        await planner.generate_itinerary("Paris", "France", 3)
+        return [event async for event in planner.generate_itinerary_stream("Paris", "France", 3)]
+
+    events = asyncio.run(scenario())
+    assert inner.calls == 1
+    assert [event["type"] for event in events] == ["run", "day", "result"]
+    assert events[-1]["content"]["cached"] is True
+
+
+def test_concurrent_identical_requests_share_one_planner_run():
+    inner, planner = _planner()
+
+    async def scenario():
+        inner.release = asyncio.Event()
+        requests = [
+            asyncio.ensure_future(planner.generate_itinerary("Paris", "France", 3, user_id=f"u{n}"))
+            for n in range(2)
+        ]
+        await asyncio.sleep(0)
+        inner.release.set()
+        return await asyncio.gather(*requests)
+
+    leader, follower = asyncio.run(scenario())
+    assert inner.calls == 1
+    assert follower["coalesced"] is True and "coalesced" not in leader
+    assert (leader["user_id"], follower["user_id"]) == ("u0", "u1")
+    assert planner.stats()["coalescing"] == {"enabled": True, "in_flight": 0, "executions": 1, "coalesced": 1}
+
+
+def test_coalescing_can_be_disabled():
+    inner, planner = _planner(coalesce=False)
+    planner.cache = None
+
+    async def scenario():
+        inner.release = asyncio.Event()
+        requests = [asyncio.ensure_future(planner.generate_itinerary("Paris", "France", 3)) for _ in range(2)]
+        await asyncio.sleep(0)
+        inner.release.set()
+        await asyncio.gather(*requests)
+
+    asyncio.run(scenario())
+    assert inner.calls == 2
+
+
+def test_waiters_share_the_leaders_failure():
+    inner, planner = _planner("failed")
+
+    async def scenario():
+        inner.release = asyncio.Event()
+        requests = [asyncio.ensure_future(planner.generate_itinerary("Paris", "France", 3)) for _ in range(2)]
+        await asyncio.sleep(0)
+        inner.release.set()
+        return await asyncio.gather(*requests, return_exceptions=True)
+
+    outcomes = asyncio.run(scenario())
+    assert inner.calls == 1
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+
+
+def test_waiter_takes_over_when_the_leader_is_cancelled():
+    inner, planner = _planner()
+
+    async def scenario():
+        inner.release = asyncio.Event()
+        leader = asyncio.ensure_future(planner.generate_itinerary("Paris", "France", 3))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(planner.generate_itinerary("Paris", "France", 3))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        inner.release.set()
+        return await waiter
+
+    result = asyncio.run(scenario())
+    assert inner.calls == 2
+    assert result["status"] == "completed" and "coalesced" not in result
+
+
+def test_reused_costs_are_scaled_to_the_callers_budget():
+    inner, planner = _planner()
+    inner.costs = {"accommodation": 1200, "food": 800, "transport": "included", "total": 2200}
+
+    async def scenario():
+        await planner.generate_itinerary("Paris", "France", 3, 2200)
+        lower = await planner.generate_itinerary("Paris", "France", 3, 2100)
+        higher = await planner.generate_itinerary("Paris", "France", 3, 2240)
+        return lower, higher
+
+    lower, higher = asyncio.run(scenario())
+    assert inner.calls == 1
+    scale = 2100 / 2200
+    assert lower["tour"]["estimated_costs"] == {
+        "accommodation": round(1200 * scale, 2), "food": round(800 * scale, 2), "transport": "included", "total": 2100,
+    }
+    assert lower["cost"]["total"] == 2100
+    assert higher["tour"]["estimated_costs"]["total"] == 2200  # already within budget
+    assert planner.cache.get(itinerary_cache_key("Paris", "France", 3, 2200, []))["cost"]["total"] == 2200
@@ -0,0 +1,157 @@
+"""Embedding micro-batching scheduler and content-addressed cache."""
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from services.embedding import CachedEmbedder, EmbeddingBatcher, EmbeddingCache
+
+DIMENSION = 4
+
+
+class RecordingModel:
+    """SentenceTransformer double: deterministic vectors, records every batch."""
+
+    def __init__(self) -> None:
+        self.batches = []
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail = False
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True):
+        self.entered.set()
+        self.gate.wait()
+        self.batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("model failed")
+        return np.stack([vector_of(text) for text in texts]).astype("float64")
+
+
+def vector_of(text):
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return np.frombuffer(digest[:DIMENSION * 4], dtype="uint32").astype("float32") / 2 ** 32
+
+
+def test_each_caller_gets_its_own_rows():
+    batcher = EmbeddingBatcher(RecordingModel())
+    vectors = batcher.encode(["paris", "rome", "tokyo"])
+
+    assert vectors.dtype == np.float32
+    np.testing.assert_allclose(vectors, np.stack([vector_of(t) for t in ["paris", "rome", "tokyo"]]))
+    assert batcher.encode([]).shape[0] == 0
+
+
+def test_overlapping_requests_share_one_model_call():
+    model = RecordingModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=64, max_wait_ms=50)
+    model.gate.clear()
+    first = batcher.submit(["warm-up"])
+    assert model.entered.wait(5)  # the worker is busy inside the model
+
+    futures = [batcher.submit([f"query {n}"]) for n in range(5)]
+    model.gate.set()
+    first.result(timeout=5)
+    results = [future.result(timeout=5) for future in futures]
+
+    assert len(model.batches) == 2
+    assert sorted(model.batches[1]) == sorted(f"query {n}" for n in range(5))
+    for n, rows in enumerate(results):
+        np.testing.assert_allclose(rows[0], vector_of(f"query {n}"))
+    # Counters are updated just after the callers are released.
+    deadline = time.monotonic() + 5
+    while batcher.stats()["batches"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = batcher.stats()
+    assert (stats["batches"], stats["requests"], stats["texts"]) == (2, 6, 6)
+
+
+def test_batches_respect_max_batch_size():
+    model = RecordingModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=4, max_wait_ms=50)
+    model.gate.clear()
+    blocker = batcher.submit(["warm-up"])
+    assert model.entered.wait(5)
+    futures = [batcher.submit([f"text {n}"]) for n in range(8)]
+    model.gate.set()
+    blocker.result(timeout=5)
+    for future in futures:
+        future.result(timeout=5)
+
+    assert all(len(batch) <= 4 for batch in model.batches)
+    assert sum(len(batch) for batch in model.batches) == 9
+
+
+def test_model_error_fails_the_batch_but_not_the_worker():
+    model = RecordingModel()
+    batcher = EmbeddingBatcher(model)
+    model.fail = True
+    with pytest.raises(RuntimeError):
+        batcher.encode(["broken"])
+
+    model.fail = False
+    assert batcher.encode(["fine"]).shape == (1, DIMENSION)
+
+
+def test_aencode_from_concurrent_coroutines():
+    batcher = EmbeddingBatcher(RecordingModel())
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.aencode([f"q{n}"]) for n in range(10)))
+
+    results = asyncio.run(scenario())
+    for n, rows in enumerate(results):
+        np.testing.assert_allclose(rows[0], vector_of(f"q{n}"))
+
+
+def test_encode_is_safe_from_many_threads():
+    batcher = EmbeddingBatcher(RecordingModel(), max_wait_ms=2)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda n: batcher.encode([f"t{n}", f"u{n}"]), range(40)))
+
+    for n, rows in enumerate(results):
+        np.testing.assert_allclose(rows, np.stack([vector_of(f"t{n}"), vector_of(f"u{n}")]))
+
+
+def test_cached_embedder_only_encodes_new_texts():
+    model = RecordingModel()
+    embedder = CachedEmbedder(EmbeddingBatcher(model), EmbeddingCache("test-model"))
+
+    first = embedder.encode(["paris", "rome", "paris"])
+    second = embedder.encode(["  rome ", "tokyo", "paris"])
+
+    assert model.batches == [["paris", "rome"], ["tokyo"]]
+    np.testing.assert_allclose(first[0], first[2])
+    np.testing.assert_allclose(second[0], first[1])  # whitespace-normalized key
+    np.testing.assert_allclose(second[1], vector_of("tokyo"))
+
+
+def test_cache_keys_depend_on_the_model():
+    assert EmbeddingCache("model-a").key("paris") != EmbeddingCache("model-b").key("paris")
+    assert EmbeddingCache("model-a").key("caf\u00e9  bar") == EmbeddingCache("model-a").key("cafe\u0301 bar")
+
+
+def test_disk_tier_is_shared_across_instances(tmp_path):
+    model = RecordingModel()
+    CachedEmbedder(EmbeddingBatcher(model), EmbeddingCache("test-model", cache_dir=tmp_path)).encode(["paris"])
+
+    cache = EmbeddingCache("test-model", cache_dir=tmp_path)
+    vectors = CachedEmbedder(EmbeddingBatcher(model), cache).encode(["paris"])
+
+    assert len(model.batches) == 1
+    np.testing.assert_allclose(vectors[0], vector_of("paris"))
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_memory_tier_is_bounded():
+    cache = EmbeddingCache("test-model", max_entries=2)
+    keys = [cache.key(text) for text in ("a", "b", "c")]
+    cache.put_many({key: np.ones(DIMENSION, dtype="float32") for key in keys})
+
+    assert set(cache.get_many(keys)) == set(keys[1:])
+    assert cache.stats()["entries"] == 2
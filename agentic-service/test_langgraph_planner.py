@@ -0,0 +1,93 @@
+"""LangGraph planner: research and both Amadeus lookups run concurrently and join before planning."""
+import asyncio
+import json
+import threading
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from agents.langgraph_planner import LangGraphPlanner
+from config import settings
+from services.amadeus_fake import FakeAmadeusClient
+from services.amadeus_service import AmadeusService
+
+ITINERARY = {
+    "title": "Three days in Paris",
+    "daily_schedule": [{"day": 1, "theme": "Left bank", "activities": []}],
+    "estimated_costs": {"total": 900},
+}
+
+
+class _FakeChatModel:
+    """
+    Replies to each node's prompt. The research call only returns once both
+    Amadeus lookups have run, so it deadlocks if the branches are sequential.
+    """
+
+    def __init__(self, fake, lookups=2):
+        self.fake = fake
+        self.lookups = lookups
+        self.prompts = {}
+
+    async def ainvoke(self, messages):
+        prompt = messages[-1].content
+        if prompt.startswith("Research"):
+            self.prompts["researcher"] = messages
+            while sum(self.fake.calls.values()) < self.lookups:
+                await asyncio.sleep(0.01)
+            return AIMessage(content=json.dumps({"insights": "Museum passes save time."}))
+        if prompt.startswith("Based on the research"):
+            self.prompts["planner"] = messages
+            return AIMessage(content=json.dumps(ITINERARY))
+        self.prompts["enricher"] = messages
+        return AIMessage(content=json.dumps({"local_tips": ["Carry a metro card."]}))
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    monkeypatch.setattr(settings, "amadeus_cache_path", None)
+    fake = FakeAmadeusClient()
+    # Flights and hotels wait for each other inside the (threaded) SDK call.
+    barrier = threading.Barrier(2, timeout=5)
+    record = fake._record
+
+    def record_together(name):
+        record(name)
+        barrier.wait()
+
+    monkeypatch.setattr(fake, "_record", record_together)
+    return fake
+
+
+def test_branches_run_concurrently_and_join_before_planning(fake):
+    llm = _FakeChatModel(fake)
+    planner = LangGraphPlanner(llm=llm, amadeus=AmadeusService(client=fake))
+
+    result = asyncio.run(asyncio.wait_for(planner.generate_itinerary("Paris", "France", 3), timeout=10))
+
+    assert fake.calls == {"flight_offers_search": 1, "hotels_by_city": 1}
+    assert result["tour"]["title"] == ITINERARY["title"]
+    assert result["tour"]["local_tips"] == ["Carry a metro card."]
+
+    planner_messages = llm.prompts["planner"]
+    assert "Museum passes save time." in planner_messages[1].content  # the research reply
+    plan_prompt = planner_messages[-1].content
+    flight_data = json.loads(plan_prompt.split("Flight data: ", 1)[1].split("\nHotel data: ", 1)[0])
+    hotel_data = json.loads(plan_prompt.split("Hotel data: ", 1)[1].split("\n\nReturn as JSON", 1)[0])
+    assert "error" not in flight_data and flight_data["flights"]
+    assert flight_data["flights"][0]["itineraries"][0]["segments"][0]["arrival"]["airport"] == "CDG"
+    assert "error" not in hotel_data and hotel_data["hotels"][0]["name"].startswith("Fake Hotel CDG")
+
+
+def test_lookups_are_skipped_without_amadeus(monkeypatch):
+    monkeypatch.setattr(settings, "amadeus_cache_path", None)
+    monkeypatch.setattr(settings, "amadeus_fake", False)
+    monkeypatch.setattr(settings, "amadeus_api_key", None)
+    llm = _FakeChatModel(FakeAmadeusClient(), lookups=0)
+    planner = LangGraphPlanner(llm=llm, amadeus=AmadeusService())
+
+    result = asyncio.run(planner.generate_itinerary("Paris", "France", 3))
+
+    assert result["status"] == "completed"
+    assert "Flight data: Not available" in llm.prompts["planner"][-1].content
+    assert "Hotel data: Not available" in llm.prompts["planner"][-1].content
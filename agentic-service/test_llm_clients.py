@@ -0,0 +1,93 @@
+"""Shared LLM client registry: one pool per process, measured connection reuse."""
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import openai
+import pytest
+
+from services.llm_clients import LLMClientRegistry
+
+# requirements.txt pins openai<3, whose pooled clients are httpx clients.
+requires_httpx_openai = pytest.mark.skipif(
+    not issubclass(openai.DefaultHttpxClient, httpx.Client),
+    reason="installed openai is not built on httpx (requirements.txt pins openai<3)",
+)
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _registry():
+    return LLMClientRegistry(api_key="sk-test", http2=False)
+
+
+def test_clients_are_created_once_and_share_the_pool():
+    registry = _registry()
+
+    assert registry.http_client() is registry.http_client()
+    assert registry.openai_client() is registry.openai_client()
+    assert registry.async_openai_client() is registry.async_openai_client()
+    assert registry.openai_client()._client is registry.http_client()
+    assert registry.async_openai_client()._client is registry.async_http_client()
+
+
+@requires_httpx_openai
+def test_sync_requests_reuse_one_connection(server_url):
+    registry = _registry()
+    client = registry.http_client()
+    for _ in range(5):
+        assert client.get(f"{server_url}/v1/models").status_code == 200
+
+    stats = registry.stats()["sync"]
+    assert (stats["requests"], stats["connections_opened"], stats["connections_reused"]) == (5, 1, 4)
+    assert stats["http_versions"] == {"HTTP/1.1": 5}
+    client.close()
+
+
+@requires_httpx_openai
+def test_async_requests_reuse_one_connection(server_url):
+    registry = _registry()
+
+    async def scenario():
+        client = registry.async_http_client()
+        for _ in range(3):
+            response = await client.get(f"{server_url}/v1/models")
+            assert response.status_code == 200
+        await registry.aclose()
+
+    asyncio.run(scenario())
+    stats = registry.stats()["async"]
+    assert (stats["requests"], stats["connections_opened"]) == (3, 1)
+    assert stats["reuse_ratio"] == pytest.approx(2 / 3, abs=1e-3)
+
+
+def test_aclose_drops_the_pools():
+    registry = _registry()
+    first = registry.openai_client()
+    asyncio.run(registry.aclose())
+
+    assert registry.openai_client() is not first
@@ -0,0 +1,78 @@
+"""IncrementalJSONParser and the SSE event helpers."""
+import json
+import random
+
+import pytest
+
+from agents.streaming import IncrementalJSONParser, parsed_event, sse_event
+
+ITINERARY = {
+    "city": "Paris",
+    "days": 3,
+    "budget": 2000.5,
+    "family_friendly": True,
+    "notes": None,
+    "summary": 'Museums, "bistros" and a {brace} or [bracket], \\ included',
+    "daily_plans": [
+        {"day": 1, "activities": [{"name": "Louvre", "tags": ["art", "history"]}]},
+        {"day": 2, "activities": []},
+        {"day": 3, "activities": [{"name": "Café de Flore", "cost": 12}]},
+    ],
+    "tips": ["Book ahead", "Walk"],
+}
+REPLY = "```json\n" + json.dumps(ITINERARY, indent=2, ensure_ascii=False) + "\n```"
+
+
+def _reassemble(values):
+    document = {}
+    for parsed in values:
+        if parsed.index is None:
+            document[parsed.key] = parsed.value
+        else:
+            items = document.setdefault(parsed.key, [])
+            assert parsed.index == len(items)
+            items.append(parsed.value)
+    return document
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_any_chunking_yields_the_parsed_document(seed):
+    rng = random.Random(seed)
+    parser = IncrementalJSONParser()
+    values, position = [], 0
+    while position < len(REPLY):
+        step = rng.randint(1, 12)
+        values.extend(parser.feed(REPLY[position:position + step]))
+        position += step
+
+    assert parser.done
+    assert _reassemble(values) == ITINERARY
+    assert [value.index for value in values if value.key == "daily_plans"] == [0, 1, 2]
+
+
+def test_days_are_reported_before_the_reply_ends():
+    parser = IncrementalJSONParser()
+    first_day_end = REPLY.index('"day": 2')
+
+    completed = parser.feed(REPLY[:first_day_end])
+    assert [(value.key, value.index) for value in completed if value.index is not None] == [("daily_plans", 0)]
+    assert not parser.done
+
+
+def test_undecodable_value_is_skipped():
+    parser = IncrementalJSONParser()
+    completed = parser.feed('{"good": 1, "bad": tru, "daily_plans": [{"day": 1}, nope]}')
+
+    assert [(value.key, value.value) for value in completed] == [("good", 1), ("daily_plans", {"day": 1})]
+    assert parser.done
+
+
+def test_events_are_sse_frames():
+    parser = IncrementalJSONParser()
+    day, field = parser.feed('{"daily_plans": [{"day": 1}], "city": "Rome"}')
+
+    assert parsed_event(day) == {"type": "day", "content": {"key": "daily_plans", "index": 0, "value": {"day": 1}}}
+    assert parsed_event(field) == {"type": "field", "content": {"key": "city", "value": "Rome"}}
+    frame = sse_event(parsed_event(field))
+    assert frame.startswith("data: ") and frame.endswith("\n\n")
+    assert json.loads(frame[len("data: "):]) == parsed_event(field)
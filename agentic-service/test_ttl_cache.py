@@ -0,0 +1,66 @@
+"""TTLCache: LRU bound, expiry and the shared on-disk layer."""
+import types
+
+import pytest
+
+from services import ttl_cache
+from services.ttl_cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(ttl_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache("test", ttl_seconds=60)
+    cache.set("a", {"value": 1})
+    cache.set("b", 2, ttl_seconds=600)
+
+    clock[0] += 59
+    assert cache.get("a") == {"value": 1}
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache("test", max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_layer_is_shared_between_instances(tmp_path, clock):
+    path = tmp_path / "cache.sqlite3"
+    writer = TTLCache("shared", ttl_seconds=60, db_path=path)
+    writer.set("key", ["value"])
+
+    reader = TTLCache("shared", ttl_seconds=60, db_path=path)
+    assert reader.get("key") == ["value"]
+    assert reader.get("key") == ["value"]
+    stats = reader.stats()
+    assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+
+    clock[0] += 61
+    assert TTLCache("shared", db_path=path).get("key") is None
+
+
+def test_delete_and_clear_reach_the_disk_layer(tmp_path, clock):
+    path = tmp_path / "cache.sqlite3"
+    cache = TTLCache("shared", db_path=path)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    cache.delete("a")
+    assert TTLCache("shared", db_path=path).get("a") is None
+    cache.clear()
+    assert TTLCache("shared", db_path=path).get("b") is None
@@ -0,0 +1,74 @@
+"""Semantic answer cache for vault RAG questions."""
+import types
+
+import numpy as np
+import pytest
+
+from services import vault_answer_cache
+from services.vault_answer_cache import SemanticAnswerCache
+
+QUESTION = np.array([1.0, 0.0, 0.0, 0.0], dtype="float32")
+PARAPHRASE = np.array([0.99, 0.05, 0.0, 0.0], dtype="float32")
+OTHER = np.array([0.0, 1.0, 0.0, 0.0], dtype="float32")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(vault_answer_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_near_duplicate_question_is_a_hit(clock):
+    cache = SemanticAnswerCache(threshold=0.97)
+    cache.put("u1", 1, 5, QUESTION, {"answer": "Take the metro."})
+
+    hit = cache.get("u1", 1, 5, PARAPHRASE * 3)
+    assert hit["answer"] == "Take the metro." and hit["similarity"] >= 0.97
+    assert cache.get("u1", 1, 5, OTHER) is None
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_answers_are_scoped_to_user_version_and_top_k(clock):
+    cache = SemanticAnswerCache()
+    cache.put("u1", 1, 5, QUESTION, {"answer": "cached"})
+
+    assert cache.get("u2", 1, 5, QUESTION) is None
+    assert cache.get("u1", 1, 10, QUESTION) is None
+    assert cache.get("u1", 2, 5, QUESTION) is None
+    # The vault changed, so the old entry was dropped, not just skipped.
+    assert cache.stats()["entries"] == 0
+
+
+def test_expired_entries_are_evicted(clock):
+    cache = SemanticAnswerCache(ttl_seconds=60)
+    cache.put("u1", 1, 5, QUESTION, {"answer": "old"})
+    cache.put("u2", 1, 5, QUESTION, {"answer": "old"})
+
+    clock[0] += 61
+    assert cache.get("u1", 1, 5, QUESTION) is None
+    cache.put("u2", 1, 5, OTHER, {"answer": "new"})
+
+    stats = cache.stats()
+    assert (stats["entries"], stats["users"], stats["expirations"]) == (1, 1, 2)
+
+
+def test_invalidate_forgets_a_users_answers(clock):
+    cache = SemanticAnswerCache()
+    cache.put("u1", 1, 5, QUESTION, {"answer": "cached"})
+    cache.invalidate("u1")
+
+    assert cache.get("u1", 1, 5, QUESTION) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_least_recently_used_user_is_evicted_first(clock):
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.put("u1", 1, 5, QUESTION, {"answer": "one"})
+    cache.put("u2", 1, 5, QUESTION, {"answer": "two"})
+    cache.get("u1", 1, 5, QUESTION)
+    cache.put("u3", 1, 5, QUESTION, {"answer": "three"})
+
+    assert cache.get("u2", 1, 5, QUESTION) is None
+    assert cache.get("u1", 1, 5, QUESTION)["answer"] == "one"
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,150 @@
+"""Batch vault ingestion: partial failures, progress order and the upload-batch endpoint."""
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from fastapi import UploadFile
+
+pytest.importorskip("sentence_transformers")
+
+from services.vault import BatchDocument, VaultIngestionService  # noqa: E402
+from services.vault_documents import DocumentPathIndex  # noqa: E402
+from services.vault_extraction import PdfExtractor  # noqa: E402
+from services.vault_index import VaultIndexRouter  # noqa: E402
+from services.vault_splitter import TokenTextSplitter  # noqa: E402
+from services.vault_text_store import ExtractedTextStore  # noqa: E402
+
+DIMENSION = 8
+
+
+class _HashEmbedder:
+    """Deterministic stand-in for the MiniLM embedder."""
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), DIMENSION), dtype="float32")
+        for row, text in enumerate(texts):
+            vectors[row, hash(text) % DIMENSION] = 1.0
+        return vectors
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = VaultIngestionService.__new__(VaultIngestionService)
+    service.upload_dir = tmp_path / "uploads"
+    service.document_paths = DocumentPathIndex(tmp_path / "documents.sqlite3", service.upload_dir)
+    service.text_store = ExtractedTextStore(tmp_path / "text")
+    service.embedder = _HashEmbedder()
+    service.splitter = TokenTextSplitter(chunk_size=16, chunk_overlap=4)
+    service.index_store = VaultIndexRouter(tmp_path / "index", DIMENSION)
+    service.pdf_extractor = PdfExtractor(workers=1)
+    service.answer_cache = None
+    service._executor = ThreadPoolExecutor(max_workers=2)
+    service._ingest_executor = ThreadPoolExecutor(max_workers=2)
+    yield service
+    service._executor.shutdown()
+    service._ingest_executor.shutdown()
+
+
+def _document(document_id, content, filename=None):
+    upload = UploadFile(io.BytesIO(content), filename=filename or f"{document_id}.txt")
+    return BatchDocument(upload=upload, document_id=document_id, title=document_id)
+
+
+def _guide(number):
+    return " ".join(f"Day {day} of guide {number}: museums, cafes and the river walk." for day in range(6)).encode()
+
+
+def _indexed_ids(service, user_id="u1"):
+    hits = service.index_store.search(user_id, np.eye(DIMENSION, dtype="float32"), 1000)
+    return {metadata["document_id"] for metadata, _ in hits}
+
+
+def test_unreadable_document_fails_while_the_rest_commit_once(service):
+    documents = [
+        _document("doc-0", _guide(0)),
+        _document("doc-bad", b"%PDF-1.4 truncated", filename="broken.pdf"),
+        _document("doc-2", _guide(2)),
+    ]
+
+    summary = service.ingest_staged(service.stage_uploads(documents, "u1"), "u1")
+
+    assert [(result["documentId"], result["status"]) for result in summary["documents"]] == [
+        ("doc-0", "indexed"), ("doc-bad", "failed"), ("doc-2", "indexed"),
+    ]
+    assert (summary["indexed"], summary["failed"]) == (2, 1)
+    assert summary["documents"][1]["error"]
+    assert _indexed_ids(service) == {"doc-0", "doc-2"}
+    assert service.index_store.shard("u1").stats()["segments"] == 1
+    assert service.text_store.read("doc-bad", service.document_paths.lookup("doc-bad")) is None
+
+
+def test_progress_events_follow_input_order(service):
+    events = []
+    documents = [_document(f"doc-{n}", _guide(n)) for n in range(6)]
+    documents.insert(3, _document("doc-empty", b"   "))
+
+    service.ingest_staged(service.stage_uploads(documents, "u1"), "u1", on_progress=events.append)
+
+    extracted, indexed = events[:7], events[7:]
+    assert [event["documentId"] for event in extracted] == [document.document_id for document in documents]
+    assert [event["processed"] for event in extracted] == list(range(1, 8))
+    assert extracted[3]["status"] == "failed"
+    assert {event["status"] for event in extracted[:3] + extracted[4:]} == {"extracted"}
+    assert [event["documentId"] for event in indexed] == [f"doc-{n}" for n in range(6)]
+    assert {(event["status"], event["processed"], event["total"]) for event in indexed} == {("indexed", 7, 7)}
+
+
+def test_duplicate_document_ids_are_rejected_before_saving(service):
+    documents = [_document("doc-1", _guide(1)), _document("doc-1", _guide(2))]
+
+    with pytest.raises(ValueError, match="distinct documentId"):
+        service.stage_uploads(documents, "u1")
+    assert service.document_paths.count() == 0
+
+
+def test_failed_commit_settles_every_staged_item(service, monkeypatch):
+    original = service.document_paths.lookup
+    service.ingest_staged(service.stage_uploads([_document("doc-1", _guide(1), "old.txt")], "u1"), "u1")
+    old_path = original("doc-1")
+
+    def broken_commit(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(service.index_store, "commit", broken_commit)
+    staged = service.stage_uploads([_document("doc-1", _guide(9), "new.txt"), _document("doc-2", _guide(2))], "u1")
+    with pytest.raises(OSError, match="disk full"):
+        service.ingest_staged(staged, "u1")
+
+    # The replaced upload is restored and nothing new is served.
+    assert original("doc-1") == old_path and old_path.exists()
+    assert not staged[0].path.exists()
+    assert service.text_store.read("doc-1", old_path).text.startswith("Day 0 of guide 1")
+    assert service.text_store.read("doc-2", staged[1].path) is None
+    assert _indexed_ids(service) == {"doc-1"}
+
+
+def test_upload_batch_endpoint(service, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    monkeypatch.setattr(main, "vault_service", service)
+    client = TestClient(main.app)
+
+    def post(document_ids, stream=False):
+        files = [("files", (f"{document_id}.txt", _guide(n), "text/plain")) for n, document_id in enumerate(document_ids)]
+        data = {"documentIds": document_ids, "userId": "u1", "stream": str(stream).lower()}
+        return client.post("/api/v1/vault/upload-batch", files=files, data=data)
+
+    duplicate = post(["doc-1", "doc-1"])
+    assert duplicate.status_code == 400 and "distinct documentId" in duplicate.json()["detail"]
+
+    response = post(["doc-1", "doc-2"], stream=True)
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    assert [event["type"] for event in events] == ["document"] * 4 + ["summary", "done"]
+    assert [(event["content"]["documentId"], event["content"]["status"]) for event in events[:4]] == [
+        ("doc-1", "extracted"), ("doc-2", "extracted"), ("doc-1", "indexed"), ("doc-2", "indexed"),
+    ]
+    assert events[4]["content"]["indexed"] == 2
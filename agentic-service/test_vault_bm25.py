@@ -0,0 +1,99 @@
+"""BM25 postings: scores match a direct computation, across segments and merges."""
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from services.vault_bm25 import PostingsBuilder, SegmentPostings, bm25_scores, merge_postings, terms_of
+
+FIRST = ["Hotel Lutetia near the Louvre", "Booking AB12CD: hotel, hotel and breakfast", "Seine cruise at dusk"]
+SECOND = ["Louvre tickets for day two", "Night train to Nice", "hotel checkout at noon"]
+
+
+def _segment(tmp_path, name, texts):
+    path = tmp_path / f"{name}.bm25"
+    PostingsBuilder().extend(texts).write(path)
+    return SegmentPostings(path)
+
+
+def _reference(texts, query, k1=1.2, b=0.75):
+    documents = [Counter(terms_of(text)) for text in texts]
+    average = sum(sum(doc.values()) for doc in documents) / len(documents)
+    scores = {}
+    for term in dict.fromkeys(terms_of(query)):
+        frequency = sum(1 for doc in documents if term in doc)
+        if not frequency:
+            continue
+        idf = math.log(1 + (len(documents) - frequency + 0.5) / (frequency + 0.5))
+        for row, doc in enumerate(documents):
+            if term in doc:
+                length = sum(doc.values())
+                tf = doc[term]
+                scores[row] = scores.get(row, 0.0) + idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average))
+    return scores
+
+
+def _as_dict(rows, scores):
+    return {int(row): float(score) for row, score in zip(rows, scores)}
+
+
+def test_terms_keep_codes_whole():
+    assert terms_of("Flight LH1234, booking AB12CD!") == ["flight", "lh1234", "booking", "ab12cd"]
+
+
+@pytest.mark.parametrize("query", ["hotel", "louvre hotel", "ab12cd", "Night TRAIN to nice", "unknown"])
+def test_scores_across_segments_match_reference(tmp_path, query):
+    segments = [(_segment(tmp_path, "a", FIRST), 0), (_segment(tmp_path, "b", SECOND), len(FIRST))]
+    rows, scores = bm25_scores(segments, query)
+
+    expected = _reference(FIRST + SECOND, query)
+    assert _as_dict(rows, scores) == pytest.approx(expected, rel=1e-5)
+
+
+def test_merged_postings_score_like_their_parts(tmp_path):
+    parts = [_segment(tmp_path, "a", FIRST), _segment(tmp_path, "b", SECOND)]
+    merge_postings(parts, tmp_path / "merged.bm25")
+    merged = SegmentPostings(tmp_path / "merged.bm25")
+
+    assert len(merged) == len(FIRST) + len(SECOND)
+    for query in ("hotel", "louvre day", "cruise noon"):
+        split = _as_dict(*bm25_scores([(parts[0], 0), (parts[1], len(FIRST))], query))
+        assert _as_dict(*bm25_scores([(merged, 0)], query)) == pytest.approx(split, rel=1e-6)
+
+
+def test_empty_query_or_shard_scores_nothing(tmp_path):
+    segment = _segment(tmp_path, "a", FIRST)
+
+    for rows, scores in (bm25_scores([(segment, 0)], "!!"), bm25_scores([], "hotel")):
+        assert len(rows) == 0 and len(scores) == 0
+    rows, _ = bm25_scores([(segment, 0)], "hotel")
+    assert rows.dtype == np.int64
+
+
+def test_hybrid_query_fuses_vector_and_bm25_rankings(tmp_path, monkeypatch):
+    pytest.importorskip("sentence_transformers")
+    from config import settings
+    from services.vault import VaultIngestionService
+    from services.vault_index import VaultIndexRouter
+
+    texts = ["Museum pass for three days", "Booking AB12CD at Hotel Lutetia", "Seine cruise at dusk"]
+    vectors = np.eye(3, 4, dtype="float32")
+    router = VaultIndexRouter(tmp_path, 4)
+    router.append("u1", vectors, [
+        {"document_id": f"doc-{n}", "user_id": "u1", "title": f"Doc {n}", "text": text, "chunk_index": 0}
+        for n, text in enumerate(texts)
+    ])
+    service = VaultIngestionService.__new__(VaultIngestionService)
+    service.index_store = router
+    monkeypatch.setattr(settings, "vault_hybrid_search", True)
+
+    # The query vector ranks the museum chunk first; only the booking chunk has the code.
+    query = np.array([[1.0, 0.2, 0.1, 0.0]], dtype="float32")
+    results = service.query_documents("AB12CD", "u1", top_k=3, query_embedding=query)
+
+    assert [chunk["document_id"] for chunk in results] == ["doc-1", "doc-0", "doc-2"]
+    booking = results[0]
+    assert booking["bm25_score"] > 0 and booking["vector_distance"] is not None
+    assert booking["relevance_score"] == pytest.approx(1 / (settings.vault_rrf_k + 1) + 1 / (settings.vault_rrf_k + 2))
+    assert results[1]["bm25_score"] is None
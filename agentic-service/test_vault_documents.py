@@ -0,0 +1,89 @@
+"""Document path index: sharded upload paths, legacy scan and per-user ownership."""
+from multiprocessing import get_context
+
+from services.vault_documents import DocumentPathIndex, shard_dir
+
+
+def _upload(index, document_id, user_id, content=b"data"):
+    path = index.target_path(document_id, "guide.pdf")
+    path.write_bytes(content)
+    return path, index.record(document_id, path, user_id)
+
+
+def test_uploads_are_sharded_and_found_without_scanning(tmp_path):
+    index = DocumentPathIndex(tmp_path / "documents.sqlite3", tmp_path / "uploads")
+    path, recorded = _upload(index, "doc-1", "u1")
+
+    assert recorded
+    assert path.parent == shard_dir(tmp_path / "uploads", "doc-1")
+    assert path.relative_to(tmp_path / "uploads").parts[:2] == path.parent.relative_to(tmp_path / "uploads").parts
+    assert index.lookup("doc-1") == path
+    assert index.lookup("missing") is None
+
+    path.unlink()
+    assert index.lookup("doc-1") is None
+
+
+def test_flat_legacy_uploads_are_indexed_once(tmp_path):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    (uploads / "old-doc_notes.txt").write_text("legacy")
+    db_path = tmp_path / "documents.sqlite3"
+
+    index = DocumentPathIndex(db_path, uploads)
+    assert index.lookup("old-doc") == uploads / "old-doc_notes.txt"
+
+    (uploads / "later_notes.txt").write_text("not a legacy upload")
+    assert DocumentPathIndex(db_path, uploads).count() == 1
+
+
+def _open_index(db_path, upload_dir):
+    DocumentPathIndex(db_path, upload_dir)
+
+
+def test_concurrent_workers_scan_legacy_uploads_safely(tmp_path):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    for number in range(50):
+        (uploads / f"doc{number}_file.txt").write_text("x")
+    db_path = tmp_path / "documents.sqlite3"
+
+    context = get_context("spawn")
+    workers = [context.Process(target=_open_index, args=(db_path, uploads)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+
+    assert [worker.exitcode for worker in workers] == [0, 0, 0, 0]
+    assert DocumentPathIndex(db_path, uploads).count() == 50
+
+
+def test_document_ids_belong_to_their_first_uploader(tmp_path):
+    index = DocumentPathIndex(tmp_path / "documents.sqlite3", tmp_path / "uploads")
+    path, _ = _upload(index, "doc", "alice")
+
+    assert index.owner("doc") == "alice"
+    assert index.owned_by_other("doc", "bob")
+    assert not index.owned_by_other("doc", "alice")
+    assert not index.record("doc", path.with_name("doc_other.pdf"), "bob")
+    assert index.lookup("doc", "alice") == path
+    assert index.lookup("doc", "bob") is None
+
+    index.remove("doc", "bob")
+    assert index.lookup("doc", "alice") == path
+    index.remove("doc", "alice")
+    assert index.lookup("doc") is None
+
+
+def test_legacy_upload_is_claimed_by_its_next_upload(tmp_path):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    (uploads / "old_notes.txt").write_text("legacy")
+    index = DocumentPathIndex(tmp_path / "documents.sqlite3", uploads)
+    assert index.owner("old") is None
+    assert not index.owned_by_other("old", "alice")
+
+    _, recorded = _upload(index, "old", "alice")
+    assert recorded and index.owner("old") == "alice"
+    assert index.owned_by_other("old", "bob")
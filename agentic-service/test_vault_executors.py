@@ -0,0 +1,76 @@
+"""Vault async API: blocking work stays off the event loop and ingests cannot starve queries."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from services.vault import VaultIngestionService  # noqa: E402
+
+
+@pytest.fixture
+def service():
+    service = VaultIngestionService.__new__(VaultIngestionService)
+    service._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="vault")
+    service._ingest_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="vault-ingest")
+    service.query_documents = lambda query, user_id, top_k, query_embedding: [{"text": query}]
+    yield service
+    service._executor.shutdown()
+    service._ingest_executor.shutdown()
+
+
+async def _max_stall(stop, interval=0.01):
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+def test_slow_ingest_does_not_block_the_event_loop(service):
+    def slow_ingest(**kwargs):
+        time.sleep(0.5)  # parsing and embedding a large upload
+        return {"documentId": kwargs["document_id"]}
+
+    service.ingest_document = slow_ingest
+
+    async def scenario():
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(_max_stall(stop))
+        result = await service.aingest_document(upload=None, document_id="doc-1", user_id="u1", title="Guide")
+        stop.set()
+        return result, await ticker
+
+    result, stall = asyncio.run(scenario())
+    assert result == {"documentId": "doc-1"}
+    assert stall < 0.2
+
+
+def test_queries_are_served_while_ingests_fill_their_pool(service):
+    release = threading.Event()
+    running = []
+
+    def stuck_ingest(staged, user_id, on_progress=None):
+        running.append(threading.current_thread().name)
+        release.wait(10)
+        return {"userId": user_id}
+
+    service.ingest_staged = stuck_ingest
+
+    async def scenario():
+        ingests = [asyncio.ensure_future(service.aingest_staged([], f"u{n}")) for n in range(4)]
+        while len(running) < 2:
+            await asyncio.sleep(0.01)
+        try:
+            # Both ingest threads are busy and two more ingests are queued.
+            return await asyncio.wait_for(service.aquery_documents("louvre hours", "u9"), timeout=2)
+        finally:
+            release.set()
+            await asyncio.gather(*ingests)
+
+    assert asyncio.run(scenario()) == [{"text": "louvre hours"}]
+    assert all(name.startswith("vault-ingest") for name in running)
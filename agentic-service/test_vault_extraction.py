@@ -0,0 +1,90 @@
+"""Parallel PDF extraction: page order, the in-process threshold and pool failures."""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from services.vault_extraction import PdfExtractor
+
+
+def _write_pdf(path, pages):
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    for number in range(pages):
+        page = writer.add_blank_page(612, 792)
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 12 Tf 72 700 Td (Page {number} of the guide) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+        })
+    writer.write(str(path))
+    return path
+
+
+def _broken_pool():
+    """A spawn pool whose only worker exits at start-up."""
+    return ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=os._exit,
+        initargs=(1,),
+    )
+
+
+@pytest.fixture
+def extractor():
+    extractor = PdfExtractor(workers=2, min_pages=4, pages_per_task=3)
+    yield extractor
+    extractor.close()
+
+
+def test_pages_come_back_in_order_across_tasks(tmp_path, extractor):
+    path = _write_pdf(tmp_path / "guide.pdf", 11)  # 3 + 3 + 3 + 2 pages per task
+
+    pages = list(extractor.iter_pages(path))
+
+    assert [page.strip() for page in pages] == [f"Page {n} of the guide" for n in range(11)]
+    assert extractor.stats()["parallel_documents"] == 1
+
+
+def test_short_pdfs_stay_in_process(tmp_path, extractor):
+    path = _write_pdf(tmp_path / "leaflet.pdf", 3)
+
+    pages = list(extractor.iter_pages(path))
+
+    assert [page.strip() for page in pages] == [f"Page {n} of the guide" for n in range(3)]
+    assert extractor.stats()["inline_documents"] == 1
+    assert extractor._pool is None  # no workers were started
+
+
+def test_falls_back_in_process_when_a_worker_dies(tmp_path, extractor):
+    path = _write_pdf(tmp_path / "guide.pdf", 8)
+    extractor._pool = _broken_pool()
+
+    pages = list(extractor.iter_pages(path))
+
+    assert [page.strip() for page in pages] == [f"Page {n} of the guide" for n in range(8)]
+    assert extractor.stats()["pool_failures"] == 1
+    assert extractor._pool is None  # a fresh pool is started for the next document
+
+
+def test_falls_back_when_the_pool_is_already_broken(tmp_path, extractor):
+    path = _write_pdf(tmp_path / "guide.pdf", 8)
+    pool = _broken_pool()
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(abs, 1).result(timeout=60)
+    extractor._pool = pool  # every submit now raises
+
+    pages = list(extractor.iter_pages(path))
+
+    assert len(pages) == 8 and pages[7].strip() == "Page 7 of the guide"
+    assert extractor.stats()["pool_failures"] == 1
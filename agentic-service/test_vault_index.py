@@ -0,0 +1,181 @@
+"""Resident vault shards: segments, tombstones and purge, compaction, BM25 and ANN rebuilds."""
+import time
+
+import numpy as np
+import pytest
+
+from services.vault_ann import AnnConfig
+from services.vault_index import ResidentVaultIndex, VaultIndexRouter
+
+DIMENSION = 8
+
+
+def _chunks(document_id, texts, seed, user_id="u1"):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((len(texts), DIMENSION)).astype("float32")
+    metadatas = [
+        {"document_id": document_id, "user_id": user_id, "title": document_id, "text": text, "chunk_index": i}
+        for i, text in enumerate(texts)
+    ]
+    return vectors, metadatas
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail("background vault maintenance did not finish")
+        time.sleep(0.01)
+
+
+def _documents(results):
+    return {meta["document_id"] for meta, _ in results}
+
+
+def test_search_returns_the_nearest_chunk_with_metadata(tmp_path):
+    shard = ResidentVaultIndex(tmp_path, DIMENSION)
+    vectors, metadatas = _chunks("doc-a", ["louvre tickets", "seine cruise", "eiffel tower"], seed=1)
+    shard.append(vectors, metadatas)
+
+    meta, distance = shard.search(vectors[1:2], k=1)[0]
+    assert (meta["document_id"], meta["text"], meta["chunk_index"]) == ("doc-a", "seine cruise", 1)
+    assert distance == pytest.approx(0.0, abs=1e-5)
+
+
+def test_deleted_document_disappears_before_and_after_purge(tmp_path):
+    shard = ResidentVaultIndex(tmp_path, DIMENSION, purge_ratio=0.2)
+    keep_vectors, keep_meta = _chunks("keep", [f"kyoto temple {i}" for i in range(6)], seed=2)
+    gone_vectors, gone_meta = _chunks("gone", ["osaka street food", "osaka castle"], seed=3)
+    shard.append(keep_vectors, keep_meta)
+    shard.append(gone_vectors, gone_meta)
+
+    assert shard.delete_document("gone") == 2
+    _wait_for(lambda: shard.stats()["purges"] == 1)
+    stats = shard.stats()
+    assert (stats["vectors"], stats["deleted"]) == (6, 0)
+
+    for query in (gone_vectors[:1], gone_vectors[1:]):
+        assert _documents(shard.search(query, k=10)) == {"keep"}
+    assert shard.lexical_search("osaka", k=10) == []
+
+    reopened = ResidentVaultIndex(tmp_path, DIMENSION)
+    assert _documents(reopened.search(gone_vectors[:1], k=10)) == {"keep"}
+    assert reopened.search(keep_vectors[3:4], k=1)[0][0]["text"] == "kyoto temple 3"
+
+
+def test_tombstoned_chunks_are_skipped_without_a_purge(tmp_path):
+    shard = ResidentVaultIndex(tmp_path, DIMENSION, purge_ratio=0.9)
+    keep_vectors, keep_meta = _chunks("keep", [f"lisbon tram {i}" for i in range(4)], seed=4)
+    gone_vectors, gone_meta = _chunks("gone", ["porto wine"], seed=5)
+    shard.append(keep_vectors, keep_meta)
+    shard.append(gone_vectors, gone_meta)
+
+    shard.delete_document("gone")
+    assert shard.stats()["deleted"] == 1
+    assert _documents(shard.search(gone_vectors, k=10)) == {"keep"}
+    assert shard.lexical_search("porto wine", k=10) == []
+
+
+def test_replacing_a_document_tombstones_its_old_chunks(tmp_path):
+    shard = ResidentVaultIndex(tmp_path, DIMENSION, purge_ratio=0.9)
+    old_vectors, old_meta = _chunks("doc", ["old draft"], seed=6)
+    shard.append(old_vectors, old_meta)
+
+    new_vectors, new_meta = _chunks("doc", ["final itinerary"], seed=7)
+    writer = shard.open_writer()
+    writer.add(new_vectors, new_meta)
+    shard.commit(writer, replaces={"doc"})
+
+    assert [meta["text"] for meta, _ in shard.search(old_vectors, k=10)] == ["final itinerary"]
+
+
+def test_compaction_merges_segments_and_keeps_every_chunk(tmp_path):
+    shard = ResidentVaultIndex(tmp_path, DIMENSION, compaction_threshold=2)
+    appended = []
+    for number in range(4):
+        vectors, metadatas = _chunks(f"doc-{number}", [f"chunk {number}"], seed=10 + number)
+        shard.append(vectors, metadatas)
+        appended.append(vectors)
+    _wait_for(lambda: shard.stats()["compactions"] >= 1)
+
+    assert shard.stats()["segments"] <= 2
+    for number, vectors in enumerate(appended):
+        assert shard.search(vectors, k=1)[0][0]["document_id"] == f"doc-{number}"
+    assert {meta["chunk_id"] for meta, _ in shard.search(appended[0], k=4)} == {0, 1, 2, 3}
+
+
+def test_lexical_search_ranks_rare_terms_first(tmp_path):
+    shard = ResidentVaultIndex(tmp_path, DIMENSION)
+    texts = ["hotel breakfast included", "hotel near station", "hotel booking AB12CD confirmed", "museum pass"]
+    vectors, metadatas = _chunks("doc", texts, seed=8)
+    shard.append(vectors[:2], metadatas[:2])
+    shard.append(vectors[2:], metadatas[2:])
+
+    results = shard.lexical_search("hotel ab12cd", k=2)
+    assert [meta["text"] for meta, _ in results][0] == "hotel booking AB12CD confirmed"
+    assert len(results) == 2 and results[0][1] > results[1][1]
+    assert shard.lexical_search("unknown", k=5) == []
+
+
+def test_shard_is_rebuilt_as_ann_index_once_large_enough(tmp_path):
+    ann = AnnConfig(kind="hnsw", min_vectors=32)
+    shard = ResidentVaultIndex(tmp_path, DIMENSION, ann=ann)
+    vectors, metadatas = _chunks("doc", [f"chunk {i}" for i in range(40)], seed=9)
+    shard.append(vectors, metadatas)
+    _wait_for(lambda: shard.stats()["rebuilds"] == 1)
+
+    assert shard.stats()["index_type"] == "hnsw"
+    assert shard.search(vectors[17:18], k=1)[0][0]["text"] == "chunk 17"
+    reopened = ResidentVaultIndex(tmp_path, DIMENSION, ann=ann)
+    assert reopened.stats()["rebuilds"] == 0
+    assert reopened.search(vectors[5:6], k=1)[0][0]["text"] == "chunk 5"
+    assert reopened.stats()["index_type"] == "hnsw"
+
+
+def test_router_keeps_users_apart(tmp_path):
+    router = VaultIndexRouter(tmp_path, DIMENSION)
+    vectors, metadatas = _chunks("doc", ["rome forum"], seed=11, user_id="alice")
+    router.append("alice", vectors, metadatas)
+
+    assert _documents(router.search("alice", vectors, k=5)) == {"doc"}
+    assert router.search("bob", vectors, k=5) == []
+    assert router.lexical_search("bob", "rome", k=5) == []
+
+
+def test_queries_for_unknown_users_create_nothing(tmp_path):
+    router = VaultIndexRouter(tmp_path, DIMENSION)
+    vectors, _ = _chunks("doc", ["anything"], seed=12)
+
+    assert router.search("nobody", vectors, k=5) == []
+    assert router.lexical_search("nobody", "anything", k=5) == []
+    assert router.delete_document("nobody", "doc") == 0
+    assert router.content_version("nobody") == (0, 0, 0)
+    assert list(router.shards_dir.iterdir()) == []
+
+
+def test_evicted_shards_are_closed_and_reload_on_demand(tmp_path):
+    router = VaultIndexRouter(tmp_path, DIMENSION, max_resident=1)
+    alice_vectors, alice_meta = _chunks("alice-doc", ["rome forum"], seed=13, user_id="alice")
+    router.append("alice", alice_vectors, alice_meta)
+    alice = router.shard("alice")
+    router.append("bob", *_chunks("bob-doc", ["oslo fjord"], seed=14, user_id="bob"))
+
+    assert router.stats()["evictions"] == 1
+    assert alice.stats()["vectors"] == 0 and alice._readers == []
+    assert _documents(router.search("alice", alice_vectors, k=5)) == {"alice-doc"}
+
+
+def test_shards_in_use_are_not_evicted(tmp_path):
+    router = VaultIndexRouter(tmp_path, DIMENSION, max_resident=1)
+    router.append("alice", *_chunks("alice-doc", ["rome forum"], seed=13, user_id="alice"))
+
+    with router._using("alice") as alice:
+        router.append("bob", *_chunks("bob-doc", ["oslo fjord"], seed=14, user_id="bob"))
+        assert router.shard_name("alice") in router._shards  # pinned; bob went instead
+        assert alice.lexical_search("rome", k=5)[0][0]["document_id"] == "alice-doc"
+
+    bob = router.shard("bob")
+    bob._compacting = True  # a background compaction is running
+    router.search("alice", np.zeros((1, DIMENSION), dtype="float32"), k=1)
+    assert router.shard("bob") is bob
+    bob._compacting = False
@@ -0,0 +1,135 @@
+"""Persistent vault ingestion jobs: lifecycle, leases and restarts."""
+import threading
+import time
+
+import pytest
+
+from services.vault_jobs import IngestJobQueue
+
+
+def _queue(tmp_path, handler, **options):
+    options.setdefault("poll_interval", 0.02)
+    return IngestJobQueue(tmp_path / "jobs.sqlite3", handler, **options)
+
+
+def _wait_for_status(queue, job_id, status, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = queue.get(job_id)
+        if job["status"] == status:
+            return job
+        if time.monotonic() > deadline:
+            pytest.fail(f"job stayed {job['status']!r}, expected {status!r}")
+        time.sleep(0.01)
+
+
+def test_job_runs_to_success_with_progress_and_result(tmp_path):
+    def handler(job, progress):
+        progress("extracting", {"pages": 3})
+        progress("indexing", {"pages": 3, "chunks": 12})
+        return {"documentId": job.document_id, "chunks": 12}
+
+    queue = _queue(tmp_path, handler)
+    queue.start()
+    try:
+        job_id = queue.enqueue(document_id="doc", user_id="u1", payload={"path": "x.pdf"})["jobId"]
+        job = _wait_for_status(queue, job_id, "succeeded")
+    finally:
+        queue.close()
+
+    assert job["stage"] == "done"
+    assert job["progress"] == {"pages": 3, "chunks": 12}
+    assert job["result"] == {"documentId": "doc", "chunks": 12}
+    assert job["attempts"] == 1 and job["error"] is None
+
+
+def test_handler_error_fails_the_job(tmp_path):
+    def handler(job, progress):
+        raise ValueError("Unsupported file type")
+
+    queue = _queue(tmp_path, handler)
+    queue.start()
+    try:
+        job_id = queue.enqueue(document_id="doc", user_id="u1", payload={})["jobId"]
+        job = _wait_for_status(queue, job_id, "failed")
+    finally:
+        queue.close()
+
+    assert job["error"] == "Unsupported file type"
+    assert queue.stats()["failed"] == 1
+
+
+def test_queued_jobs_survive_a_restart(tmp_path):
+    _queue(tmp_path, handler=None).enqueue(document_id="doc", user_id="u1", payload={"n": 1})
+
+    seen = []
+    queue = _queue(tmp_path, lambda job, progress: seen.append(job.payload) or {})
+    queue.start()
+    try:
+        job_id = queue.list("u1")[0]["jobId"]
+        _wait_for_status(queue, job_id, "succeeded")
+    finally:
+        queue.close()
+    assert seen == [{"n": 1}]
+
+
+def test_job_of_a_dead_worker_is_retried_after_its_lease(tmp_path):
+    crashed = _queue(tmp_path, handler=None, lease_seconds=0.2)
+    job_id = crashed.enqueue(document_id="doc", user_id="u1", payload={})["jobId"]
+    assert crashed._claim().job_id == job_id  # claimed, then the worker "dies"
+
+    queue = _queue(tmp_path, lambda job, progress: {"attempt": job.attempts}, lease_seconds=0.2)
+    queue.start()
+    try:
+        job = _wait_for_status(queue, job_id, "succeeded")
+    finally:
+        queue.close()
+    assert job["attempts"] == 2 and job["result"] == {"attempt": 2}
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    crashed = _queue(tmp_path, handler=None, lease_seconds=0.1, max_attempts=1)
+    job_id = crashed.enqueue(document_id="doc", user_id="u1", payload={})["jobId"]
+    crashed._claim()
+
+    queue = _queue(tmp_path, lambda job, progress: {}, lease_seconds=0.1, max_attempts=1)
+    queue.start()
+    try:
+        job = _wait_for_status(queue, job_id, "failed")
+    finally:
+        queue.close()
+    assert "Gave up after 1" in job["error"]
+
+
+def test_heartbeat_keeps_a_silent_job_from_being_stolen(tmp_path):
+    runs = []
+    release = threading.Event()
+
+    def handler(job, progress):
+        runs.append(job.owner)
+        release.wait(5)  # no progress reports while blocked
+        return {}
+
+    first = _queue(tmp_path, handler, lease_seconds=0.3, workers=1)
+    second = _queue(tmp_path, handler, lease_seconds=0.3, workers=1)
+    first.start()
+    second.start()
+    try:
+        job_id = first.enqueue(document_id="doc", user_id="u1", payload={})["jobId"]
+        time.sleep(1.0)  # several lease periods
+        release.set()
+        job = _wait_for_status(first, job_id, "succeeded")
+    finally:
+        first.close()
+        second.close()
+    assert len(runs) == 1 and job["attempts"] == 1
+
+
+def test_list_is_scoped_to_the_user_and_newest_first(tmp_path):
+    queue = _queue(tmp_path, handler=None)
+    older = queue.enqueue(document_id="a", user_id="u1", payload={})["jobId"]
+    newer = queue.enqueue(document_id="b", user_id="u1", payload={})["jobId"]
+    queue.enqueue(document_id="c", user_id="u2", payload={})
+
+    assert [job["jobId"] for job in queue.list("u1")] == [newer, older]
+    assert [job["jobId"] for job in queue.list("u1", status="succeeded")] == []
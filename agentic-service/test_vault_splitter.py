@@ -0,0 +1,89 @@
+"""Vault text splitters: streaming chunking matches splitting the joined text."""
+import random
+
+import pytest
+
+from config import settings
+from services import vault_splitter
+from services.vault_splitter import (
+    MODEL_SPECIAL_TOKENS,
+    WORDPIECES_PER_TOKEN,
+    SimpleTextSplitter,
+    TokenTextSplitter,
+    max_chunk_tokens,
+)
+
+WORDS = ["Paris", "museum", "café", "trip", "budget", "day", "train", "naïve", "Kyōto", "42", "e-mail", "route"]
+
+
+def _document(seed: int, sentences: int = 120) -> str:
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(sentences):
+        words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 25)))
+        parts.append(words + rng.choice([". ", "! ", "? ", ", ", ".\n", "\n\n", "　"]))
+    return "".join(parts)
+
+
+def _pieces(text: str, seed: int):
+    rng = random.Random(seed)
+    position = 0
+    while position < len(text):
+        step = rng.randint(1, 300)
+        yield text[position:position + step]
+        position += step
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_simple_splitter_streaming_matches_split_text(seed):
+    splitter = SimpleTextSplitter(chunk_size=200, chunk_overlap=50)
+    text = _document(seed)
+
+    assert list(splitter.iter_chunks(_pieces(text, seed))) == splitter.split_text(text)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_token_splitter_streaming_matches_split_text(seed, monkeypatch):
+    monkeypatch.setattr(vault_splitter, "STREAM_BUFFER_CHARS", 500)
+    splitter = TokenTextSplitter(chunk_size=40, chunk_overlap=10)
+    text = _document(seed)
+
+    assert list(splitter.iter_chunks(_pieces(text, seed))) == splitter.split_text(text)
+
+
+def test_token_chunks_respect_size_and_overlap():
+    splitter = TokenTextSplitter(chunk_size=40, chunk_overlap=10)
+    text = _document(7)
+    spans = splitter.split_spans(text)
+
+    assert spans[0][0] == 0 and spans[-1][1] == len(text.rstrip())
+    for (start, end), (next_start, _) in zip(spans, spans[1:]):
+        assert splitter.count_tokens(text[start:end]) <= 40
+        assert start < next_start < end  # consecutive chunks overlap
+
+
+def test_token_splitter_prefers_sentence_ends():
+    splitter = TokenTextSplitter(chunk_size=10, chunk_overlap=2)
+    chunks = splitter.split_text("one two three four five six seven. eight nine ten eleven twelve thirteen")
+
+    assert chunks[0] == "one two three four five six seven."
+
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        TokenTextSplitter(chunk_size=10, chunk_overlap=10)
+
+
+def test_cjk_ideographs_are_single_tokens():
+    # Like BERT's tokenizer: every ideograph is a token, kana runs stay whole.
+    assert TokenTextSplitter.count_tokens("東京タワーへ行く。") == 6
+    assert TokenTextSplitter.count_tokens("Kyōto 京都") == 3
+
+
+def test_chunk_cap_fits_the_model_input():
+    # all-MiniLM-L6-v2 truncates at 256 word pieces, including [CLS] and [SEP].
+    cap = max_chunk_tokens(256)
+
+    assert cap * WORDPIECES_PER_TOKEN + MODEL_SPECIAL_TOKENS <= 256
+    assert cap > TokenTextSplitter().chunk_overlap
+    assert settings.vault_chunk_tokens is None or settings.vault_chunk_tokens <= cap
@@ -0,0 +1,124 @@
+"""Extracted-text store for vault previews: paged reads, invalidation and the preview endpoint."""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.vault_text_store import ExtractedTextStore
+
+TEXT = "".join(f"line {n:05d} of the itinerary\n" for n in range(6000))  # ~170K chars, three 64K blocks
+
+
+def _store(tmp_path, source, text=TEXT, **kwargs):
+    store = ExtractedTextStore(tmp_path / "text", **kwargs)
+    writer = store.writer("doc-1", source)
+    for start in range(0, len(text), 10_000):
+        writer.add(text[start:start + 10_000])
+    writer.commit()
+    return store
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "guide.txt"
+    path.write_text("original upload")
+    return path
+
+
+def test_reads_span_block_boundaries(tmp_path, source):
+    store = _store(tmp_path, source)
+    boundary = 64 * 1024
+
+    page = store.read("doc-1", source, boundary - 100, 250)
+    assert (page.text, page.offset, page.total_chars) == (TEXT[boundary - 100:boundary + 150], boundary - 100, len(TEXT))
+    assert store.read("doc-1", source, boundary, 10).text == TEXT[boundary:boundary + 10]
+    assert store.read("doc-1", source, 1000, None).text == TEXT[1000:]
+    assert store.read("doc-1", source).text == TEXT
+
+
+@pytest.mark.parametrize("block_chars", [7, 100, 4096])
+def test_every_window_matches_the_text(tmp_path, source, block_chars):
+    text = TEXT[:5000]
+    store = _store(tmp_path, source, text, block_chars=block_chars)
+
+    for offset, limit in [(0, 1), (6, 2), (99, 3), (block_chars - 1, block_chars + 2), (4990, 50)]:
+        assert store.read("doc-1", source, offset, limit).text == text[offset:offset + limit]
+
+
+def test_offset_past_the_end_is_an_empty_page(tmp_path, source):
+    store = _store(tmp_path, source)
+
+    for offset in (len(TEXT), len(TEXT) + 500):
+        page = store.read("doc-1", source, offset, 100)
+        assert (page.text, page.offset, page.total_chars) == ("", len(TEXT), len(TEXT))
+
+
+def test_changed_source_invalidates_the_entry(tmp_path, source):
+    store = _store(tmp_path, source)
+    stat = source.stat()
+
+    # Same size, new mtime, same bytes: re-hashed and still served.
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+    assert store.read("doc-1", source, 0, 4) is not None
+
+    # Same size, different bytes.
+    source.write_text("modified upload")
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10_000_000_000))
+    assert store.read("doc-1", source, 0, 4) is None
+
+    # Different size.
+    source.write_text("a longer replacement upload")
+    assert store.read("doc-1", source, 0, 4) is None
+
+    source.unlink()
+    assert store.read("doc-1", source, 0, 4) is None
+    assert store.stats() == {"hits": 1, "misses": 3}
+
+
+def test_abort_removes_the_partial_file(tmp_path, source):
+    store = ExtractedTextStore(tmp_path / "text", block_chars=16)
+    writer = store.writer("doc-1", source)
+    writer.add("x" * 100)
+    assert writer._tmp.exists()
+
+    writer.abort()
+
+    assert not writer._tmp.exists()
+    assert not any(path.is_file() for path in (tmp_path / "text").rglob("*"))
+    assert store.read("doc-1", source) is None
+
+
+def test_preview_endpoint_pages_with_offset_and_limit(tmp_path, monkeypatch):
+    pytest.importorskip("sentence_transformers")
+    from fastapi.testclient import TestClient
+
+    import main
+    from services.vault import VaultIngestionService
+    from services.vault_documents import DocumentPathIndex
+
+    service = VaultIngestionService.__new__(VaultIngestionService)
+    service.upload_dir = tmp_path / "uploads"
+    service.document_paths = DocumentPathIndex(tmp_path / "documents.sqlite3", service.upload_dir)
+    service.text_store = ExtractedTextStore(tmp_path / "text")
+    service._executor = ThreadPoolExecutor(max_workers=1)
+    upload = service.document_paths.target_path("doc-1", "guide.txt")
+    upload.write_text(TEXT)
+    service.document_paths.record("doc-1", upload, "u1")
+    monkeypatch.setattr(main, "vault_service", service)
+    client = TestClient(main.app)
+
+    def preview(**params):
+        return client.get("/api/v1/vault/preview/doc-1", params={"user_id": "u1", **params})
+
+    body = preview(offset=65_000, limit=1000).json()
+    assert body["content"] == TEXT[65_000:66_000]
+    assert (body["offset"], body["total_length"], body["next_offset"]) == (65_000, len(TEXT), 66_000)
+
+    last = preview(offset=len(TEXT) - 10, limit=1000).json()
+    assert last["content"] == TEXT[-10:] and last["next_offset"] is None
+    assert preview().json()["content"] == TEXT
+
+    assert preview(offset=-1).status_code == 422
+    assert preview(limit=0).status_code == 422
+    assert client.get("/api/v1/vault/preview/doc-1", params={"user_id": "u2"}).status_code == 404
+    service._executor.shutdown()
@@ -40,6 +40,14 @@ export async function GET(request, { params }) {
       // Fallback to filename if filePath not stored
       queryParams.append("filename", document.filename);
     }
+
+    // Forward pagination so large documents can be previewed page by page
+    const { searchParams } = new URL(request.url);
+    for (const key of ["offset", "limit"]) {
+      if (searchParams.has(key)) {
+        queryParams.append(key, searchParams.get(key));
+      }
+    }
     
     const response = await fetch(
       `${AGENTIC_SERVICE_URL}/api/v1/vault/preview/${id}?${queryParams.toString()}`,
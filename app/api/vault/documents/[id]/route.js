@@ -3,6 +3,8 @@ import { auth } from "@clerk/nextjs";
 import { deleteKnowledgeDocument } from "@/utils/actions";
 import prisma from "@/utils/db";
 
+const AGENTIC_SERVICE_URL = process.env.AGENTIC_SERVICE_URL || "http://localhost:8000";
+
 export async function DELETE(request, { params }) {
   const { userId } = auth();
   if (!userId) {
@@ -31,8 +33,20 @@ export async function DELETE(request, { params }) {
     // Delete from database
     await deleteKnowledgeDocument(id);
 
-    // TODO: Optionally delete from FAISS index
-    // This would require calling the FastAPI endpoint to remove embeddings
+    // Remove the document's chunks and stored file from the vault index.
+    // The database row is already gone, so a failure here is only logged.
+    try {
+      const queryParams = new URLSearchParams({ user_id: userId });
+      const response = await fetch(
+        `${AGENTIC_SERVICE_URL}/api/v1/vault/documents/${id}?${queryParams.toString()}`,
+        { method: "DELETE" }
+      );
+      if (!response.ok && response.status !== 404) {
+        console.error("Failed to delete document from vault index:", response.status);
+      }
+    } catch (error) {
+      console.error("Error deleting document from vault index:", error);
+    }
 
     return NextResponse.json({
       success: true,